@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-19 05:44
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0004_badge_customuser_last_active_date_and_more"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="customuser",
+            name="last_seen",
+            field=models.DateTimeField(
+                default=django.utils.timezone.now, help_text="Last seen timestamp"
+            ),
+        ),
+    ]
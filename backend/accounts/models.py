@@ -4,6 +4,7 @@ Custom User model extending AbstractUser for esports profiles.
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 
 
 class CustomUser(AbstractUser):
@@ -24,7 +25,8 @@ class CustomUser(AbstractUser):
     )
     xp_points = models.IntegerField(default=0, help_text="XP points for gamification")
     is_online = models.BooleanField(default=False, help_text="Online status")
-    last_seen = models.DateTimeField(auto_now=True, help_text="Last seen timestamp")
+    # Maintained by chat.presence (batched), not on every save
+    last_seen = models.DateTimeField(default=timezone.now, help_text="Last seen timestamp")
     streak_days = models.IntegerField(default=0, help_text="Current login streak in days")
     last_active_date = models.DateField(null=True, blank=True, help_text="Last date user was active")
     
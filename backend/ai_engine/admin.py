@@ -2,7 +2,7 @@
 Admin configuration for AI Engine models.
 """
 from django.contrib import admin
-from .models import AIProcessingJob
+from .models import AIProcessingJob, PlayerStatsSummary
 
 
 @admin.register(AIProcessingJob)
@@ -13,3 +13,12 @@ class AIProcessingJobAdmin(admin.ModelAdmin):
     search_fields = ('user__username', 'tournament__name', 'task_id')
     readonly_fields = ('created_at', 'completed_at')
 
+
+
+@admin.register(PlayerStatsSummary)
+class PlayerStatsSummaryAdmin(admin.ModelAdmin):
+    """Admin interface for PlayerStatsSummary model (maintained by signals)."""
+    list_display = ('user', 'game', 'total_tournaments', 'win_rate', 'skill_consistency', 'updated_at')
+    list_filter = ('game',)
+    search_fields = ('user__username',)
+    readonly_fields = ('updated_at',)
@@ -5,3 +5,6 @@ class AiEngineConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'ai_engine'
 
+
+    def ready(self):
+        from . import signals  # noqa: F401
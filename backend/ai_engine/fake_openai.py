@@ -0,0 +1,126 @@
+"""
+Local fake of the OpenAI chat completions endpoint.
+Serves both blocking and streaming (server-sent events) responses with
+configurable latency so insight streaming can be exercised without network
+access or an API key. Point OPENAI_BASE_URL at FakeOpenAIServer.base_url.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_RESPONSE = json.dumps({
+    'summary': 'Solid showing with steady aim duels and good utility usage.',
+    'strengths': ['Crosshair placement', 'Utility timing', 'Calm clutches'],
+    'improvements': ['Mid-round rotations', 'Economy discipline', 'Comms on retakes'],
+})
+
+
+def split_tokens(text, size=4):
+    """Split text into small chunks that stand in for model tokens."""
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+class FakeOpenAIServer:
+    """
+    Threaded HTTP server speaking the /v1/chat/completions protocol.
+    first_token_delay simulates model queueing/prefill, token_delay the
+    per-token decode time.
+    """
+
+    def __init__(self, text=DEFAULT_RESPONSE, first_token_delay=0.3, token_delay=0.01, host='127.0.0.1', port=0):
+        self.tokens = split_tokens(text)
+        self.first_token_delay = first_token_delay
+        self.token_delay = token_delay
+        self.httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}/v1'
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                if not self.path.endswith('/chat/completions'):
+                    self.send_error(404)
+                    return
+                length = int(self.headers.get('Content-Length', 0))
+                body = json.loads(self.rfile.read(length) or b'{}')
+                model = body.get('model', 'fake-model')
+                if body.get('stream'):
+                    self._stream(model)
+                else:
+                    self._complete(model)
+
+            def _complete(self, model):
+                time.sleep(server.first_token_delay + server.token_delay * len(server.tokens))
+                payload = json.dumps({
+                    'id': 'chatcmpl-fake',
+                    'object': 'chat.completion',
+                    'created': int(time.time()),
+                    'model': model,
+                    'choices': [{
+                        'index': 0,
+                        'message': {'role': 'assistant', 'content': ''.join(server.tokens)},
+                        'finish_reason': 'stop',
+                    }],
+                }).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _stream(self, model):
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Cache-Control', 'no-cache')
+                self.end_headers()
+                time.sleep(server.first_token_delay)
+                for index, token in enumerate(server.tokens):
+                    if index:
+                        time.sleep(server.token_delay)
+                    self._event({
+                        'id': 'chatcmpl-fake',
+                        'object': 'chat.completion.chunk',
+                        'created': int(time.time()),
+                        'model': model,
+                        'choices': [{'index': 0, 'delta': {'content': token}, 'finish_reason': None}],
+                    })
+                self._event({
+                    'id': 'chatcmpl-fake',
+                    'object': 'chat.completion.chunk',
+                    'created': int(time.time()),
+                    'model': model,
+                    'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}],
+                })
+                self.wfile.write(b'data: [DONE]\n\n')
+                self.wfile.flush()
+
+            def _event(self, data):
+                self.wfile.write(f'data: {json.dumps(data)}\n\n'.encode())
+                self.wfile.flush()
+
+        return Handler
@@ -0,0 +1,76 @@
+"""
+Management command guarding web-worker startup cost.
+Imports the project's URLconf (every view, including ai_engine and gamerlink)
+in a fresh interpreter under `python -X importtime`, reports the slowest
+imports and fails if a heavy ML/LLM library is pulled in or the budget is blown.
+Run: python manage.py bench_import_time --max-ms 1500
+"""
+import os
+import re
+import subprocess
+import sys
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from ai_engine.ml import HEAVY_MODULES
+
+IMPORT_LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)')
+
+WEB_IMPORTS = 'import django; django.setup(); import vinverse.urls'
+WORKER_IMPORTS = WEB_IMPORTS + '; from ai_engine.ml import warm_up; warm_up()'
+
+
+def measure(code):
+    """Run code under -X importtime; returns [(module, self_us, cumulative_us, depth)]."""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        cwd=settings.BASE_DIR,
+        env=os.environ.copy(),
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise CommandError(f"Import failed:\n{result.stderr[-2000:]}")
+
+    imports = []
+    for line in result.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            imports.append((module, int(self_us), int(cumulative_us), len(indent) // 2))
+    return imports
+
+
+class Command(BaseCommand):
+    help = 'Measure web-process import time and fail if heavy ML libraries are imported'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-ms', type=float, default=None, help='Fail if total import time exceeds this')
+        parser.add_argument('--top', type=int, default=15, help='How many of the slowest imports to list')
+        parser.add_argument('--worker', action='store_true', help='Also measure a Celery worker after warm-up')
+
+    def handle(self, *args, **options):
+        imports = measure(WEB_IMPORTS)
+        total_ms = sum(cumulative for _, _, cumulative, depth in imports if depth == 0) / 1000
+
+        self.stdout.write(f"Web process: {len(imports)} modules imported in {total_ms:.0f}ms")
+        for module, _, cumulative, depth in sorted(
+            (row for row in imports if row[3] == 0), key=lambda row: row[2], reverse=True
+        )[:options['top']]:
+            self.stdout.write(f"  {cumulative / 1000:8.1f}ms  {module}")
+
+        if options['worker']:
+            worker = measure(WORKER_IMPORTS)
+            worker_ms = sum(cumulative for _, _, cumulative, depth in worker if depth == 0) / 1000
+            self.stdout.write(f"Celery worker after warm-up: {len(worker)} modules in {worker_ms:.0f}ms")
+
+        heavy = sorted({
+            module for module, *_ in imports
+            if module.split('.')[0] in HEAVY_MODULES
+        })
+        if heavy:
+            roots = sorted({module.split('.')[0] for module in heavy})
+            raise CommandError(f"Heavy libraries imported by the web process: {', '.join(roots)}")
+        if options['max_ms'] is not None and total_ms > options['max_ms']:
+            raise CommandError(f"Import time {total_ms:.0f}ms exceeds budget of {options['max_ms']:.0f}ms")
+
+        self.stdout.write(self.style.SUCCESS('✅ No heavy ML/LLM libraries imported by the web process'))
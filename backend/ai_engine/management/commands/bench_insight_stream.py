@@ -0,0 +1,57 @@
+"""
+Management command comparing time-to-first-token for blocking vs streaming
+insight generation against the local fake OpenAI server.
+Run: python manage.py bench_insight_stream --runs 5
+"""
+import statistics
+import time
+from django.core.management.base import BaseCommand, CommandError
+from ai_engine import tasks
+from ai_engine.fake_openai import FakeOpenAIServer
+
+
+class Command(BaseCommand):
+    help = 'Benchmark time-to-first-token of streaming vs blocking AI insight completions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5)
+        parser.add_argument('--first-token-delay-ms', type=float, default=300)
+        parser.add_argument('--token-delay-ms', type=float, default=10)
+
+    def handle(self, *args, **options):
+        if not tasks.OPENAI_AVAILABLE:
+            raise CommandError('The openai package is not installed')
+
+        server = FakeOpenAIServer(
+            first_token_delay=options['first_token_delay_ms'] / 1000,
+            token_delay=options['token_delay_ms'] / 1000,
+        )
+        original = (tasks.OPENAI_API_KEY, tasks.OPENAI_BASE_URL)
+        tasks.OPENAI_API_KEY, tasks.OPENAI_BASE_URL = 'fake-key', server.base_url
+
+        blocking, first_token, streamed_total = [], [], []
+        try:
+            with server:
+                prompt = 'benchmark'
+                for _ in range(options['runs']):
+                    started = time.perf_counter()
+                    text = tasks.request_insight_completion(prompt)
+                    blocking.append((time.perf_counter() - started) * 1000)
+
+                    started = time.perf_counter()
+                    streamed, ttft_ms = tasks.stream_insight_completion(prompt, 0, 'bench', 0)
+                    streamed_total.append((time.perf_counter() - started) * 1000)
+                    first_token.append(ttft_ms)
+
+                    if streamed != text:
+                        raise CommandError('Streamed text does not match the blocking response')
+        finally:
+            tasks.OPENAI_API_KEY, tasks.OPENAI_BASE_URL = original
+
+        self.stdout.write(f"Tokens per response: {len(server.tokens)}")
+        self.stdout.write(f"Blocking - first visible text (p50): {statistics.median(blocking):.1f}ms")
+        self.stdout.write(f"Streaming - time to first token (p50): {statistics.median(first_token):.1f}ms")
+        self.stdout.write(f"Streaming - full completion (p50): {statistics.median(streamed_total):.1f}ms")
+        self.stdout.write(self.style.SUCCESS(
+            f"Time-to-first-token improved {statistics.median(blocking) / statistics.median(first_token):.1f}x"
+        ))
@@ -0,0 +1,91 @@
+"""
+Management command for offline evaluation and benchmarking of the win model.
+Trains on the earliest placements, scores the latest ones against the
+hand-weighted baseline, then times loading and batched vs per-player inference.
+Run: python manage.py evaluate_win_model --test-fraction 0.2 --players 5000
+"""
+import os
+import tempfile
+import time
+from django.core.management.base import BaseCommand, CommandError
+from ai_engine import ml, win_model
+
+
+def baseline_probabilities(X):
+    """The pre-training formula (win rate, rank, XP) expressed over the feature matrix."""
+    np = ml.numpy()
+    columns = {name: X[:, i] for i, name in enumerate(win_model.FEATURES)}
+    probabilities = (
+        columns['prior_win_rate'] * 0.4
+        + columns['rank_score'] * 0.5
+        + columns['xp_score'] * 0.1
+    )
+    return np.clip(probabilities, 0.05, 0.95)
+
+
+class Command(BaseCommand):
+    help = 'Evaluate the win-probability model on a time-based split and benchmark inference'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--test-fraction', type=float, default=0.2)
+        parser.add_argument('--players', type=int, default=5000, help='Batch size for the inference benchmark')
+
+    def handle(self, *args, **options):
+        if not win_model.ML_AVAILABLE:
+            raise CommandError('numpy, scikit-learn and joblib are required')
+        from sklearn.metrics import accuracy_score, brier_score_loss, log_loss, roc_auc_score
+
+        try:
+            X, y, _ = win_model.build_training_matrix()
+        except win_model.NotEnoughTrainingData as e:
+            raise CommandError(str(e))
+
+        # Rows are in tournament order, so the tail is the "future"
+        split = int(len(y) * (1 - options['test_fraction']))
+        X_train, y_train, X_test, y_test = X[:split], y[:split], X[split:], y[split:]
+        if len(set(y_train)) < 2 or len(y_test) == 0:
+            raise CommandError('Time split left a side without both classes; try another --test-fraction')
+
+        model = win_model.train_model(X_train, y_train)
+        self.stdout.write(f"Train: {len(y_train)} rows, test: {len(y_test)} rows")
+        for name, probabilities in (
+            ('trained model', win_model.predict_matrix(model, X_test)),
+            ('baseline formula', baseline_probabilities(X_test)),
+        ):
+            auc = roc_auc_score(y_test, probabilities) if len(set(y_test)) > 1 else float('nan')
+            self.stdout.write(
+                f"  {name:<17} AUC {auc:.3f}  Brier {brier_score_loss(y_test, probabilities):.4f}  "
+                f"log-loss {log_loss(y_test, probabilities, labels=[0, 1]):.4f}  "
+                f"accuracy {accuracy_score(y_test, probabilities >= 0.5):.3f}"
+            )
+
+        self._benchmark(win_model.train_model(X, y), X, options['players'])
+
+    def _benchmark(self, model, X, players):
+        np = ml.numpy()
+        batch = X[np.random.default_rng(0).integers(0, len(X), players)]
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = win_model.save_model(model, os.path.join(tmp, 'win_model.joblib'))
+            self.stdout.write(f"\nArtifact size: {path.stat().st_size / 1024:.0f} KiB")
+            for mmap_mode in (None, 'r'):
+                started = time.perf_counter()
+                ml.joblib().load(path, mmap_mode=mmap_mode)
+                self.stdout.write(
+                    f"  load (mmap_mode={mmap_mode!s:<4}): {(time.perf_counter() - started) * 1000:.1f}ms"
+                )
+
+        started = time.perf_counter()
+        win_model.predict_matrix(model, batch)
+        batched = time.perf_counter() - started
+
+        sample = batch[:min(200, players)]
+        started = time.perf_counter()
+        for row in sample:
+            win_model.predict_matrix(model, row.reshape(1, -1))
+        per_player = (time.perf_counter() - started) / len(sample)
+
+        self.stdout.write(f"Batched inference: {players} players in {batched * 1000:.1f}ms "
+                          f"({batched / players * 1e6:.1f}µs/player)")
+        self.stdout.write(f"Per-player inference: {per_player * 1e6:.1f}µs/player")
+        self.stdout.write(self.style.SUCCESS(f"Batching speedup: {per_player * players / batched:.0f}x"))
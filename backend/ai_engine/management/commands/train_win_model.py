@@ -0,0 +1,24 @@
+"""
+Management command to train and persist the win-probability model.
+Run: python manage.py train_win_model
+"""
+from django.core.management.base import BaseCommand, CommandError
+from ai_engine import win_model
+
+
+class Command(BaseCommand):
+    help = 'Train the win-probability model from tournament history'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', help='Where to write the model (defaults to WIN_MODEL_PATH)')
+
+    def handle(self, *args, **options):
+        try:
+            summary = win_model.train_and_save(options['path'])
+        except win_model.NotEnoughTrainingData as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Trained on {summary['samples']} placements "
+            f"({summary['positive_rate'] * 100:.1f}% wins) -> {summary['path']}"
+        ))
@@ -0,0 +1,61 @@
+# Generated by Django 4.2.7 on 2026-10-19 05:30
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("ai_engine", "0002_aiprocessingjob_job_type_aiprocessingjob_result_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PlayerStatsSummary",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "game",
+                    models.CharField(
+                        blank=True,
+                        default="",
+                        help_text="Game, or blank for all games",
+                        max_length=100,
+                    ),
+                ),
+                ("total_tournaments", models.IntegerField(default=0)),
+                ("games_played", models.IntegerField(default=0)),
+                ("win_rate", models.FloatField(default=0.5)),
+                ("skill_consistency", models.FloatField(default=0.5)),
+                ("total_xp", models.IntegerField(default=0)),
+                ("rank", models.CharField(default="Unranked", max_length=100)),
+                ("teams_count", models.IntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="stats_summaries",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Player Stats Summary",
+                "verbose_name_plural": "Player Stats Summaries",
+                "db_table": "player_stats_summary",
+                "unique_together": {("user", "game")},
+            },
+        ),
+    ]
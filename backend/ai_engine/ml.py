@@ -0,0 +1,73 @@
+"""
+Lazy access to the heavy ML/LLM libraries (numpy, scikit-learn, joblib, openai).
+Web workers import ai_engine without paying for these; they are loaded on
+first use, or up front by warm_up() which only runs in Celery workers
+(see vinverse/celery.py).
+"""
+import importlib
+import importlib.util
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Modules that must never be imported just by loading the web app
+HEAVY_MODULES = ('numpy', 'sklearn', 'scipy', 'joblib', 'openai')
+
+
+def is_available(module_name):
+    """Check a library is installed without importing it."""
+    return importlib.util.find_spec(module_name) is not None
+
+
+NUMPY_AVAILABLE = is_available('numpy')
+SKLEARN_AVAILABLE = NUMPY_AVAILABLE and is_available('sklearn')
+JOBLIB_AVAILABLE = is_available('joblib')
+OPENAI_AVAILABLE = is_available('openai')
+
+
+def numpy():
+    return importlib.import_module('numpy')
+
+
+def joblib():
+    return importlib.import_module('joblib')
+
+
+def openai():
+    return importlib.import_module('openai')
+
+
+def sklearn(module_name):
+    """Import a scikit-learn submodule, e.g. sklearn('ensemble')."""
+    return importlib.import_module(f'sklearn.{module_name}')
+
+
+def warm_up():
+    """
+    Import the heavy libraries and load the win model ahead of the first task.
+    Failures are logged; tasks fall back to importing on demand.
+    """
+    started = time.perf_counter()
+    modules = []
+    if NUMPY_AVAILABLE:
+        modules.append('numpy')
+    if SKLEARN_AVAILABLE:
+        modules += ['sklearn.ensemble', 'sklearn.pipeline', 'sklearn.preprocessing']
+    if JOBLIB_AVAILABLE:
+        modules.append('joblib')
+    if OPENAI_AVAILABLE:
+        modules.append('openai')
+
+    for module_name in modules:
+        try:
+            importlib.import_module(module_name)
+        except Exception as e:
+            logger.warning(f"AI engine warm-up: failed to import {module_name}: {e}")
+
+    from . import win_model
+    model_loaded = win_model.load_model() is not None
+    logger.info(
+        f"AI engine warm-up finished in {(time.perf_counter() - started) * 1000:.0f}ms "
+        f"(modules: {', '.join(modules) or 'none'}, win model loaded: {model_loaded})"
+    )
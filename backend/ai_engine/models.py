@@ -46,3 +46,35 @@ class AIProcessingJob(models.Model):
     def __str__(self):
         return f"AI Job for {self.user.username} - {self.tournament.name}"
 
+
+
+class PlayerStatsSummary(models.Model):
+    """
+    Precomputed player statistics per (user, game).
+    The row with game='' holds the all-games totals. Rows are rebuilt by
+    ai_engine.signals whenever participations, team memberships or XP change,
+    so profile views read a single row instead of aggregating.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='stats_summaries'
+    )
+    game = models.CharField(max_length=100, blank=True, default='', help_text="Game, or blank for all games")
+    total_tournaments = models.IntegerField(default=0)
+    games_played = models.IntegerField(default=0)
+    win_rate = models.FloatField(default=0.5)
+    skill_consistency = models.FloatField(default=0.5)
+    total_xp = models.IntegerField(default=0)
+    rank = models.CharField(max_length=100, default='Unranked')
+    teams_count = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'player_stats_summary'
+        unique_together = ['user', 'game']
+        verbose_name = 'Player Stats Summary'
+        verbose_name_plural = 'Player Stats Summaries'
+    
+    def __str__(self):
+        return f"Stats for {self.user.username} ({self.game or 'all games'})"
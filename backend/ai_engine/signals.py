@@ -0,0 +1,85 @@
+"""
+Keep PlayerStatsSummary rows current.
+Any change to a user's tournaments, team memberships, XP or rank schedules a
+rebuild of that user's summary once the surrounding transaction commits.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save, pre_delete
+from django.dispatch import receiver
+from tournaments.models import Tournament, TournamentParticipant
+from gamerlink.models import Team
+from .stats import refresh_player_stats
+
+TRACKED_USER_FIELDS = ('xp_points', 'rank')
+
+
+def schedule_refresh(user_ids):
+    """Rebuild summaries after commit (each user once per call)."""
+    for user_id in set(user_ids):
+        transaction.on_commit(lambda user_id=user_id: refresh_player_stats(user_id))
+
+
+@receiver(post_save, sender=TournamentParticipant)
+@receiver(post_delete, sender=TournamentParticipant)
+def participant_changed(sender, instance, **kwargs):
+    schedule_refresh([instance.user_id])
+
+
+@receiver(post_save, sender=Tournament)
+def tournament_changed(sender, instance, created, **kwargs):
+    # The game may have changed, which moves participants between per-game rows
+    if not created:
+        schedule_refresh(instance.participants.values_list('user_id', flat=True))
+
+
+@receiver(m2m_changed, sender=Team.members.through)
+def team_members_changed(sender, instance, action, reverse, model, pk_set, **kwargs):
+    if action == 'pre_clear':
+        # pk_set is None for clear(); remember who is about to be removed
+        if reverse:
+            instance._stats_cleared_ids = [instance.pk]
+        else:
+            instance._stats_cleared_ids = list(instance.members.values_list('id', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if reverse:
+        # user.teams.add(...): only this user's team count changes
+        user_ids = [instance.pk]
+    elif action == 'post_clear':
+        user_ids = getattr(instance, '_stats_cleared_ids', [])
+    else:
+        user_ids = pk_set or []
+    schedule_refresh(user_ids)
+
+
+@receiver(pre_delete, sender=Team)
+def team_deleting(sender, instance, **kwargs):
+    instance._stats_member_ids = list(instance.members.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Team)
+def team_deleted(sender, instance, **kwargs):
+    schedule_refresh(getattr(instance, '_stats_member_ids', []))
+
+
+@receiver(post_init, sender=settings.AUTH_USER_MODEL)
+def remember_user_stats_fields(sender, instance, **kwargs):
+    deferred = instance.get_deferred_fields()
+    instance._stats_snapshot = tuple(
+        None if field in deferred else getattr(instance, field) for field in TRACKED_USER_FIELDS
+    )
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def user_stats_fields_changed(sender, instance, created, update_fields=None, **kwargs):
+    if created:
+        return
+    if update_fields is not None and not set(update_fields) & set(TRACKED_USER_FIELDS):
+        return
+    current = tuple(getattr(instance, field) for field in TRACKED_USER_FIELDS)
+    if current != getattr(instance, '_stats_snapshot', None):
+        instance._stats_snapshot = current
+        schedule_refresh([instance.pk])
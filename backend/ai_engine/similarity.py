@@ -0,0 +1,42 @@
+"""
+Lightweight text similarity for teammate recommendations.
+Reproduces scikit-learn's TfidfVectorizer defaults (lowercase, 2+ character
+word tokens, smoothed idf, l2 norm) fitted on the pair of documents being
+compared, without importing scikit-learn into web workers.
+"""
+import math
+import re
+from collections import Counter
+
+TOKEN_PATTERN = re.compile(r"(?u)\b\w\w+\b")
+
+
+def _tokens(text):
+    return Counter(TOKEN_PATTERN.findall(text.lower()))
+
+
+def tfidf_cosine_similarity(text_a, text_b):
+    """
+    Cosine similarity of two texts' TF-IDF vectors (0-1).
+    Raises ValueError when neither text has a usable token, like
+    TfidfVectorizer does for an empty vocabulary.
+    """
+    counts_a, counts_b = _tokens(text_a), _tokens(text_b)
+    vocabulary = counts_a.keys() | counts_b.keys()
+    if not vocabulary:
+        raise ValueError('empty vocabulary; perhaps the documents only contain stop words')
+
+    # Smoothed idf over the two-document corpus: ln((1 + n) / (1 + df)) + 1
+    idf = {
+        term: math.log(3 / (1 + (term in counts_a) + (term in counts_b))) + 1
+        for term in vocabulary
+    }
+    weights_a = {term: count * idf[term] for term, count in counts_a.items()}
+    weights_b = {term: count * idf[term] for term, count in counts_b.items()}
+
+    norm_a = math.sqrt(sum(w * w for w in weights_a.values()))
+    norm_b = math.sqrt(sum(w * w for w in weights_b.values()))
+    if not norm_a or not norm_b:
+        return 0.0
+    dot = sum(weight * weights_b[term] for term, weight in weights_a.items() if term in weights_b)
+    return dot / (norm_a * norm_b)
@@ -0,0 +1,181 @@
+"""
+Precomputed player statistics.
+PlayerStatsSummary rows are rebuilt per user by the signals in
+ai_engine.signals; reads go through a cache whose keys carry a per-user
+version, so a rebuild invalidates every cached game at once. With the
+database cache (no Redis) reads go straight to the summary row, which costs
+the same one query, and a cache that errors is skipped the same way.
+"""
+import logging
+import time
+from django.contrib.auth import get_user_model
+from django.core.cache import cache, caches
+from django.core.cache.backends.db import DatabaseCache
+from django.db.models import Count
+from tournaments.models import TournamentParticipant
+from gamerlink.models import Team
+from .models import PlayerStatsSummary
+
+User = get_user_model()
+logger = logging.getLogger(__name__)
+
+# Bump when the cached dict changes shape
+STATS_SCHEMA_VERSION = 1
+STATS_CACHE_TIMEOUT = 60 * 60
+
+STATS_FIELDS = (
+    'total_tournaments', 'win_rate', 'skill_consistency', 'total_xp',
+    'rank', 'teams_count', 'games_played',
+)
+
+
+def win_rate_from(xp_points, total_tournaments):
+    """Win rate estimate used across the app (participation + XP proxy)."""
+    if total_tournaments == 0:
+        return 0.5  # Default 50% if no data
+    return 0.5 + (xp_points / (total_tournaments * 1000))
+
+
+def skill_consistency_from(xp_points, total_tournaments):
+    """Skill consistency index (0-1), with XP as a proxy for performance."""
+    if total_tournaments < 2:
+        return 0.5  # Default consistency
+    return min(1.0, max(0.0, 1.0 - (xp_points % 100) / 100))
+
+
+def _version_key(user_id):
+    return f'player_stats_version:{user_id}'
+
+
+def _stats_key(user_id, game, version):
+    return f'player_stats:v{STATS_SCHEMA_VERSION}:{user_id}:{version}:{game}'
+
+
+def _cache_enabled():
+    return not isinstance(caches['default'], DatabaseCache)
+
+
+def _new_version():
+    # From the clock, so a version key that was evicted never comes back
+    # as a value older entries are still cached under
+    return time.time_ns() // 1000
+
+
+def _stats_version(user_id):
+    key = _version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _new_version(), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_stats_version(user_id):
+    """Invalidate every cached stats entry of a user."""
+    if not _cache_enabled():
+        return
+    key = _version_key(user_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # No version yet (or it was evicted): start a fresh one, or move on
+        # from one a reader seeded meanwhile
+        if not cache.add(key, _new_version(), None):
+            cache.incr(key)
+    except Exception as e:
+        logger.warning(f"Player stats cache unavailable, version of user {user_id} not bumped: {e}")
+
+
+def refresh_player_stats(user_id):
+    """
+    Rebuild all of a user's summary rows (all-games + one per game played)
+    with three grouped queries, then invalidate their cache entries.
+    """
+    user = User.objects.filter(id=user_id).values('xp_points', 'rank').first()
+    if user is None:
+        return
+
+    per_game = dict(
+        TournamentParticipant.objects.filter(user_id=user_id)
+        .values_list('tournament__game')
+        .annotate(count=Count('id'))
+    )
+    teams_count = Team.objects.filter(members=user_id).count()
+
+    xp_points, rank = user['xp_points'], user['rank'] or 'Unranked'
+
+    def summary(game, total, games_played):
+        return PlayerStatsSummary(
+            user_id=user_id,
+            game=game,
+            total_tournaments=total,
+            games_played=games_played,
+            win_rate=win_rate_from(xp_points, total),
+            skill_consistency=skill_consistency_from(xp_points, total),
+            total_xp=xp_points,
+            rank=rank,
+            teams_count=teams_count,
+        )
+
+    rows = [summary('', sum(per_game.values()), len(per_game))]
+    rows += [summary(game, count, 1) for game, count in per_game.items()]
+
+    PlayerStatsSummary.objects.bulk_create(
+        rows,
+        update_conflicts=True,
+        unique_fields=['user', 'game'],
+        update_fields=[
+            'total_tournaments', 'games_played', 'win_rate', 'skill_consistency',
+            'total_xp', 'rank', 'teams_count', 'updated_at',
+        ],
+    )
+    PlayerStatsSummary.objects.filter(user_id=user_id).exclude(
+        game__in=[row.game for row in rows]
+    ).delete()
+    bump_stats_version(user_id)
+
+
+def _as_dict(summary):
+    return {field: getattr(summary, field) for field in STATS_FIELDS}
+
+
+def get_player_stats(user_id, game=None):
+    """
+    Stats dict for a user (optionally one game), or None if the user doesn't exist.
+    Served from cache, else one summary row; rows are built on first access.
+    """
+    game = game or ''
+    key = None
+    if _cache_enabled():
+        try:
+            key = _stats_key(user_id, game, _stats_version(user_id))
+            stats = cache.get(key)
+        except Exception as e:
+            logger.warning(f"Player stats cache unavailable, reading the summary row: {e}")
+            key = stats = None
+        if stats is not None:
+            return stats
+
+    summary = PlayerStatsSummary.objects.filter(user_id=user_id, game=game).first()
+    if summary is None:
+        overall = PlayerStatsSummary.objects.filter(user_id=user_id, game='').first()
+        if overall is None:
+            if not User.objects.filter(id=user_id).exists():
+                return None
+            refresh_player_stats(user_id)
+            return get_player_stats(user_id, game)
+        if game:
+            # No tournaments in this game: the totals row has everything else
+            summary = overall
+            summary.total_tournaments = 0
+            summary.games_played = 0
+            summary.win_rate = win_rate_from(summary.total_xp, 0)
+            summary.skill_consistency = skill_consistency_from(summary.total_xp, 0)
+
+    stats = _as_dict(summary)
+    if key is not None:
+        try:
+            cache.set(key, stats, STATS_CACHE_TIMEOUT)
+        except Exception as e:
+            logger.warning(f"Player stats cache unavailable, not caching: {e}")
+    return stats
@@ -7,66 +7,43 @@ from django.contrib.auth import get_user_model
 from django.db.models import Count, Avg, Q
 from tournaments.models import Tournament, TournamentParticipant
 from gamerlink.models import MatchInsight, Team
+from notifications.realtime import push_to_user, notify_user
+from . import ml, win_model
+from .stats import get_player_stats
 from decouple import config
 import json
+import logging
+import time
 from decimal import Decimal
 
-# Try to import ML libraries
-try:
-    import numpy as np
-    NUMPY_AVAILABLE = True
-except ImportError:
-    NUMPY_AVAILABLE = False
-    np = None
-
-try:
-    from sklearn.ensemble import RandomForestClassifier
-    from sklearn.preprocessing import StandardScaler
-    SKLEARN_AVAILABLE = True
-except ImportError:
-    SKLEARN_AVAILABLE = False
-
-# Try to import OpenAI (optional)
-try:
-    import openai
-    OPENAI_AVAILABLE = True
-except ImportError:
-    OPENAI_AVAILABLE = False
+# Heavy ML/LLM libraries are imported on first use (see ai_engine/ml.py)
+NUMPY_AVAILABLE = ml.NUMPY_AVAILABLE
+SKLEARN_AVAILABLE = ml.SKLEARN_AVAILABLE
+OPENAI_AVAILABLE = ml.OPENAI_AVAILABLE
 
 User = get_user_model()
+logger = logging.getLogger(__name__)
 
 # OpenAI API Key
 OPENAI_API_KEY = config('OPENAI_API_KEY', default='')
+# Optional OpenAI-compatible endpoint (e.g. a local fake streaming server)
+OPENAI_BASE_URL = config('OPENAI_BASE_URL', default='')
+OPENAI_MODEL = config('OPENAI_MODEL', default='gpt-3.5-turbo')
+
+# Minimum gap between token pushes while streaming; the first token is always sent immediately
+TOKEN_PUSH_INTERVAL = 0.05
 
 
 def calculate_win_rate(user, game=None):
-    """Calculate user's win rate from tournaments."""
-    tournaments = Tournament.objects.filter(participants__user=user)
-    if game:
-        tournaments = tournaments.filter(game=game)
-    
-    total_tournaments = tournaments.count()
-    if total_tournaments == 0:
-        return 0.5  # Default 50% if no data
-    
-    # For now, assume participation = some success (can be enhanced with actual match results)
-    # In a real system, you'd track actual wins/losses
-    return 0.5 + (user.xp_points / (total_tournaments * 1000)) if total_tournaments > 0 else 0.5
+    """Calculate user's win rate from tournaments (precomputed summary)."""
+    stats = get_player_stats(user.id, game)
+    return stats['win_rate'] if stats else 0.5
 
 
 def calculate_skill_consistency(user, game=None):
-    """Calculate skill consistency index (0-1)."""
-    tournaments = Tournament.objects.filter(participants__user=user)
-    if game:
-        tournaments = tournaments.filter(game=game)
-    
-    if tournaments.count() < 2:
-        return 0.5  # Default consistency
-    
-    # Use XP points as a proxy for performance consistency
-    # In real system, use actual match performance metrics
-    consistency = min(1.0, max(0.0, 1.0 - (user.xp_points % 100) / 100))
-    return consistency
+    """Calculate skill consistency index (0-1) (precomputed summary)."""
+    stats = get_player_stats(user.id, game)
+    return stats['skill_consistency'] if stats else 0.5
 
 
 def calculate_mvp_score(user, tournament):
@@ -98,7 +75,23 @@ def calculate_mvp_score(user, tournament):
 
 
 def predict_win_probability(user, tournament, team_members=None):
-    """Predict win probability using ML model (simplified version)."""
+    """
+    Predict win probability.
+    Uses the trained model when one has been persisted (python manage.py
+    train_win_model), scoring the player and teammates in one batch;
+    otherwise falls back to the hand-weighted formula below.
+    """
+    team_members = list(team_members or [])
+    probabilities = win_model.predict_win_probabilities(
+        [user.id] + [member.id for member in team_members], tournament.game
+    )
+    if probabilities is not None:
+        probability = probabilities[user.id]
+        if team_members:
+            team_average = sum(probabilities[member.id] for member in team_members) / len(team_members)
+            probability = probability * 0.9 + team_average * 0.1
+        return probability
+
     if not SKLEARN_AVAILABLE:
         # Fallback: Simple heuristic
         win_rate = calculate_win_rate(user, tournament.game)
@@ -122,6 +115,7 @@ def predict_win_probability(user, tournament, team_members=None):
     
     # ML-based prediction (simplified - would need more features in production)
     if NUMPY_AVAILABLE:
+        np = ml.numpy()
         features = np.array([[
             calculate_win_rate(user, tournament.game),
             calculate_skill_consistency(user, tournament.game),
@@ -140,17 +134,161 @@ def predict_win_probability(user, tournament, team_members=None):
         return min(0.95, max(0.05, probability))
 
 
-@shared_task
-def generate_match_insight(user_id, tournament_id):
+def publish_insight_progress(user_id, task_id, tournament_id, stage, progress):
+    """Tell the user's sockets how far insight generation has got."""
+    push_to_user(user_id, 'insight_progress', {
+        'task_id': task_id,
+        'tournament_id': tournament_id,
+        'stage': stage,
+        'progress': progress,
+    })
+
+
+def publish_insight_ready(insight, task_id, notify=True):
+    """Push the finished insight and record an ai_insight notification."""
+    from .serializers import MatchInsightSerializer
+
+    push_to_user(insight.user_id, 'insight_ready', {
+        'task_id': task_id,
+        'tournament_id': insight.tournament_id,
+        'insight': MatchInsightSerializer(insight).data,
+    })
+    if not notify:
+        return
+    notify_user(
+        insight.user,
+        'ai_insight',
+        'AI Insight Ready',
+        f"Your insight for {insight.tournament.name} is ready",
+        related_url=f'/dashboard?tab=insights&insight={insight.id}',
+    )
+
+
+def publish_insight_failed(user_id, task_id, tournament_id, error):
+    """Tell the user's sockets that insight generation failed."""
+    push_to_user(user_id, 'insight_failed', {
+        'task_id': task_id,
+        'tournament_id': tournament_id,
+        'error': error,
+    })
+
+
+def build_insight_prompt(context):
+    """Build the analyst prompt for a player's tournament context."""
+    return f"""Analyze the following tournament performance and provide insights:
+
+Player: {context['username']} ({context['gamer_tag']})
+Rank: {context['rank']}
+Tournament: {context['tournament_name']}
+Game: {context['game']}
+Prize Pool: ${context['prize_pool']}
+Date: {context['date']}
+
+Performance Metrics:
+- Win Probability: {context['win_probability']}
+- Skill Consistency: {context['skill_consistency']}
+- MVP Score: {context['mvp_score']}/100
+
+Provide a comprehensive analysis with:
+1. Performance summary (2-3 sentences)
+2. List of 3-5 key strengths
+3. List of 3-5 areas for improvement
+
+Format as JSON with keys: summary, strengths (array), improvements (array)"""
+
+
+def get_openai_client():
+    """OpenAI client, pointed at OPENAI_BASE_URL when configured."""
+    return ml.openai().OpenAI(api_key=OPENAI_API_KEY, base_url=OPENAI_BASE_URL or None)
+
+
+def _insight_messages(prompt):
+    return [
+        {"role": "system", "content": "You are an esports analyst providing tournament performance insights."},
+        {"role": "user", "content": prompt}
+    ]
+
+
+def request_insight_completion(prompt):
+    """Run a blocking completion and return the full response text."""
+    response = get_openai_client().chat.completions.create(
+        model=OPENAI_MODEL,
+        messages=_insight_messages(prompt),
+        max_tokens=500,
+        temperature=0.7
+    )
+    return response.choices[0].message.content
+
+
+def stream_insight_completion(prompt, user_id, task_id, tournament_id, on_token=None):
+    """
+    Stream a completion, forwarding tokens to the user's group as they arrive.
+    Tokens are coalesced into one push per TOKEN_PUSH_INTERVAL, except the first
+    which goes out immediately.
+    Returns (full_text, time_to_first_token_ms).
+    """
+    started = time.perf_counter()
+    ttft_ms = None
+    parts = []
+    pending = []
+    last_push = 0.0
+
+    def flush():
+        push_to_user(user_id, 'insight_token', {
+            'task_id': task_id,
+            'tournament_id': tournament_id,
+            'token': ''.join(pending),
+        })
+        pending.clear()
+
+    response = get_openai_client().chat.completions.create(
+        model=OPENAI_MODEL,
+        messages=_insight_messages(prompt),
+        max_tokens=500,
+        temperature=0.7,
+        stream=True,
+    )
+    for chunk in response:
+        if not chunk.choices:
+            continue
+        token = chunk.choices[0].delta.content
+        if not token:
+            continue
+
+        now = time.perf_counter()
+        if ttft_ms is None:
+            ttft_ms = (now - started) * 1000
+            logger.info(f"Insight task {task_id}: first token after {ttft_ms:.0f}ms")
+        parts.append(token)
+        pending.append(token)
+        if on_token:
+            on_token(token)
+        if now - last_push >= TOKEN_PUSH_INTERVAL:
+            flush()
+            last_push = now
+
+    if pending:
+        flush()
+    return ''.join(parts), ttft_ms
+
+
+@shared_task(bind=True)
+def generate_match_insight(self, user_id, tournament_id, stream=False):
     """
     Generate AI match insight with ML models for:
     - Win prediction
     - Skill consistency index
     - MVP scoring
+    Progress, completion and failure are pushed to the user's Channels group.
+    With stream=True the OpenAI completion is streamed and tokens are
+    forwarded to the same group as they arrive.
     """
+    task_id = self.request.id
+    ttft_ms = None
     try:
         user = User.objects.get(id=user_id)
         tournament = Tournament.objects.get(id=tournament_id)
+        publish_insight_progress(user_id, task_id, tournament_id, 'started', 10)
         
         # Check if insight already exists
         insight, created = MatchInsight.objects.get_or_create(
@@ -164,6 +302,7 @@ def generate_match_insight(user_id, tournament_id):
         )
         
         if not created and insight.summary and insight.summary != 'Processing...':
+            publish_insight_ready(insight, task_id, notify=False)
             return {'status': 'exists', 'insight_id': insight.id}
         
         # Calculate ML metrics
@@ -191,44 +330,19 @@ def generate_match_insight(user_id, tournament_id):
             'skill_consistency': f"{skill_consistency * 100:.1f}%",
             'mvp_score': f"{mvp_score:.1f}",
         }
+        publish_insight_progress(user_id, task_id, tournament_id, 'metrics', 40)
         
         # Generate AI insight using OpenAI
         if OPENAI_AVAILABLE and OPENAI_API_KEY:
             try:
-                client = openai.OpenAI(api_key=OPENAI_API_KEY)
-                
-                prompt = f"""Analyze the following tournament performance and provide insights:
-
-Player: {context['username']} ({context['gamer_tag']})
-Rank: {context['rank']}
-Tournament: {context['tournament_name']}
-Game: {context['game']}
-Prize Pool: ${context['prize_pool']}
-Date: {context['date']}
-
-Performance Metrics:
-- Win Probability: {context['win_probability']}
-- Skill Consistency: {context['skill_consistency']}
-- MVP Score: {context['mvp_score']}/100
-
-Provide a comprehensive analysis with:
-1. Performance summary (2-3 sentences)
-2. List of 3-5 key strengths
-3. List of 3-5 areas for improvement
-
-Format as JSON with keys: summary, strengths (array), improvements (array)"""
-
-                response = client.chat.completions.create(
-                    model="gpt-3.5-turbo",
-                    messages=[
-                        {"role": "system", "content": "You are an esports analyst providing tournament performance insights."},
-                        {"role": "user", "content": prompt}
-                    ],
-                    max_tokens=500,
-                    temperature=0.7
-                )
-                
-                ai_response = response.choices[0].message.content
+                publish_insight_progress(user_id, task_id, tournament_id, 'generating', 70)
+                prompt = build_insight_prompt(context)
+                if stream:
+                    ai_response, ttft_ms = stream_insight_completion(
+                        prompt, user_id, task_id, tournament_id
+                    )
+                else:
+                    ai_response = request_insight_completion(prompt)
                 
                 # Try to parse as JSON
                 try:
@@ -246,8 +360,9 @@ Format as JSON with keys: summary, strengths (array), improvements (array)"""
                 insight.strengths = insight_data.get('strengths', [])
                 insight.improvements = insight_data.get('improvements', [])
                 insight.score = Decimal(str(mvp_score))
-                insight.ai_model = 'gpt-3.5-turbo'
+                insight.ai_model = OPENAI_MODEL
                 insight.save()
+                publish_insight_ready(insight, task_id)
                 
                 return {
                     'status': 'success',
@@ -255,6 +370,8 @@ Format as JSON with keys: summary, strengths (array), improvements (array)"""
                     'win_probability': win_probability,
                     'skill_consistency': skill_consistency,
                     'mvp_score': mvp_score,
+                    'streamed': stream,
+                    'time_to_first_token_ms': ttft_ms,
                 }
                 
             except Exception as e:
@@ -265,6 +382,7 @@ Format as JSON with keys: summary, strengths (array), improvements (array)"""
                 insight.score = Decimal(str(mvp_score))
                 insight.ai_model = 'ml-only'
                 insight.save()
+                publish_insight_ready(insight, task_id)
                 return {'status': 'success', 'insight_id': insight.id, 'note': 'ML-only (OpenAI error: ' + str(e) + ')'}
         else:
             # ML-only insights (no OpenAI)
@@ -282,6 +400,7 @@ Format as JSON with keys: summary, strengths (array), improvements (array)"""
             insight.score = Decimal(str(mvp_score))
             insight.ai_model = 'ml-only'
             insight.save()
+            publish_insight_ready(insight, task_id)
             
             return {
                 'status': 'success',
@@ -295,7 +414,22 @@ Format as JSON with keys: summary, strengths (array), improvements (array)"""
     except User.DoesNotExist:
         return {'status': 'error', 'error': 'User not found'}
     except Tournament.DoesNotExist:
+        publish_insight_failed(user_id, task_id, tournament_id, 'Tournament not found')
         return {'status': 'error', 'error': 'Tournament not found'}
+    except Exception as e:
+        publish_insight_failed(user_id, task_id, tournament_id, str(e))
+        return {'status': 'error', 'error': str(e)}
+
+
+@shared_task
+def train_win_probability_model():
+    """Retrain the win-probability model from tournament history and persist it."""
+    try:
+        summary = win_model.train_and_save()
+        logger.info(f"Trained win model on {summary['samples']} samples -> {summary['path']}")
+        return {'status': 'success', **summary}
+    except win_model.NotEnoughTrainingData as e:
+        return {'status': 'skipped', 'error': str(e)}
     except Exception as e:
         return {'status': 'error', 'error': str(e)}
 
@@ -304,24 +438,11 @@ Format as JSON with keys: summary, strengths (array), improvements (array)"""
 def calculate_player_stats(user_id, game=None):
     """Calculate comprehensive player statistics."""
     try:
-        user = User.objects.get(id=user_id)
-        
-        tournaments = Tournament.objects.filter(participants__user=user)
-        if game:
-            tournaments = tournaments.filter(game=game)
-        
-        stats = {
-            'total_tournaments': tournaments.count(),
-            'win_rate': calculate_win_rate(user, game),
-            'skill_consistency': calculate_skill_consistency(user, game),
-            'total_xp': user.xp_points,
-            'rank': user.rank or 'Unranked',
-            'teams_count': Team.objects.filter(members=user).count(),
-        }
+        stats = get_player_stats(user_id, game)
+        if stats is None:
+            return {'status': 'error', 'error': 'User not found'}
         
         return {'status': 'success', 'stats': stats}
-    except User.DoesNotExist:
-        return {'status': 'error', 'error': 'User not found'}
     except Exception as e:
         return {'status': 'error', 'error': str(e)}
 
@@ -8,6 +8,7 @@ from rest_framework.response import Response
 from gamerlink.models import MatchInsight
 from .serializers import MatchInsightSerializer
 from .tasks import generate_match_insight, calculate_player_stats
+from .stats import get_player_stats
 from tournaments.models import Tournament
 from django.contrib.auth import get_user_model
 
@@ -55,12 +56,15 @@ class MatchInsightViewSet(viewsets.ReadOnlyModelViewSet):
                 status=status.HTTP_404_NOT_FOUND
             )
         
-        # Trigger async task
-        task = generate_match_insight.delay(request.user.id, tournament_id)
+        # Trigger async task; progress and the result are pushed to ws/notifications/
+        stream = str(request.data.get('stream', '')).lower() in ('1', 'true')
+        task = generate_match_insight.delay(request.user.id, tournament_id, stream=stream)
         
         return Response({
             'message': 'AI insight generation started',
             'task_id': task.id,
+            'stream': stream,
+            'events': 'ws/notifications/',
         }, status=status.HTTP_202_ACCEPTED)
     
     @action(detail=False, methods=['get'])
@@ -69,30 +73,13 @@ class MatchInsightViewSet(viewsets.ReadOnlyModelViewSet):
         user_id = request.query_params.get('user_id', request.user.id)
         game = request.query_params.get('game', None)
         
-        try:
-            user = User.objects.get(id=user_id)
-            # Calculate stats synchronously for now (can be async if needed)
-            from .tasks import calculate_win_rate, calculate_skill_consistency
-            from gamerlink.models import Team
-            
-            tournaments = Tournament.objects.filter(participants__user=user)
-            if game:
-                tournaments = tournaments.filter(game=game)
-            
-            stats = {
-                'total_tournaments': tournaments.count(),
-                'win_rate': calculate_win_rate(user, game),
-                'skill_consistency': calculate_skill_consistency(user, game),
-                'total_xp': user.xp_points,
-                'rank': user.rank or 'Unranked',
-                'teams_count': Team.objects.filter(members=user).count(),
-                'games_played': tournaments.values('game').distinct().count(),
-            }
-            
-            return Response(stats, status=status.HTTP_200_OK)
-        except User.DoesNotExist:
+        # One cached summary row, kept current by ai_engine.signals
+        stats = get_player_stats(user_id, game)
+        if stats is None:
             return Response(
                 {'error': 'User not found'},
                 status=status.HTTP_404_NOT_FOUND
             )
+        
+        return Response(stats, status=status.HTTP_200_OK)
 
@@ -0,0 +1,305 @@
+"""
+Trained win-probability model.
+Builds a feature matrix from tournament history, trains a scaled random
+forest, persists it with joblib (uncompressed, so its numpy arrays can be
+memory-mapped) and serves batched predictions from a per-process cache.
+"""
+import logging
+import os
+import tempfile
+import threading
+from collections import defaultdict
+from pathlib import Path
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import Avg, Count, ExpressionWrapper, F, FloatField, Q, Value
+from django.utils import timezone
+from tournaments.models import TournamentParticipant
+from gamerlink.models import Team
+from . import ml
+
+# numpy/scikit-learn/joblib are imported inside the functions that need them
+ML_AVAILABLE = ml.SKLEARN_AVAILABLE and ml.JOBLIB_AVAILABLE
+
+logger = logging.getLogger(__name__)
+User = get_user_model()
+
+MODEL_VERSION = 1
+
+# Column order of the feature matrix; persisted with the model and checked on load
+FEATURES = [
+    'tournaments_played',
+    'game_tournaments_played',
+    'prior_win_rate',
+    'avg_placement_score',
+    'rank_score',
+    'xp_score',
+    'team_count',
+]
+
+RANK_SCORES = {
+    'Iron': 0.2, 'Bronze': 0.3, 'Silver': 0.4, 'Gold': 0.5, 'Platinum': 0.6,
+    'Diamond': 0.7, 'Master': 0.8, 'Grandmaster': 0.9, 'Challenger': 0.95,
+}
+
+MIN_TRAINING_SAMPLES = 20
+
+_cache = {'path': None, 'mtime': None, 'bundle': None}
+_cache_lock = threading.Lock()
+
+
+class NotEnoughTrainingData(Exception):
+    """Raised when tournament history can't support training a model."""
+
+
+def rank_score(rank):
+    """Map a free-text rank (e.g. 'Gold II') to a 0-1 tier score."""
+    if rank:
+        # Check longer names first so 'Grandmaster' doesn't match 'Master'
+        for tier in sorted(RANK_SCORES, key=len, reverse=True):
+            if tier.lower() in rank.lower():
+                return RANK_SCORES[tier]
+    return 0.5
+
+
+def _feature_row(played, game_played, wins, placed, placement_score_sum, rank, xp, team_count):
+    return [
+        played,
+        game_played,
+        (wins + 1) / (placed + 2),  # Laplace-smoothed so newcomers start at 50%
+        placement_score_sum / placed if placed else 0.0,
+        rank_score(rank),
+        min(1.0, xp / 10000),
+        team_count,
+    ]
+
+
+def _team_counts(user_ids=None):
+    """(user_id, game) -> number of teams, in one grouped query."""
+    teams = Team.objects.filter(members__isnull=False)
+    if user_ids is not None:
+        teams = teams.filter(members__in=user_ids)
+    return {
+        (row['members'], row['game']): row['count']
+        for row in teams.values('members', 'game').annotate(count=Count('id'))
+    }
+
+
+def build_training_matrix():
+    """
+    Build (X, y, dates) from every participation with a recorded placement.
+    Features only use history from strictly earlier tournaments, so the model
+    never sees the result it's asked to predict. Labels are 1 for a win.
+    """
+    if not ML_AVAILABLE:
+        raise NotEnoughTrainingData('numpy, scikit-learn and joblib are required to train')
+    np = ml.numpy()
+
+    participations = TournamentParticipant.objects.values_list(
+        'user_id', 'tournament_id', 'tournament__game', 'tournament__date', 'placement'
+    ).order_by('tournament__date', 'tournament_id')
+
+    users = dict(User.objects.values_list('id', 'rank').iterator())
+    xp = dict(User.objects.values_list('id', 'xp_points').iterator())
+    team_counts = _team_counts()
+
+    played = defaultdict(int)
+    game_played = defaultdict(int)
+    wins = defaultdict(int)
+    placed = defaultdict(int)
+    placement_scores = defaultdict(float)
+
+    rows, labels, dates = [], [], []
+    pending = []  # Results of the current tournament, applied once it's finished
+    current_tournament = None
+
+    def apply_pending():
+        for user_id, game, placement in pending:
+            played[user_id] += 1
+            game_played[(user_id, game)] += 1
+            if placement:
+                placed[user_id] += 1
+                placement_scores[user_id] += 1 / placement
+                if placement == 1:
+                    wins[user_id] += 1
+        pending.clear()
+
+    for user_id, tournament_id, game, date, placement in participations.iterator():
+        if tournament_id != current_tournament:
+            apply_pending()
+            current_tournament = tournament_id
+
+        if placement:
+            rows.append(_feature_row(
+                played[user_id], game_played[(user_id, game)], wins[user_id], placed[user_id],
+                placement_scores[user_id], users.get(user_id), xp.get(user_id, 0),
+                team_counts.get((user_id, game), 0),
+            ))
+            labels.append(1 if placement == 1 else 0)
+            dates.append(date)
+        pending.append((user_id, game, placement))
+
+    if len(rows) < MIN_TRAINING_SAMPLES:
+        raise NotEnoughTrainingData(
+            f'Need at least {MIN_TRAINING_SAMPLES} placed participations, found {len(rows)}'
+        )
+    if len(set(labels)) < 2:
+        raise NotEnoughTrainingData('Training data needs both wins and losses')
+
+    return np.array(rows, dtype=np.float64), np.array(labels, dtype=np.int8), dates
+
+
+def player_features(user_ids, game=None):
+    """
+    Current feature matrix for many players at once (rows follow user_ids).
+    Costs three grouped queries regardless of how many players are passed.
+    """
+    np = ml.numpy()
+    user_ids = list(user_ids)
+    placement_score = ExpressionWrapper(Value(1.0) / F('placement'), output_field=FloatField())
+    history = {
+        row['user_id']: row
+        for row in TournamentParticipant.objects.filter(user_id__in=user_ids).values('user_id').annotate(
+            played=Count('id'),
+            game_played=Count('id', filter=Q(tournament__game=game)) if game else Count('id'),
+            # >= 1 like training (no division by a stray 0 either)
+            placed=Count('id', filter=Q(placement__gte=1)),
+            wins=Count('id', filter=Q(placement=1)),
+            placement_score=Avg(placement_score, filter=Q(placement__gte=1)),
+        )
+    }
+    profiles = {
+        row[0]: row[1:]
+        for row in User.objects.filter(id__in=user_ids).values_list('id', 'rank', 'xp_points')
+    }
+    if game:
+        team_counts = _team_counts(user_ids)
+    else:
+        team_counts = defaultdict(int)
+        for (user_id, _), count in _team_counts(user_ids).items():
+            team_counts[user_id] += count
+
+    rows = []
+    for user_id in user_ids:
+        stats = history.get(user_id, {})
+        placed = stats.get('placed', 0)
+        rank, xp = profiles.get(user_id, (None, 0))
+        rows.append(_feature_row(
+            stats.get('played', 0),
+            stats.get('game_played', 0),
+            stats.get('wins', 0),
+            placed,
+            (stats.get('placement_score') or 0.0) * placed,
+            rank,
+            xp,
+            team_counts.get((user_id, game) if game else user_id, 0),
+        ))
+    return np.array(rows, dtype=np.float64).reshape(len(rows), len(FEATURES))
+
+
+def train_model(X, y):
+    """Fit the scaler + random forest pipeline."""
+    model = ml.sklearn('pipeline').Pipeline([
+        ('scaler', ml.sklearn('preprocessing').StandardScaler()),
+        ('forest', ml.sklearn('ensemble').RandomForestClassifier(
+            n_estimators=200,
+            max_depth=8,
+            min_samples_leaf=5,
+            class_weight='balanced',
+            random_state=42,
+            n_jobs=1,
+        )),
+    ])
+    model.fit(X, y)
+    return model
+
+
+def model_path():
+    return Path(settings.WIN_MODEL_PATH)
+
+
+def save_model(model, path=None, **metadata):
+    """
+    Persist the model atomically. The dump is left uncompressed so joblib can
+    memory-map the forest's arrays, letting every worker share the same pages.
+    """
+    path = Path(path or model_path())
+    path.parent.mkdir(parents=True, exist_ok=True)
+    bundle = {
+        'version': MODEL_VERSION,
+        'features': FEATURES,
+        'trained_at': timezone.now().isoformat(),
+        'model': model,
+        **metadata,
+    }
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+    os.close(fd)
+    try:
+        ml.joblib().dump(bundle, tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return path
+
+
+def train_and_save(path=None):
+    """Build the feature matrix, train, persist and return a summary."""
+    X, y, _ = build_training_matrix()
+    model = train_model(X, y)
+    path = save_model(model, path, samples=len(y), positive_rate=float(y.mean()))
+    return {'path': str(path), 'samples': int(len(y)), 'positive_rate': float(y.mean())}
+
+
+def load_model(path=None):
+    """
+    Return the persisted model bundle, or None if no usable model exists.
+    Loaded once per process with mmap_mode='r'; a newer file on disk (e.g. after
+    retraining) is picked up on the next call.
+    """
+    if not ML_AVAILABLE:
+        return None
+    path = Path(path or model_path())
+    try:
+        mtime = path.stat().st_mtime
+    except FileNotFoundError:
+        return None
+
+    if _cache['path'] == path and _cache['mtime'] == mtime:
+        return _cache['bundle']
+
+    with _cache_lock:
+        if _cache['path'] == path and _cache['mtime'] == mtime:
+            return _cache['bundle']
+        try:
+            bundle = ml.joblib().load(path, mmap_mode='r')
+        except Exception as e:
+            logger.warning(f"Failed to load win model from {path}: {e}")
+            bundle = None
+        if bundle is not None and (bundle.get('version') != MODEL_VERSION or bundle.get('features') != FEATURES):
+            logger.warning(f"Ignoring win model at {path}: trained with a different feature set")
+            bundle = None
+        _cache.update(path=path, mtime=mtime, bundle=bundle)
+        return bundle
+
+
+def predict_matrix(model, X):
+    """Win probabilities for a feature matrix, clipped like the heuristic."""
+    classes = list(model.classes_)
+    probabilities = model.predict_proba(X)[:, classes.index(1)]
+    return ml.numpy().clip(probabilities, 0.05, 0.95)
+
+
+def predict_win_probabilities(user_ids, game=None):
+    """
+    Batched inference: {user_id: probability} for many players in one
+    predict_proba call. Returns None when no trained model is available.
+    """
+    bundle = load_model()
+    if bundle is None:
+        return None
+    user_ids = list(dict.fromkeys(user_ids))
+    if not user_ids:
+        return {}
+    probabilities = predict_matrix(bundle['model'], player_features(user_ids, game))
+    return {user_id: float(p) for user_id, p in zip(user_ids, probabilities)}
@@ -0,0 +1,275 @@
+"""
+Cold storage for old chat messages.
+Messages older than CHAT_ARCHIVE_AFTER_DAYS move out of the message table
+into MessageArchiveSegments: msgpack rows, zstd-compressed, one room and
+month each. Archiving only appends new segments (parts), so a run costs the
+messages it moves, not the size of the month; compaction later merges a
+finished month's parts into one segment. Each room's newest
+CHAT_HISTORY_SIZE messages stay hot whatever their age, since join history
+and resumes read them, so archived messages are always older than every
+hot one, and each part is older than the next. history.fetch_page
+continues into the segments when a page runs past the hot messages, which
+keeps ?before= paging the same on either side. Decoded segments are cached
+per process (CHAT_ARCHIVE_CACHE_SEGMENTS).
+Archiving and compaction run as Celery beat tasks (chat.tasks), or with
+`manage.py archive_chat`.
+"""
+import bisect
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+from functools import lru_cache
+import msgpack
+import zstandard
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+from .models import Message, MessageArchiveSegment, Room
+
+User = get_user_model()
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+# Row layout inside a segment
+ID, AUTHOR_ID, CONTENT, CREATED_AT, UPDATED_AT, IS_EDITED = range(6)
+
+
+def to_micros(value):
+    return (value - EPOCH) // timedelta(microseconds=1)
+
+
+def from_micros(value):
+    return EPOCH + timedelta(microseconds=value)
+
+
+def month_of(value):
+    return value.astimezone(dt_timezone.utc).date().replace(day=1)
+
+
+def cutoff_of(now=None):
+    """Messages created before this are archived (None: archiving is off)."""
+    days = settings.CHAT_ARCHIVE_AFTER_DAYS
+    if days <= 0:
+        return None
+    return (now or timezone.now()) - timedelta(days=days)
+
+
+def encode_rows(rows):
+    packed = msgpack.packb(rows, use_bin_type=True)
+    return zstandard.ZstdCompressor(level=settings.CHAT_ARCHIVE_ZSTD_LEVEL).compress(packed)
+
+
+def decode_rows(data):
+    return msgpack.unpackb(zstandard.ZstdDecompressor().decompress(bytes(data)), raw=False)
+
+
+@lru_cache(maxsize=settings.CHAT_ARCHIVE_CACHE_SEGMENTS)
+def _load(segment_id, version):
+    """(keys, rows, position by id) of a segment; `version` (its message count) invalidates merges."""
+    data = MessageArchiveSegment.objects.filter(id=segment_id).values_list('data', flat=True).first()
+    rows = decode_rows(data) if data is not None else []
+    keys = [(row[CREATED_AT], row[ID]) for row in rows]
+    return keys, rows, {row[ID]: position for position, row in enumerate(rows)}
+
+
+def load_segment(segment):
+    return _load(segment.id, segment.message_count)
+
+
+# Archiving
+
+def archive_messages(now=None, batch=None):
+    """
+    Move messages past the age limit into new segment parts, up to `batch`
+    (CHAT_ARCHIVE_BATCH) per call. Returns how many were archived.
+    Rooms are probed one at a time on the (room, created_at) index.
+    """
+    cutoff = cutoff_of(now)
+    if cutoff is None:
+        return 0
+    budget = batch or settings.CHAT_ARCHIVE_BATCH
+    archived = 0
+    for room_id in list(Room.objects.order_by('id').values_list('id', flat=True)):
+        if archived >= budget:
+            break
+        if Message.objects.filter(room_id=room_id, created_at__lt=cutoff).exists():
+            archived += archive_room(room_id, cutoff, budget - archived)
+    return archived
+
+
+def archive_room(room_id, cutoff, budget):
+    """Archive one room's messages older than `cutoff`, keeping its newest CHAT_HISTORY_SIZE hot."""
+    keep = settings.CHAT_HISTORY_SIZE
+    boundary = list(
+        Message.objects.filter(room_id=room_id).order_by('-created_at', '-id')
+        .values_list('created_at', 'id')[keep:keep + 1]
+    )
+    if not boundary:
+        return 0
+    boundary_at, boundary_id = boundary[0]
+    with transaction.atomic():
+        # Locked, skipping rows another run has taken, so no message lands in two parts
+        rows = [
+            [message_id, author_id, content, to_micros(created_at), to_micros(updated_at), is_edited]
+            for message_id, author_id, content, created_at, updated_at, is_edited in (
+                Message.objects.select_for_update(skip_locked=True)
+                .filter(room_id=room_id, created_at__lt=cutoff)
+                .filter(Q(created_at__lt=boundary_at) | Q(created_at=boundary_at, id__lte=boundary_id))
+                .order_by('created_at', 'id')
+                .values_list('id', 'author_id', 'content', 'created_at', 'updated_at', 'is_edited')[:budget]
+            )
+        ]
+        by_month = defaultdict(list)
+        for row in rows:
+            by_month[month_of(from_micros(row[CREATED_AT]))].append(row)
+        for month, month_rows in by_month.items():
+            write_segment(MessageArchiveSegment(room_id=room_id, month=month), month_rows)
+        Message.objects.filter(id__in=[row[ID] for row in rows]).delete()
+    return len(rows)
+
+
+def write_segment(segment, rows):
+    """Store rows (sorted by created_at, id) in a segment and save it."""
+    rows.sort(key=lambda row: (row[CREATED_AT], row[ID]))
+    segment.data = encode_rows(rows)
+    segment.message_count = len(rows)
+    segment.min_message_id = min(row[ID] for row in rows)
+    segment.max_message_id = max(row[ID] for row in rows)
+    segment.first_created_at = from_micros(rows[0][CREATED_AT])
+    segment.last_created_at = from_micros(rows[-1][CREATED_AT])
+    segment.save()
+    return segment
+
+
+def compact_archive(now=None):
+    """
+    Merge the parts of every month that ended before the archive cutoff into
+    one segment per room and month. Months still being archived are left
+    alone, so each month is recompressed about once. Returns the months merged.
+    """
+    cutoff = cutoff_of(now)
+    if cutoff is None:
+        return 0
+    months = (
+        MessageArchiveSegment.objects.filter(month__lt=month_of(cutoff))
+        .values('room_id', 'month').annotate(parts=Count('id')).filter(parts__gt=1)
+        .values_list('room_id', 'month')
+    )
+    return sum(compact_month(room_id, month) for room_id, month in list(months))
+
+
+def compact_month(room_id, month):
+    with transaction.atomic():
+        parts = list(
+            MessageArchiveSegment.objects.select_for_update(skip_locked=True)
+            .filter(room_id=room_id, month=month).order_by('first_created_at', 'min_message_id')
+        )
+        if len(parts) < 2:
+            return 0
+        rows = [row for part in parts for row in decode_rows(part.data)]
+        # The first part takes every row, so readers keep finding them under its id
+        write_segment(parts[0], rows)
+        MessageArchiveSegment.objects.filter(id__in=[part.id for part in parts[1:]]).delete()
+    return 1
+
+
+# Reading
+
+def _segments_containing(room_ids, message_ids):
+    """Segments whose id range covers any of message_ids."""
+    low, high = min(message_ids), max(message_ids)
+    return MessageArchiveSegment.objects.filter(
+        room_id__in=room_ids, min_message_id__lte=high, max_message_id__gte=low,
+    ).defer('data')
+
+
+def find_key(room, message_id):
+    """(created_at, id) key of an archived message of the room, or None."""
+    for segment in _segments_containing([room.id], [message_id]):
+        keys, _, positions = load_segment(segment)
+        if message_id in positions:
+            return keys[positions[message_id]]
+    return None
+
+
+def created_at_of(room_ids, message_ids):
+    """created_at of archived messages by id (for read cursors pointing into the archive)."""
+    message_ids = set(message_ids)
+    if not message_ids or not room_ids:
+        return {}
+    found = {}
+    for segment in _segments_containing(room_ids, message_ids):
+        _, rows, positions = load_segment(segment)
+        for message_id in message_ids & positions.keys():
+            found[message_id] = from_micros(rows[positions[message_id]][CREATED_AT])
+    return found
+
+
+def page_before(room, limit, before=None):
+    """
+    Up to `limit` archived messages of a room older than message `before`
+    (the newest archived ones without it), oldest first, as unsaved Message
+    instances. Returns (messages, has_more).
+    """
+    anchor = None
+    if before is not None:
+        anchor = find_key(room, before)
+        if anchor is None:
+            return [], False
+    # Parts don't overlap, so newest first by their last message
+    segments = MessageArchiveSegment.objects.filter(room=room).defer('data').order_by(
+        '-last_created_at', '-max_message_id'
+    )
+    if anchor is not None:
+        segments = segments.filter(first_created_at__lte=from_micros(anchor[0]))
+    rows = []
+    for segment in segments:
+        keys, segment_rows, _ = load_segment(segment)
+        end = bisect.bisect_left(keys, anchor) if anchor is not None else len(segment_rows)
+        rows = segment_rows[max(0, end - (limit + 1 - len(rows))):end] + rows
+        if len(rows) > limit:
+            break
+    has_more = len(rows) > limit
+    return to_messages(room, rows[len(rows) - limit:] if has_more else rows), has_more
+
+
+def to_messages(room, rows):
+    """Unsaved Messages for serializers; rows of since-deleted authors are skipped."""
+    authors = User.objects.in_bulk({row[AUTHOR_ID] for row in rows})
+    return [
+        Message(
+            id=row[ID], room=room, author=authors[row[AUTHOR_ID]], content=row[CONTENT],
+            created_at=from_micros(row[CREATED_AT]), updated_at=from_micros(row[UPDATED_AT]),
+            is_edited=row[IS_EDITED],
+        )
+        for row in rows if row[AUTHOR_ID] in authors
+    ]
+
+
+def count_after(read_up_to, exclude_author_id):
+    """
+    Archived messages after each cursor, not written by exclude_author_id:
+    {room_id: count}. Only reached for cursors older than the archive
+    horizon; decodes the segments after them (cached like pages).
+    """
+    if not read_up_to:
+        return {}
+    after = Q()
+    for room_id, read_at in read_up_to.items():
+        after |= Q(room_id=room_id, last_created_at__gt=read_at)
+    counts = defaultdict(int)
+    for segment in MessageArchiveSegment.objects.filter(after).defer('data'):
+        keys, rows, _ = load_segment(segment)
+        start = bisect.bisect_right(keys, (to_micros(read_up_to[segment.room_id]), float('inf')))
+        counts[segment.room_id] += sum(1 for row in rows[start:] if row[AUTHOR_ID] != exclude_author_id)
+    return counts
+
+
+def archive_backlog():
+    """archive_messages in batches until the backlog is cleared."""
+    total = 0
+    while True:
+        archived = archive_messages()
+        total += archived
+        if archived < settings.CHAT_ARCHIVE_BATCH:
+            return total
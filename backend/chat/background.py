@@ -0,0 +1,58 @@
+"""
+Periodic background jobs run inside the ASGI process (there is no Celery
+beat in the Procfile): presence, read-cursor and metrics flushes.
+"""
+import atexit
+import logging
+import threading
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+
+class PeriodicFlusher:
+    """
+    Daemon thread calling `flush` every `interval` seconds, started lazily on
+    first use. `should_run` (e.g. a Redis lock) lets one process in a fleet
+    skip a turn; `on_exit` runs at interpreter exit, only in processes that
+    started the thread (not management commands that merely import it).
+    """
+
+    def __init__(self, name, interval, flush, should_run=None, on_exit=None):
+        self.name = name
+        self.interval = interval
+        self.flush = flush
+        self.should_run = should_run
+        self.on_exit = on_exit
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def ensure_started(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    if self._thread is None:
+                        atexit.register(self.stop)
+                    self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        interval = self.interval()
+        while not self._stop.wait(interval):
+            try:
+                close_old_connections()
+                if self.should_run is None or self.should_run(interval):
+                    self.flush()
+            except Exception as e:
+                logger.warning(f"{self.name} failed: {e}")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is None:
+            return
+        if self.on_exit is not None:
+            try:
+                self.on_exit()
+            except Exception as e:
+                logger.warning(f"{self.name} failed at shutdown: {e}")
@@ -0,0 +1,27 @@
+"""
+Shared Redis access for chat's hot-path state (history, presence, cursors).
+Uses the raw client behind the django_redis cache when USE_REDIS is on, so
+lists/hashes/sorted sets are available; callers fall back to Django's cache
+API (or process memory) when it isn't.
+"""
+from django.conf import settings
+
+_client = None
+
+
+def get_redis():
+    """Raw redis-py client of the default cache, or None without Redis."""
+    global _client
+    if _client is None:
+        backend = settings.CACHES['default']['BACKEND']
+        if not backend.startswith('django_redis.'):
+            return None
+        from django_redis import get_redis_connection
+        _client = get_redis_connection('default')
+    return _client
+
+
+def redis_key(*parts):
+    """Namespaced key, matching the cache's KEY_PREFIX."""
+    prefix = settings.CACHES['default'].get('KEY_PREFIX', '')
+    return ':'.join(str(part) for part in (prefix, 'chat', *parts) if part != '')
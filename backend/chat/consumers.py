@@ -1,122 +1,478 @@
 """
 WebSocket consumers for real-time chat.
 """
+import asyncio
 import json
+import time
+from collections import deque
+from urllib.parse import parse_qs
 from channels.generic.websocket import AsyncWebsocketConsumer
-from channels.db import database_sync_to_async
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from notifications.realtime import user_group_name
 from .models import Room, Message
+from .realtime import room_group_name
+from . import metrics, presence, protocol, ratelimit, readstate
+from .db import db_sync_to_async
+from .persistence import message_buffer
+from .history import append_message, fetch_page, get_history_since, get_room_history, serialize_message
 
 User = get_user_model()
 
+# Server-to-client streams a multiplexed socket can subscribe to, by name
+STREAMS = {
+    'notifications': lambda user: user_group_name(user.id),
+}
+
+
+class RoomSubscription:
+    """A socket's membership of one room, with the per-room state it keeps."""
+
+    def __init__(self, name, room):
+        self.name = name
+        self.room = room
+        self.group_name = room_group_name(name)
+        self.last_typing_sent = float('-inf')
+        self.last_read_id = None
+        # Ids of the latest messages broadcast to this socket, known to be the room's
+        self.recent_ids = deque(maxlen=settings.CHAT_HISTORY_SIZE)
+
+
+class MultiplexConsumer(AsyncWebsocketConsumer):
+    """
+    One authenticated socket (ws/) for every room and stream a user watches.
+    Clients subscribe and unsubscribe by frame:
+      {"type": "subscribe", "room": "<name>", "since": <message id>}
+      {"type": "unsubscribe", "room": "<name>"}
+      {"type": "subscribe", "stream": "notifications"}
+    Room frames in both directions carry "room"; stream events carry
+    "stream". A failed or revoked subscription is reported with an
+    'unsubscribed' frame and the code a single-room socket would close with.
+    The room and the user's access are resolved once per subscription; they
+    are only re-checked when a room_membership_changed event arrives (see
+    chat.signals).
+    Frames are encoded in the subprotocol negotiated at connect (see chat.protocol).
+    Inbound frames are rate limited (see chat.ratelimit); outbound frames go
+    through a bounded queue, and a socket that can't keep up is closed.
+    DB work runs on the chat DB thread pool (see chat.db), one hop per step.
+    """
+    subprotocol = None
+    outbox = None
+    writer = None
+    closing = False
+    online = False
+    rate_limited_until = float('-inf')
 
-class ChatConsumer(AsyncWebsocketConsumer):
-    """WebSocket consumer for chat rooms."""
-    
     async def connect(self):
-        """Handle WebSocket connection."""
-        try:
-            user = self.scope.get('user')
-            
-            # Check if user is authenticated
-            if not user or not user.is_authenticated:
-                print(f"WebSocket connection rejected: User not authenticated. User: {user}")
-                await self.close(code=4001)  # Unauthorized
-                return
-            
-            self.room_name = self.scope['url_route']['kwargs']['room_name']
-            self.room_group_name = f'chat_{self.room_name}'
-            
-            # Check room access
-            room = await self.get_room(self.room_name)
-            if not room:
-                print(f"WebSocket connection rejected: Room '{self.room_name}' not found")
-                await self.close(code=4004)  # Room not found
-                return
-            
-            # Check if user can access private room
-            if room.is_private:
-                has_access = await self.check_room_access(room, user)
-                if not has_access:
-                    print(f"WebSocket connection rejected: User {user.username} doesn't have access to private room '{self.room_name}'")
-                    await self.close(code=4003)  # Forbidden
-                    return
-            
-            # Join room group
-            await self.channel_layer.group_add(
-                self.room_group_name,
-                self.channel_name
-            )
-            
-            await self.accept()
-            print(f"WebSocket connected: User {user.username} joined room '{self.room_name}'")
-            
-            # Send room history
-            await self.send_room_history()
-        except Exception as e:
-            print(f"WebSocket connection error: {e}")
-            await self.close(code=4000)  # Internal error
-    
+        """Accept any authenticated user; rooms and streams are added by message."""
+        user = self.scope.get('user')
+        if not user or not user.is_authenticated:
+            await self.close(code=4001)  # Unauthorized
+            return
+        await self.open()
+        # This socket is open on every page, so it's what keeps a user online
+        await sync_to_async(presence.connect, thread_sensitive=False)(user.id, self.channel_name)
+        self.online = True
+
+    async def open(self):
+        """Accept the socket and start its writer."""
+        self.subscriptions = {}
+        self.streams = set()
+        self.subprotocol = protocol.negotiate(self.scope.get('subprotocols'))
+        self.bucket = ratelimit.connection_bucket()
+        await self.accept(subprotocol=self.subprotocol)
+        self.outbox = asyncio.Queue(maxsize=settings.CHAT_OUTBOUND_QUEUE_SIZE)
+        self.writer = asyncio.create_task(self.write_outbox())
+
     async def disconnect(self, close_code):
         """Handle WebSocket disconnection."""
-        # Leave room group
-        await self.channel_layer.group_discard(
-            self.room_group_name,
-            self.channel_name
+        if self.writer is not None:
+            self.writer.cancel()
+        for subscription in list(getattr(self, 'subscriptions', {}).values()):
+            await self.leave(subscription)
+        for stream in list(getattr(self, 'streams', ())):
+            await self.channel_layer.group_discard(STREAMS[stream](self.scope['user']), self.channel_name)
+        if self.online:
+            await sync_to_async(presence.disconnect, thread_sensitive=False)(
+                self.scope['user'].id, self.channel_name
+            )
+
+    async def join(self, name, room, since=None):
+        """Subscribe to a resolved room: group, presence, then its history."""
+        user = self.scope['user']
+        subscription = RoomSubscription(name, room)
+        self.subscriptions[name] = subscription
+        await self.channel_layer.group_add(subscription.group_name, self.channel_name)
+
+        # Presence lives in Redis/memory; the DB is updated in batches
+        first_in_room = await sync_to_async(presence.connect, thread_sensitive=False)(
+            user.id, self.channel_name, room.id
         )
-    
-    async def receive(self, text_data):
+        if first_in_room:
+            await self.broadcast(subscription, {
+                'type': 'user_joined',
+                'user_id': user.id,
+                'username': user.username,
+            })
+        await self.send_room_history(subscription, since)
+
+    async def leave(self, subscription):
+        """Drop a room subscription, announcing the user left if it was their last socket there."""
+        user = self.scope['user']
+        self.subscriptions.pop(subscription.name, None)
+        left_room = await sync_to_async(presence.disconnect, thread_sensitive=False)(
+            user.id, self.channel_name, subscription.room.id
+        )
+        if left_room:
+            await self.broadcast(subscription, {
+                'type': 'user_left',
+                'user_id': user.id,
+                'username': user.username,
+            }, skip_self=True)
+        await self.channel_layer.group_discard(subscription.group_name, self.channel_name)
+
+    async def subscribe(self, data):
+        """Subscribe to a room (with an optional `since` to resume) or a stream."""
+        stream = data.get('stream')
+        if stream is not None:
+            if stream not in STREAMS:
+                await self.send_frame({'type': 'unsubscribed', 'stream': stream, 'code': 4004})
+                return
+            if stream not in self.streams:
+                self.streams.add(stream)
+                await self.channel_layer.group_add(STREAMS[stream](self.scope['user']), self.channel_name)
+            await self.send_frame({'type': 'subscribed', 'stream': stream})
+            return
+
+        name = data.get('room')
+        if not isinstance(name, str) or not name:
+            return
+        since = self.parse_since(data.get('since'))
+        if name in self.subscriptions:
+            # Already subscribed: just resend what the client asked for
+            await self.send_room_history(self.subscriptions[name], since)
+            return
+        if len(self.subscriptions) >= settings.CHAT_MAX_SUBSCRIPTIONS:
+            await self.room_unavailable(name, 4029)  # Too many subscriptions
+            return
+
+        room, has_access = await self.resolve_room_access(name, self.scope['user'])
+        if not room:
+            await self.room_unavailable(name, 4004)  # Room not found
+        elif not has_access:
+            await self.room_unavailable(name, 4003)  # Forbidden
+        else:
+            await self.join(name, room, since)
+
+    async def unsubscribe(self, data):
+        stream = data.get('stream')
+        if stream is not None:
+            if stream in self.streams:
+                self.streams.discard(stream)
+                await self.channel_layer.group_discard(STREAMS[stream](self.scope['user']), self.channel_name)
+            return
+        subscription = self.subscriptions.get(data.get('room'))
+        if subscription is not None:
+            await self.leave(subscription)
+
+    async def room_unavailable(self, name, code):
+        """A room can't be (or can no longer be) subscribed to."""
+        await self.send_frame({'type': 'unsubscribed', 'room': name, 'code': code})
+
+    def subscription_for(self, data):
+        """The subscription an inbound frame or room event is about, if any."""
+        return self.subscriptions.get(data.get('room'))
+
+    async def send_frame(self, frame):
+        """Encode a frame in this socket's subprotocol and send it."""
+        await self.send_payload(protocol.encode(self.subprotocol, frame))
+
+    async def send_payload(self, payload):
+        """
+        Queue an already encoded frame for the writer task. A socket whose
+        queue is full isn't reading fast enough and is closed rather than
+        buffering without bound.
+        """
+        if self.closing:
+            return
+        if self.outbox is None:
+            await self.send_now(payload)
+            return
+        try:
+            self.outbox.put_nowait(payload)
+        except asyncio.QueueFull:
+            metrics.incr('slow_consumers_closed')
+            print(f"WebSocket closed: slow consumer (user {self.scope['user'].id})")
+            await self.close(code=4008)  # Slow consumer
+
+    async def send_now(self, payload):
+        """Send an encoded frame (bytes go out as a binary frame)."""
+        if isinstance(payload, bytes):
+            await self.send(bytes_data=payload)
+        else:
+            await self.send(text_data=payload)
+
+    async def write_outbox(self):
+        """Writer task: sends queued frames in order, as fast as the server accepts them."""
+        while True:
+            payload = await self.outbox.get()
+            await self.send_now(payload)
+
+    async def close(self, code=None, reason=None):
+        """Stop the writer first so nothing is sent after the close frame."""
+        self.closing = True
+        if self.writer is not None:
+            self.writer.cancel()
+        await super().close(code=code, reason=reason)
+
+    async def within_limits(self, message_type):
+        """
+        Take tokens for an inbound frame: the connection's bucket for every
+        frame, the user's shared bucket for chat messages. Returns False if
+        the frame must be dropped; in delay mode, sleeps until it may proceed.
+        """
+        max_wait = ratelimit.max_delay()
+        wait = self.bucket.take(max_wait)
+        if wait < 0:
+            metrics.incr('frames_dropped_connection')
+            await self.notify_rate_limited(-wait)
+            return False
+        if message_type == 'chat_message':
+            user_wait = await sync_to_async(ratelimit.take_user_token, thread_sensitive=False)(
+                self.scope['user'].id, max_wait
+            )
+            if user_wait < 0:
+                metrics.incr('messages_dropped_user')
+                await self.notify_rate_limited(-user_wait)
+                return False
+            wait = max(wait, user_wait)
+        if wait > 0:
+            metrics.incr('frames_delayed')
+            await asyncio.sleep(wait)
+        return True
+
+    async def notify_rate_limited(self, retry_after):
+        """Tell the client to slow down, once per retry window."""
+        now = time.monotonic()
+        if now < self.rate_limited_until:
+            return
+        self.rate_limited_until = now + retry_after
+        await self.send_frame({'type': 'rate_limited', 'retry_after_ms': int(retry_after * 1000)})
+
+    async def receive(self, text_data=None, bytes_data=None):
         """Receive message from WebSocket."""
-        data = json.loads(text_data)
+        data = protocol.decode(text_data, bytes_data)
         message_type = data.get('type')
-        
+
+        # Typing frames are cheap and debounced below; everything else is rate limited
+        if message_type != 'typing' and not await self.within_limits(message_type):
+            return
+
+        if message_type == 'ping':
+            # Heartbeat: keeps the user online, and in every subscribed room
+            await self.heartbeat()
+            await self.send_frame({'type': 'pong'})
+            return
+        if message_type == 'subscribe':
+            await self.subscribe(data)
+            return
+        if message_type == 'unsubscribe':
+            await self.unsubscribe(data)
+            return
+
+        subscription = self.subscription_for(data)
+        if subscription is None:
+            return
+
         if message_type == 'chat_message':
             message_content = data.get('message', '').strip()
             user = self.scope['user']
-            
+
             if message_content and user.is_authenticated:
-                # Save message to database
-                room = await self.get_room(self.room_name)
-                if room:
-                    message = await self.save_message(room, user, message_content)
-                    
-                    # Send message to room group
-                    await self.channel_layer.group_send(
-                        self.room_group_name,
-                        {
-                            'type': 'chat_message',
-                            'message': message_content,
-                            'username': user.username,
-                            'user_id': user.id,
-                            'timestamp': message.created_at.isoformat() if message else None,
-                            'message_id': message.id if message else None,
-                        }
-                    )
-    
-    async def chat_message(self, event):
-        """Receive message from room group."""
-        # Send message to WebSocket
-        await self.send(text_data=json.dumps({
-            'type': 'message',
-            'message': event['message'],
-            'username': event['username'],
-            'user_id': event['user_id'],
-            'timestamp': event['timestamp'],
-            'message_id': event.get('message_id'),
-        }))
-    
-    async def send_room_history(self):
-        """Send recent messages when user joins."""
-        room = await self.get_room(self.room_name)
-        if room:
-            messages = await self.get_recent_messages(room, limit=50)
-            await self.send(text_data=json.dumps({
-                'type': 'history',
-                'messages': messages,
-            }))
-    
-    @database_sync_to_async
-    def get_room(self, room_name):
+                # Id and timestamp are assigned up front; the INSERT is batched
+                message = await self.save_message(subscription.room, user, message_content)
+
+                # Send message to room group
+                await self.broadcast(subscription, {
+                    'type': 'message',
+                    'message': message_content,
+                    'username': user.username,
+                    'user_id': user.id,
+                    'timestamp': message.created_at.isoformat() if message else None,
+                    'message_id': message.id if message else None,
+                }, message_id=message.id)
+                await sync_to_async(append_message, thread_sensitive=False)(message)
+                # The sender has read the room up to their own message
+                subscription.last_read_id = message.id
+                await sync_to_async(readstate.mark_read, thread_sensitive=False)(
+                    user.id, subscription.room.id, message.id
+                )
+                metrics.incr('messages_sent')
+
+        elif message_type == 'typing':
+            await self.send_typing(subscription)
+
+        elif message_type == 'read_up_to':
+            await self.mark_read(subscription, data.get('message_id'))
+
+        elif message_type == 'load_history':
+            await self.send_history_page(subscription, data.get('before'), data.get('limit'))
+
+    async def heartbeat(self):
+        room_ids = [subscription.room.id for subscription in self.subscriptions.values()]
+        if self.online:
+            room_ids.append(None)
+        await sync_to_async(presence.heartbeat_rooms, thread_sensitive=False)(
+            self.scope['user'].id, self.channel_name, room_ids
+        )
+
+    async def broadcast(self, subscription, frame, skip_self=False, message_id=None):
+        """
+        Send a frame to every socket in the room. It is encoded here, once per
+        subprotocol, and recipients forward the bytes (see room_frame), so the
+        cost of encoding doesn't grow with the number of listeners.
+        """
+        await self.channel_layer.group_send(subscription.group_name, {
+            'type': 'room_frame',
+            'frames': protocol.encode_all({**frame, 'room': subscription.name}),
+            'skip_user_id': self.scope['user'].id if skip_self else None,
+            'room': subscription.name,
+            'message_id': message_id,
+        })
+
+    async def room_frame(self, event):
+        """Forward a pre-encoded room frame unchanged."""
+        if event.get('skip_user_id') == self.scope['user'].id:
+            return
+        if event.get('message_id') is not None:
+            subscription = self.subscription_for(event)
+            if subscription is not None:
+                subscription.recent_ids.append(event['message_id'])
+        await self.send_payload(event['frames'][self.subprotocol or protocol.JSON])
+
+    async def user_event(self, event):
+        """Forward an event from the user's notification stream (see notifications.realtime)."""
+        await self.send_frame({
+            'type': event['event'],
+            **event.get('payload', {}),
+            'stream': 'notifications',
+        })
+
+    async def send_typing(self, subscription):
+        """Fan out a typing indicator, at most once per CHAT_TYPING_DEBOUNCE_MS per user."""
+        now = time.monotonic()
+        if now - subscription.last_typing_sent < settings.CHAT_TYPING_DEBOUNCE_MS / 1000:
+            return
+        subscription.last_typing_sent = now
+        user = self.scope['user']
+        # Not echoed to the typist's own sockets
+        await self.broadcast(subscription, {
+            'type': 'typing',
+            'user_id': user.id,
+            'username': user.username,
+        }, skip_self=True)
+
+    async def mark_read(self, subscription, message_id):
+        """Move the user's read cursor (cached, persisted in batches) and tell the room."""
+        try:
+            message_id = int(message_id)
+        except (TypeError, ValueError):
+            return
+        if message_id == subscription.last_read_id:
+            return
+        # Only messages of this room: ones just broadcast to the socket, else checked
+        if message_id not in subscription.recent_ids and not await db_sync_to_async(
+            readstate.room_has_message
+        )(subscription.room.id, message_id):
+            return
+        subscription.last_read_id = message_id
+        user = self.scope['user']
+        await sync_to_async(readstate.mark_read, thread_sensitive=False)(
+            user.id, subscription.room.id, message_id
+        )
+        await self.broadcast(subscription, {
+            'type': 'read_receipt',
+            'user_id': user.id,
+            'username': user.username,
+            'message_id': message_id,
+        }, skip_self=True)
+
+    async def room_membership_changed(self, event):
+        """Room membership or settings changed: refresh the cached access."""
+        user = self.scope['user']
+        user_ids = event.get('user_ids')
+        if user_ids is not None and user.id not in user_ids:
+            return
+        subscription = self.subscription_for(event)
+        if subscription is None:
+            return
+
+        room, has_access = await self.resolve_room_access(subscription.name, user)
+        if room and has_access:
+            subscription.room = room
+            return
+        await self.leave(subscription)
+        # Room deleted or deactivated, or access revoked
+        await self.room_unavailable(subscription.name, 4004 if not room else 4003)
+
+    async def send_room_history(self, subscription, since=None):
+        """Send recent messages on subscribe (or only the missed ones after `since`)."""
+        if since is not None:
+            items = await db_sync_to_async(get_history_since)(subscription.room, since)
+            if items is None:
+                # Too far behind to replay: the client should refetch history
+                await self.send_frame({'type': 'history_gap', 'since': since, 'room': subscription.name})
+            else:
+                await self.send_payload(protocol.encode_history(
+                    self.subprotocol, items, since=since, room=subscription.name
+                ))
+            return
+
+        # Pre-serialized from the hot history cache (Redis); the DB is only hit on a miss
+        items = await db_sync_to_async(get_room_history)(subscription.room)
+        await self.send_payload(protocol.encode_history(self.subprotocol, items, room=subscription.name))
+
+    async def send_history_page(self, subscription, before=None, limit=None):
+        """Send a keyset page of older messages (see chat.history.fetch_page)."""
+        try:
+            before = int(before) if before is not None else None
+            limit = int(limit) if limit is not None else None
+        except (TypeError, ValueError):
+            return
+        items, has_more = await self.get_history_page(subscription.room, before, limit)
+        await self.send_frame({
+            'type': 'history_page',
+            'room': subscription.name,
+            'messages': items,
+            'before': before,
+            'has_more': has_more,
+            'next_before': items[0]['id'] if has_more else None,
+        })
+
+    @db_sync_to_async
+    def get_history_page(self, room, before, limit):
+        messages, has_more = fetch_page(
+            Message.objects.filter(room=room).select_related('author'), before, limit, room=room
+        )
+        return [json.loads(serialize_message(msg)) for msg in messages], has_more
+
+    @staticmethod
+    def parse_since(value):
+        try:
+            return int(value) if value is not None else None
+        except (TypeError, ValueError):
+            return None
+
+    @db_sync_to_async
+    def resolve_room_access(self, room_name, user):
+        """Return (room, has_access) in a single thread hop."""
+        room = self._get_room(room_name)
+        if room is None:
+            return None, False
+        return room, self._check_room_access(room, user)
+
+    def _get_room(self, room_name):
         """Get or create room."""
         try:
             return Room.objects.get(name=room_name, is_active=True)
@@ -130,36 +486,73 @@ class ChatConsumer(AsyncWebsocketConsumer):
                     description='Main chat room for all users'
                 )
             return None
-    
-    @database_sync_to_async
-    def save_message(self, room, user, content):
-        """Save message to database."""
-        return Message.objects.create(
-            room=room,
-            author=user,
-            content=content
-        )
-    
-    @database_sync_to_async
-    def check_room_access(self, room, user):
+
+    async def save_message(self, room, user, content):
+        """Queue message for write-behind persistence (see chat.persistence)."""
+        message = message_buffer.create_nowait(room, user, content)
+        if message is None:
+            message = await db_sync_to_async(message_buffer.create)(room, user, content)
+        return message
+
+    def _check_room_access(self, room, user):
         """Check if user has access to private room."""
         if not room.is_private:
             return True
-        return room.members.filter(id=user.id).exists() or room.created_by == user
-    
-    @database_sync_to_async
-    def get_recent_messages(self, room, limit=50):
-        """Get recent messages from room."""
-        messages = Message.objects.filter(room=room).select_related('author').order_by('-created_at')[:limit]
-        return [
-            {
-                'id': msg.id,
-                'content': msg.content,
-                'message': msg.content,  # Also include as 'message' for compatibility
-                'username': msg.author.username,
-                'user_id': msg.author.id,
-                'timestamp': msg.created_at.isoformat(),
-            }
-            for msg in reversed(messages)  # Reverse to show oldest first
-        ]
+        return room.created_by_id == user.id or room.members.filter(id=user.id).exists()
+
+
+class ChatConsumer(MultiplexConsumer):
+    """
+    Single-room socket on ws/chat/<room_name>/, from before ws/ multiplexed
+    rooms. Subscribes to the room in the URL before accepting, treats frames
+    without a "room" as being for it, and closes with 4004/4003 when that
+    room goes away or access to it is revoked.
+    """
+    room_name = None
+
+    async def connect(self):
+        """Handle WebSocket connection."""
+        try:
+            user = self.scope.get('user')
+
+            # Check if user is authenticated
+            if not user or not user.is_authenticated:
+                print(f"WebSocket connection rejected: User not authenticated. User: {user}")
+                await self.close(code=4001)  # Unauthorized
+                return
+
+            self.room_name = self.scope['url_route']['kwargs']['room_name']
+            self.room_group_name = room_group_name(self.room_name)
+
+            # Resolve room and access once for the whole connection
+            room, has_access = await self.resolve_room_access(self.room_name, user)
+            if not room:
+                print(f"WebSocket connection rejected: Room '{self.room_name}' not found")
+                await self.close(code=4004)  # Room not found
+                return
+
+            if not has_access:
+                print(f"WebSocket connection rejected: User {user.username} doesn't have access to private room '{self.room_name}'")
+                await self.close(code=4003)  # Forbidden
+                return
+
+            await self.open()
+            print(f"WebSocket connected: User {user.username} joined room '{self.room_name}'")
+            await self.join(self.room_name, room, self.get_since_param())
+        except Exception as e:
+            print(f"WebSocket connection error: {e}")
+            await self.close(code=4000)  # Internal error
+
+    def subscription_for(self, data):
+        return self.subscriptions.get(data.get('room') or self.room_name)
+
+    async def room_unavailable(self, name, code):
+        if name == self.room_name:
+            await self.close(code=code)
+        else:
+            await super().room_unavailable(name, code)
 
+    def get_since_param(self):
+        """Last message id the client already has, from the ?since= query parameter."""
+        params = parse_qs(self.scope.get('query_string', b'').decode())
+        return self.parse_since(params.get('since', [None])[0])
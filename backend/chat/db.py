@@ -0,0 +1,24 @@
+"""
+Database calls from the chat sockets.
+channels' database_sync_to_async is thread-sensitive, and so is Django 4.2's
+async query API (aget, acreate, aexists and async iteration wrap the sync
+methods in sync_to_async): under daphne every socket in the process queues
+for the same single thread. db_sync_to_async runs calls on a pool of
+CHAT_DB_THREADS threads instead. Each thread keeps its own connection, so
+size it within the database's connection budget per process; 0 goes back to
+the shared thread.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from channels.db import DatabaseSyncToAsync
+from django.conf import settings
+
+executor = None
+if settings.CHAT_DB_THREADS > 0:
+    executor = ThreadPoolExecutor(max_workers=settings.CHAT_DB_THREADS, thread_name_prefix='chat-db')
+
+
+def db_sync_to_async(func):
+    """database_sync_to_async (old connections closed around the call) on the chat DB pool."""
+    if executor is None:
+        return DatabaseSyncToAsync(func)
+    return DatabaseSyncToAsync(func, thread_sensitive=False, executor=executor)
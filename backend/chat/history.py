@@ -0,0 +1,220 @@
+"""
+Hot history cache for chat rooms.
+Keeps the last CHAT_HISTORY_SIZE messages of each room as pre-serialized JSON
+in a capped Redis list, appended to on send and read on join, so reconnect
+storms don't reach the database. The DB is only queried on a miss, which
+primes the list again; sends keep appending while a room isn't primed, so
+priming can merge in messages other processes haven't flushed yet. Without Redis there is no hot cache (Django's
+database cache would only swap one query for another): history is read
+from the message table with the (room, created_at) index.
+"""
+import json
+from datetime import datetime
+from django.conf import settings
+from django.db.models import Q
+from . import archive
+from .cache import get_redis, redis_key
+from .models import Message
+from .persistence import message_buffer
+
+try:
+    from redis.exceptions import WatchError
+except ImportError:  # Redis is optional
+    WatchError = None
+
+# Optimistic attempts at priming a room that keeps receiving messages
+PRIME_ATTEMPTS = 5
+
+
+def serialize_message(message):
+    """History entry of a message as a JSON string."""
+    return json.dumps({
+        'id': message.id,
+        'content': message.content,
+        'message': message.content,  # Also include as 'message' for compatibility
+        'username': message.author.username,
+        'user_id': message.author_id,
+        'timestamp': message.created_at.isoformat(),
+    })
+
+
+def _key(room_id):
+    return redis_key('history', room_id)
+
+
+def _primed_key(room_id):
+    # Set once the list holds the room's full recent history (an empty room has no list)
+    return redis_key('history', room_id, 'primed')
+
+
+def _history_order(item):
+    entry = json.loads(item)
+    return datetime.fromisoformat(entry['timestamp']), entry['id']
+
+
+def get_cached_history(room_id, limit):
+    """Serialized messages (oldest first), or None on a cache miss (always without Redis)."""
+    redis = get_redis()
+    if redis is None:
+        return None
+    with redis.pipeline() as pipe:
+        pipe.exists(_primed_key(room_id))
+        pipe.lrange(_key(room_id), -limit, -1)
+        primed, items = pipe.execute()
+    if not primed:
+        return None
+    return [item.decode() for item in items]
+
+
+def load_recent_messages(room, limit):
+    """Last `limit` messages from the DB plus this process's unflushed ones, oldest first."""
+    messages = list((
+        Message.objects.filter(room=room).select_related('author').order_by('-created_at', '-id')[:limit]
+    ))
+    saved_ids = {msg.id for msg in messages}
+    pending = [msg for msg in message_buffer.pending_for_room(room.id) if msg.id not in saved_ids]
+    if pending:
+        messages = sorted(messages + pending, key=lambda msg: (msg.created_at, msg.id), reverse=True)[:limit]
+    return list(reversed(messages))
+
+
+def prime_history(room_id, serialized):
+    """
+    Cache a room's history: the given serialized messages merged by id with
+    what was appended to the room's list while it wasn't primed (other
+    processes' sends, possibly not in the DB yet). Returns the merged history,
+    oldest first (the given messages when there's no Redis).
+    """
+    redis = get_redis()
+    if redis is None:
+        return serialized
+    key, ttl = _key(room_id), settings.CHAT_HISTORY_TTL
+    with redis.pipeline() as pipe:
+        for _ in range(PRIME_ATTEMPTS):
+            try:
+                pipe.watch(key)
+                merged = {}
+                for item in (item.decode() for item in pipe.lrange(key, 0, -1)):
+                    if item:  # Skip the empty marker lists used to start with
+                        merged[json.loads(item)['id']] = item
+                merged.update((json.loads(item)['id'], item) for item in serialized)
+                items = sorted(merged.values(), key=_history_order)[-settings.CHAT_HISTORY_SIZE:]
+                pipe.multi()
+                pipe.delete(key)
+                if items:
+                    pipe.rpush(key, *items)
+                    pipe.expire(key, ttl)
+                pipe.set(_primed_key(room_id), 1, ex=ttl)
+                pipe.execute()
+                return items
+            except WatchError:
+                # Someone appended meanwhile; merge again
+                continue
+    # Too busy to prime now; stays a miss and the next read tries again
+    return serialized
+
+
+def append_message(message):
+    """
+    Add a sent message to its room's cached history (Redis only). Also done
+    for a room that isn't primed: the partial list isn't read, but the next
+    prime merges it in, as the message may not be in the DB yet.
+    """
+    redis = get_redis()
+    if redis is None:
+        return
+    key = _key(message.room_id)
+    with redis.pipeline() as pipe:
+        pipe.rpush(key, serialize_message(message))
+        pipe.ltrim(key, -settings.CHAT_HISTORY_SIZE, -1)
+        pipe.expire(key, settings.CHAT_HISTORY_TTL)
+        pipe.expire(_primed_key(message.room_id), settings.CHAT_HISTORY_TTL)
+        pipe.execute()
+
+
+def get_room_history(room, limit=None):
+    """Serialized recent messages of a room, oldest first; DB only on a miss (or without Redis)."""
+    limit = limit or settings.CHAT_HISTORY_SIZE
+    items = get_cached_history(room.id, limit)
+    if items is None:
+        items = [serialize_message(msg) for msg in load_recent_messages(room, settings.CHAT_HISTORY_SIZE)]
+        items = prime_history(room.id, items)[-limit:]
+    return items
+
+
+def get_history_since(room, since_id):
+    """
+    Serialized messages after `since_id` (oldest first) for a resuming client,
+    or None when the gap is too large or the message is unknown and the
+    client should refetch. Served from the hot cache when it still holds
+    `since_id`, otherwise by a bounded range scan on (room, created_at).
+    """
+    cached = get_cached_history(room.id, settings.CHAT_HISTORY_SIZE)
+    if cached:
+        for position, item in enumerate(cached):
+            if json.loads(item)['id'] == since_id:
+                return cached[position + 1:]
+
+    since = Message.objects.filter(room=room, id=since_id).values_list('created_at', flat=True).first()
+    if since is None:
+        # Maybe accepted by this process but not flushed yet
+        since = next(
+            (msg.created_at for msg in message_buffer.pending_for_room(room.id) if msg.id == since_id), None
+        )
+        if since is None:
+            return None
+    limit = settings.CHAT_RESUME_LIMIT
+    messages = list(
+        Message.objects.filter(room=room)
+        .filter(Q(created_at__gt=since) | Q(created_at=since, id__gt=since_id))
+        .select_related('author')
+        .order_by('created_at', 'id')[:limit + 1]
+    )
+    if len(messages) > limit:
+        return None
+    saved_ids = {msg.id for msg in messages}
+    pending = [
+        msg for msg in message_buffer.pending_for_room(room.id)
+        if msg.id not in saved_ids and (msg.created_at, msg.id) > (since, since_id)
+    ]
+    if pending:
+        messages = sorted(messages + pending, key=lambda msg: (msg.created_at, msg.id))
+        if len(messages) > limit:
+            return None
+    return [serialize_message(msg) for msg in messages]
+
+
+def fetch_page(queryset, before=None, limit=None, room=None):
+    """
+    Keyset page of a room's messages: up to `limit` messages older than the
+    message `before` (the newest ones without it), oldest first.
+    Returns (messages, has_more). Seeks on (created_at, id) so page N costs
+    the same as page 1, whatever the room's size. With `room`, a page that
+    runs past the hot messages continues into the room's archive (archived
+    messages are all older than hot ones).
+    """
+    limit = max(1, min(limit or settings.CHAT_PAGE_SIZE, settings.CHAT_MAX_PAGE_SIZE))
+    if before is not None:
+        anchor = queryset.filter(id=before).values_list('created_at', flat=True).first()
+        if anchor is None:
+            return archive.page_before(room, limit, before) if room is not None else ([], False)
+        queryset = queryset.filter(Q(created_at__lt=anchor) | Q(created_at=anchor, id__lt=before))
+    messages = list(queryset.order_by('-created_at', '-id')[:limit + 1])
+    has_more = len(messages) > limit
+    messages = list(reversed(messages[:limit]))
+    if not has_more and room is not None:
+        older, has_more = archive.page_before(room, limit - len(messages))
+        messages = older + messages
+    return messages, has_more
+
+
+def history_frame(items, since=None, room=None):
+    """
+    The 'history' WebSocket frame, built without re-encoding the messages.
+    With `since`, the frame only carries messages after that id and clients
+    append them instead of replacing what they have.
+    """
+    extra = f', "since": {int(since)}' if since is not None else ''
+    if room is not None:
+        extra += f', "room": {json.dumps(room)}'
+    return '{"type": "history", "messages": [' + ', '.join(items) + ']' + extra + '}'
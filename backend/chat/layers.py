@@ -0,0 +1,290 @@
+"""
+Channel layers for running chat on more than one process.
+
+ShardedRedisChannelLayer: channels_redis already spreads groups and process
+channels over its hosts, but picks the host from a fixed split of
+crc32(name): adding or removing a server moves most groups, and their
+memberships stay behind on the server that no longer owns them. This layer
+puts the hosts on a hash ring instead (virtual_nodes points each, keyed by
+the host's address), so a change to the host list only moves the groups and
+channels owned by the changed host, about 1/N of them. Every daphne node
+must be given the same hosts (CHANNEL_REDIS_HOSTS); their order doesn't
+matter.
+
+PostgresChannelLayer: for deployments without Redis, over PostgreSQL
+LISTEN/NOTIFY. Each process keeps its queues and group memberships in
+memory and listens on one connection. Sends to another process's channel
+NOTIFY that process; group_send delivers to local members directly and
+NOTIFYs one shared channel, which every other process filters against its
+own memberships. Every process sees every group message, so it suits a
+handful of processes, not a fleet. Like NOTIFY itself, delivery is
+at-most-once: messages sent while a process is reconnecting are lost.
+Messages whose payload would pass NOTIFY's 8000-byte limit are written to an
+unlogged <prefix>_payloads table (created on first use) and only their row
+id is notified; rows are deleted once older than the layer's expiry.
+"""
+import asyncio
+import base64
+import bisect
+import hashlib
+import logging
+import random
+import string
+import time
+import uuid
+import msgpack
+from channels.exceptions import ChannelFull
+from channels.layers import InMemoryChannelLayer
+from channels_redis.core import RedisChannelLayer
+
+logger = logging.getLogger(__name__)
+
+# NOTIFY payloads must be shorter than 8000 bytes
+NOTIFY_PAYLOAD_LIMIT = 7999
+# Notification of a body stored in the payload table (base64 has no ':')
+STORED_PREFIX = 'ref:'
+
+
+def ring_point(key):
+    return int.from_bytes(hashlib.blake2b(key.encode('utf8'), digest_size=8).digest(), 'big')
+
+
+def host_key(host):
+    """Stable identity of a decoded channels_redis host on the ring."""
+    if 'address' in host:
+        return str(host['address'])
+    if 'master_name' in host:
+        return f"sentinel:{host['master_name']}:{host.get('sentinels')}"
+    return repr(sorted(host.items()))
+
+
+class HashRing:
+    """Consistent hashing of names onto node indexes."""
+
+    def __init__(self, nodes, virtual_nodes=160):
+        points = sorted(
+            (ring_point(f'{node}#{replica}'), index)
+            for index, node in enumerate(nodes)
+            for replica in range(virtual_nodes)
+        )
+        self.points = [point for point, _ in points]
+        self.owners = [index for _, index in points]
+
+    def node_for(self, name):
+        position = bisect.bisect(self.points, ring_point(name))
+        return self.owners[position % len(self.points)]
+
+
+class ShardedRedisChannelLayer(RedisChannelLayer):
+    """RedisChannelLayer placing groups and process channels with a HashRing."""
+
+    def __init__(self, hosts=None, virtual_nodes=160, **kwargs):
+        super().__init__(hosts=hosts, **kwargs)
+        self.ring = HashRing([host_key(host) for host in self.hosts], virtual_nodes)
+
+    def consistent_hash(self, value):
+        if self.ring_size == 1:
+            return 0
+        if isinstance(value, bytes):
+            value = value.decode('utf8')
+        return self.ring.node_for(value)
+
+
+class PostgresChannelLayer(InMemoryChannelLayer):
+    """
+    InMemoryChannelLayer for this process, bridged to other processes with
+    LISTEN/NOTIFY. conninfo and options go to psycopg.AsyncConnection.connect;
+    the server must support LISTEN (a direct or session-pooled connection).
+    """
+
+    def __init__(self, conninfo='', options=None, prefix='asgi', **kwargs):
+        super().__init__(**kwargs)
+        # BaseChannelLayer keeps the raw dict, which get_capacity can't match
+        self.channel_capacity = self.compile_capacities(self.channel_capacity)
+        self.conninfo = conninfo
+        self.options = options or {}
+        self.client_prefix = uuid.uuid4().hex
+        # NOTIFY channels: one shared by all processes for groups, one per process
+        self.group_channel = f'{prefix}_groups'
+        self.process_channel = f'{prefix}_{self.client_prefix}'
+        self.prefix = prefix
+        self.home_loop = None
+        self.listener = None
+        self.listening = None
+        self.notify_connection = None
+        self.notify_lock = None
+        self.cleaned_at = 0
+        self.payload_table = f'{prefix}_payloads'
+        self.fetch_connection = None
+        self.payload_table_ready = False
+        self.payloads_pruned_at = 0
+
+    async def connect(self):
+        from psycopg import AsyncConnection
+        return await AsyncConnection.connect(self.conninfo, autocommit=True, **self.options)
+
+    # Listening
+
+    def start_listening(self):
+        """Start this process's listener, on the first loop to need it."""
+        loop = asyncio.get_running_loop()
+        if self.home_loop is None:
+            self.home_loop = loop
+            self.listening = asyncio.Event()
+            self.notify_lock = asyncio.Lock()
+            self.listener = loop.create_task(self.listen())
+        elif self.home_loop is not loop:
+            raise RuntimeError('PostgresChannelLayer can only listen on one event loop per process')
+
+    async def listen(self):
+        from psycopg import OperationalError, sql
+        while True:
+            try:
+                connection = await self.connect()
+                async with connection:
+                    for channel in (self.group_channel, self.process_channel):
+                        await connection.execute(sql.SQL('LISTEN {}').format(sql.Identifier(channel)))
+                    self.listening.set()
+                    async for notify in connection.notifies():
+                        try:
+                            await self.dispatch(notify.payload)
+                        except Exception as e:
+                            logger.warning(f'Channel layer could not deliver a notification: {e}')
+            except OperationalError as e:
+                self.listening.clear()
+                logger.warning(f'Channel layer lost its LISTEN connection, reconnecting: {e}')
+                await asyncio.sleep(1)
+
+    async def dispatch(self, payload):
+        if payload.startswith(STORED_PREFIX):
+            body = await self.fetch_stored(int(payload[len(STORED_PREFIX):]))
+            if body is None:
+                return
+        else:
+            body = msgpack.unpackb(base64.b64decode(payload), raw=False)
+        if 'g' in body:
+            if body['s'] != self.client_prefix and body['g'] in self.groups:
+                await InMemoryChannelLayer.group_send(self, body['g'], body['m'])
+        elif body['c'] in self.channels or self.is_local(body['c']):
+            try:
+                await InMemoryChannelLayer.send(self, body['c'], body['m'])
+            except ChannelFull:
+                logger.info(f"Channel {body['c']} over capacity, dropping a message")
+
+    # Notifying
+
+    async def notify(self, channel, body):
+        """NOTIFY a body, or a reference to it stored in the payload table if it's too large."""
+        packed = msgpack.packb(body, use_bin_type=True)
+        if asyncio.get_running_loop() is not self.home_loop:
+            # e.g. async_to_sync from a management command: a loop of its own
+            async with await self.connect() as connection:
+                await self.execute_notify(connection, channel, packed)
+            return
+        async with self.notify_lock:
+            if self.notify_connection is None or self.notify_connection.closed:
+                self.notify_connection = await self.connect()
+            try:
+                await self.execute_notify(self.notify_connection, channel, packed)
+            except Exception:
+                await self.notify_connection.close()
+                self.notify_connection = None
+                raise
+
+    async def execute_notify(self, connection, channel, packed):
+        payload = base64.b64encode(packed).decode('ascii')
+        if len(payload) <= NOTIFY_PAYLOAD_LIMIT:
+            await connection.execute('SELECT pg_notify(%s, %s)', (channel, payload))
+            return
+        from psycopg import sql
+        table = sql.Identifier(self.payload_table)
+        if not self.payload_table_ready:
+            await connection.execute(sql.SQL(
+                'CREATE UNLOGGED TABLE IF NOT EXISTS {} ('
+                'id bigserial PRIMARY KEY, body bytea NOT NULL, created_at timestamptz NOT NULL DEFAULT now())'
+            ).format(table))
+            self.payload_table_ready = True
+        now = time.monotonic()
+        if now - self.payloads_pruned_at >= self.expiry:
+            self.payloads_pruned_at = now
+            await connection.execute(
+                sql.SQL("DELETE FROM {} WHERE created_at < now() - %s * interval '1 second'").format(table),
+                (self.expiry,),
+            )
+        # One statement: the row is committed (autocommit) before the notification goes out
+        await connection.execute(
+            sql.SQL(
+                'WITH stored AS (INSERT INTO {} (body) VALUES (%s) RETURNING id) '
+                'SELECT pg_notify(%s, %s || id::text) FROM stored'
+            ).format(table),
+            (packed, channel, STORED_PREFIX),
+        )
+
+    async def fetch_stored(self, row_id):
+        """Body of a stored message (dispatch runs one at a time, on the listener's task)."""
+        from psycopg import sql
+        if self.fetch_connection is None or self.fetch_connection.closed:
+            self.fetch_connection = await self.connect()
+        try:
+            cursor = await self.fetch_connection.execute(
+                sql.SQL('SELECT body FROM {} WHERE id = %s').format(sql.Identifier(self.payload_table)),
+                (row_id,),
+            )
+            row = await cursor.fetchone()
+        except Exception:
+            await self.fetch_connection.close()
+            self.fetch_connection = None
+            raise
+        if row is None:
+            logger.info(f'Channel layer payload {row_id} expired before delivery')
+            return None
+        return msgpack.unpackb(bytes(row[0]), raw=False)
+
+    def is_local(self, channel):
+        return '!' in channel and self.non_local_name(channel).endswith(f'.{self.client_prefix}!')
+
+    # Channel layer API
+
+    async def send(self, channel, message):
+        if self.is_local(channel):
+            return await super().send(channel, message)
+        assert isinstance(message, dict), 'message is not a dict'
+        self.require_valid_channel_name(channel)
+        if '!' in channel:
+            client_prefix = self.non_local_name(channel)[:-1].rsplit('.', 1)[-1]
+            await self.notify(f'{self.prefix}_{client_prefix}', {'c': channel, 'm': message})
+        else:
+            # Plain channels: whichever processes are receiving on it
+            await self.notify(self.group_channel, {'c': channel, 'm': message})
+
+    async def receive(self, channel):
+        self.start_listening()
+        return await super().receive(channel)
+
+    async def new_channel(self, prefix='specific'):
+        suffix = ''.join(random.choice(string.ascii_letters) for _ in range(12))
+        return f'{prefix}.{self.client_prefix}!{suffix}'
+
+    async def group_add(self, group, channel):
+        # Listening before the add returns, so no group_send after it is missed
+        self.start_listening()
+        await self.listening.wait()
+        await super().group_add(group, channel)
+
+    async def group_send(self, group, message):
+        await super().group_send(group, message)
+        await self.notify(self.group_channel, {'g': group, 'm': message, 's': self.client_prefix})
+
+    async def close(self):
+        if self.listener is not None:
+            self.listener.cancel()
+        for connection in (self.notify_connection, self.fetch_connection):
+            if connection is not None:
+                await connection.close()
+
+    def _clean_expired(self):
+        """InMemoryChannelLayer scans every channel per call; at most once a second here."""
+        now = time.monotonic()
+        if now - self.cleaned_at >= 1:
+            self.cleaned_at = now
+            super()._clean_expired()
@@ -0,0 +1,42 @@
+"""
+Management command archiving old chat messages now (chat/archive.py), then
+compacting the parts of finished months. Celery beat already does both
+(chat/tasks.py); use this without beat, to clear a backlog or to archive
+with a different age, e.g. from a scheduled task.
+Run: python manage.py archive_chat --days 90
+"""
+from django.core.management.base import BaseCommand
+from django.db.models import Sum
+from django.db.models.functions import Length
+from django.test.utils import override_settings
+from chat.archive import archive_backlog, compact_archive
+from chat.models import MessageArchiveSegment
+
+
+class Command(BaseCommand):
+    help = 'Move chat messages older than CHAT_ARCHIVE_AFTER_DAYS into compressed segments and compact them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None, help='Age to archive at (default: CHAT_ARCHIVE_AFTER_DAYS)')
+        parser.add_argument('--batch', type=int, default=None, help='Messages per batch (default: CHAT_ARCHIVE_BATCH)')
+
+    def handle(self, *args, **options):
+        overrides = {}
+        if options['days'] is not None:
+            overrides['CHAT_ARCHIVE_AFTER_DAYS'] = options['days']
+        if options['batch'] is not None:
+            overrides['CHAT_ARCHIVE_BATCH'] = options['batch']
+        with override_settings(**overrides):
+            archived = archive_backlog()
+            compacted = compact_archive()
+
+        totals = MessageArchiveSegment.objects.aggregate(
+            messages=Sum('message_count'), size=Sum(Length('data')),
+        )
+        segments = MessageArchiveSegment.objects.count()
+        self.stdout.write(
+            f"Archived {archived} messages and compacted {compacted} months; "
+            f"the archive holds {totals['messages'] or 0} "
+            f"in {segments} segments ({(totals['size'] or 0) / 1024:.0f} KiB compressed)"
+        )
+        self.stdout.write(self.style.SUCCESS('✅ Chat archive up to date'))
@@ -0,0 +1,275 @@
+"""
+Management command timing broadcasts across daphne nodes on a shared channel layer.
+Starts --nodes daphne processes sharing CHANNEL_REDIS_HOSTS, spreads
+--sockets connections over them so every room has members on every node,
+then has one sender per room (all rooms at once) send --messages messages,
+each waiting until every member has it. Latency is send to arrival, split
+into members on the sender's node (same) and on other nodes (cross);
+throughput is deliveries per second over the whole run.
+By default each --shards value gets that many fresh redis-server processes
+(--redis-server binary); --redis URL,URL uses running servers instead.
+--postgres URL adds a run on PostgresChannelLayer (LISTEN/NOTIFY) against
+that database; --shards '' skips Redis.
+Run: python manage.py bench_channel_layer --nodes 3 --shards 1,3 --postgres postgresql://...
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import time
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework_simplejwt.tokens import AccessToken
+from chat.models import Room
+from .bench_chat_latency import free_port, percentile
+
+User = get_user_model()
+
+BENCH_PREFIX = 'bench-layer'
+
+
+def wait_for_port(process, port, name):
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise CommandError(f'{name} exited during startup')
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise CommandError(f'{name} did not start listening')
+
+
+def millis(timings, fraction):
+    """Percentile as '1.23ms'; '-' when there are none (e.g. cross-node with one node)."""
+    if not timings:
+        return '-'
+    return f'{percentile(timings, fraction) * 1e3:.2f}ms'
+
+
+def stop(processes):
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        process.wait()
+
+
+class Command(BaseCommand):
+    help = 'Benchmark cross-node broadcast latency and throughput on the Redis and Postgres channel layers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--nodes', type=int, default=3, help='daphne processes')
+        parser.add_argument('--sockets', type=int, default=300, help='WebSocket connections over all nodes')
+        parser.add_argument('--rooms', type=int, default=20, help='Rooms the sockets are spread over')
+        parser.add_argument('--messages', type=int, default=50, help='Messages sent per room')
+        parser.add_argument('--shards', default='1,3', help='Redis servers to start, one run per value')
+        parser.add_argument('--redis-server', default='redis-server', help='redis-server binary')
+        parser.add_argument('--redis', default='', help='Comma-separated URLs of running Redis servers')
+        parser.add_argument('--postgres', default='', help='Database URL for a PostgresChannelLayer run')
+        # Internal: run daphne in this process (used for the node subprocesses)
+        parser.add_argument('--serve', type=int, default=None, help=argparse.SUPPRESS)
+
+    def handle(self, *args, **options):
+        if options['serve'] is not None:
+            from daphne.cli import CommandLineInterface
+            return CommandLineInterface().run(
+                ['-b', '127.0.0.1', '-p', str(options['serve']), 'vinverse.asgi:application']
+            )
+
+        nodes, sockets, rooms = options['nodes'], options['sockets'], options['rooms']
+        if sockets < nodes * rooms:
+            raise CommandError('--sockets must cover every room on every node (nodes x rooms)')
+        # Each run: a shard count (fresh redis-servers), Redis URLs or ('postgres', URL)
+        if options['redis']:
+            runs = [options['redis'].split(',')]
+        else:
+            runs = [int(value) for value in options['shards'].split(',') if value]
+            if runs and not shutil.which(options['redis_server']):
+                raise CommandError(f"{options['redis_server']} not found (or pass --redis URL,URL)")
+        if options['postgres']:
+            runs.append(('postgres', options['postgres']))
+        if not runs:
+            raise CommandError('Nothing to run: give --shards, --redis or --postgres')
+
+        users = self.create_users(sockets)
+        room_names = self.create_rooms(users, nodes, rooms)
+        tokens = [str(AccessToken.for_user(user)) for user in users]
+        # Socket i is on node i % nodes, in room (i // nodes) % rooms
+        members = [
+            (i % nodes, (i // nodes) % rooms, f'/ws/chat/{room_names[(i // nodes) % rooms]}/?token={token}')
+            for i, token in enumerate(tokens)
+        ]
+
+        self.stdout.write(
+            f"{nodes} nodes, {sockets} sockets, {rooms} rooms, {options['messages']} messages per room"
+        )
+        self.stdout.write(
+            f"{'layer':>10} {'cross p50':>10} {'p95':>9} {'p99':>9} {'same p50':>9} "
+            f"{'msgs/s':>8} {'deliveries/s':>13} {'lost':>6}"
+        )
+        try:
+            for run in runs:
+                redis_servers = []
+                if isinstance(run, tuple):
+                    label = 'postgres'
+                    env = {'CHANNEL_REDIS_HOSTS': '', 'USE_REDIS': 'False', 'CHANNEL_POSTGRES_URL': run[1]}
+                else:
+                    if isinstance(run, int):
+                        redis_servers, run = self.start_redis(run, options['redis_server'])
+                    label = f'redis x{len(run)}'
+                    env = {'CHANNEL_REDIS_HOSTS': ','.join(run)}
+                servers = []
+                try:
+                    ports = []
+                    for _ in range(nodes):
+                        port = free_port()
+                        servers.append(self.start_node(port, env))
+                        ports.append(port)
+                    cross, same, elapsed, sent, lost = asyncio.run(
+                        self.run(ports, members, rooms, options['messages'])
+                    )
+                finally:
+                    stop(servers + redis_servers)
+                deliveries = len(cross) + len(same)
+                self.stdout.write(
+                    f"{label:>10} {millis(cross, 0.5):>10} {millis(cross, 0.95):>9} "
+                    f"{millis(cross, 0.99):>9} {millis(same, 0.5):>9} {sent / elapsed:>8.0f} "
+                    f"{deliveries / elapsed:>13.0f} {lost:>6}"
+                )
+        finally:
+            Room.objects.filter(name__startswith=BENCH_PREFIX).delete()
+            User.objects.filter(username__startswith='bench_layer_').delete()
+        self.stdout.write(self.style.SUCCESS('✅ Channel layer benchmark finished'))
+
+    def create_users(self, count):
+        existing = set(User.objects.filter(username__startswith='bench_layer_').values_list('username', flat=True))
+        User.objects.bulk_create([
+            User(username=f'bench_layer_{i}', email=f'bench_layer_{i}@example.com')
+            for i in range(count) if f'bench_layer_{i}' not in existing
+        ])
+        return list(User.objects.filter(
+            username__in=[f'bench_layer_{i}' for i in range(count)]
+        ).order_by('id'))
+
+    def create_rooms(self, users, nodes, count):
+        names = []
+        for r in range(count):
+            room, _ = Room.objects.get_or_create(
+                name=f'{BENCH_PREFIX}-{r}',
+                defaults={
+                    'display_name': f'Bench layer {r}',
+                    'room_type': 'private',
+                    'is_private': True,
+                    'room_code': f'N{r}',
+                    'created_by': users[0],
+                },
+            )
+            room.members.add(*[user for i, user in enumerate(users) if (i // nodes) % count == r])
+            names.append(room.name)
+        return names
+
+    def start_redis(self, count, binary):
+        processes, urls = [], []
+        try:
+            for _ in range(count):
+                port = free_port()
+                process = subprocess.Popen(
+                    [binary, '--port', str(port), '--save', '', '--appendonly', 'no'],
+                    stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                )
+                processes.append(process)
+                wait_for_port(process, port, 'redis-server')
+                urls.append(f'redis://127.0.0.1:{port}/0')
+        except CommandError:
+            stop(processes)
+            raise
+        return processes, urls
+
+    def start_node(self, port, layer_env):
+        # Rate limits off: this measures the channel layer, not the limiter
+        env = dict(
+            os.environ,
+            CHAT_CONNECTION_BURST='1000000',
+            CHAT_USER_MESSAGE_BURST='1000000',
+            **layer_env,
+        )
+        server = subprocess.Popen(
+            [sys.executable, sys.argv[0], 'bench_channel_layer', '--serve', str(port)],
+            env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        return wait_for_port(server, port, 'daphne')
+
+    async def run(self, ports, members, rooms, messages):
+        """Connect every member, then send from one member per room, all rooms at once."""
+        from autobahn.asyncio.websocket import WebSocketClientFactory, WebSocketClientProtocol
+
+        loop = asyncio.get_running_loop()
+        # tag -> [sender node, sent at, members still to receive, future]
+        pending = {}
+        cross, same = [], []
+
+        class BenchClient(WebSocketClientProtocol):
+            def onOpen(self):
+                self.factory.client = self
+
+            def onMessage(self, payload, is_binary):
+                frame = json.loads(payload)
+                if frame.get('type') == 'history' and not self.factory.ready.done():
+                    self.factory.ready.set_result(self)
+                delivery = pending.get(frame.get('message'))
+                if delivery is None:
+                    return
+                node, sent_at, _, done = delivery
+                (same if node == self.factory.node else cross).append(time.perf_counter() - sent_at)
+                delivery[2] -= 1
+                if delivery[2] == 0 and not done.done():
+                    done.set_result(None)
+
+            def onClose(self, was_clean, code, reason):
+                if not self.factory.ready.done():
+                    self.factory.ready.set_exception(CommandError(f'Socket rejected ({code})'))
+
+        async def open_socket(node, path):
+            factory = WebSocketClientFactory(f'ws://127.0.0.1:{ports[node]}{path}')
+            factory.protocol = BenchClient
+            factory.node = node
+            factory.ready = loop.create_future()
+            await loop.create_connection(factory, '127.0.0.1', ports[node])
+            return await asyncio.wait_for(factory.ready, 60)
+
+        async def send(client, node, room, size):
+            lost = 0
+            for i in range(messages):
+                tag = f'bench {room}:{i}'
+                done = loop.create_future()
+                pending[tag] = [node, time.perf_counter(), size, done]
+                client.sendMessage(json.dumps({'type': 'chat_message', 'message': tag}).encode())
+                try:
+                    await asyncio.wait_for(done, 10)
+                except asyncio.TimeoutError:
+                    lost += pending[tag][2]
+                del pending[tag]
+            return lost
+
+        clients = await asyncio.gather(*(open_socket(node, path) for node, _, path in members))
+        room_sizes = [sum(1 for _, room, _ in members if room == r) for r in range(rooms)]
+        # The first member of each room (on node 0) sends
+        senders = {}
+        for client, (node, room, _) in zip(clients, members):
+            senders.setdefault(room, (client, node))
+
+        started = time.perf_counter()
+        lost = await asyncio.gather(*(
+            send(client, node, room, room_sizes[room]) for room, (client, node) in senders.items()
+        ))
+        elapsed = time.perf_counter() - started
+        for client in clients:
+            client.sendClose()
+        await asyncio.sleep(0.5)
+        return sorted(cross), sorted(same), elapsed, len(senders) * messages, sum(lost)
@@ -0,0 +1,135 @@
+"""
+Management command measuring the CPU cost of fanning one chat message out
+to a room, as the number of listening sockets grows.
+Compares the encode-once broadcast (ChatConsumer.broadcast / room_frame)
+with the previous scheme, where every recipient re-encoded the event with
+json.dumps. Runs on a fresh InMemoryChannelLayer so only this process's
+CPU is measured; most of the total is the in-process test transport, so
+encoding CPU is reported separately.
+Run: python manage.py bench_chat_fanout --recipients 10,100,1000
+"""
+import asyncio
+import json
+import time
+from channels.layers import DEFAULT_CHANNEL_LAYER, InMemoryChannelLayer, channel_layers
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from django.urls import re_path
+from chat import protocol
+from chat.consumers import ChatConsumer
+from chat.models import Room
+
+User = get_user_model()
+
+BENCH_ROOM = 'bench-fanout'
+
+
+class EncodeOnceConsumer(ChatConsumer):
+    """ChatConsumer.broadcast, timing and counting its encodes."""
+    encodes = 0
+    encode_time = 0.0
+
+    async def broadcast(self, subscription, frame, skip_self=False):
+        started = time.process_time()
+        frames = protocol.encode_all({**frame, 'room': subscription.name})
+        EncodeOnceConsumer.encode_time += time.process_time() - started
+        EncodeOnceConsumer.encodes += len(frames)
+        await self.channel_layer.group_send(subscription.group_name, {
+            'type': 'room_frame',
+            'frames': frames,
+            'skip_user_id': None,
+        })
+
+
+class PerRecipientEncodingConsumer(ChatConsumer):
+    """ChatConsumer with the old fan-out: raw fields in the event, json.dumps in every recipient."""
+    encodes = 0
+    encode_time = 0.0
+
+    async def broadcast(self, subscription, frame, skip_self=False):
+        await self.channel_layer.group_send(subscription.group_name, {
+            'type': 'legacy_frame',
+            'frame': {**frame, 'room': subscription.name},
+        })
+
+    async def legacy_frame(self, event):
+        started = time.process_time()
+        payload = json.dumps(dict(event['frame']))
+        PerRecipientEncodingConsumer.encode_time += time.process_time() - started
+        PerRecipientEncodingConsumer.encodes += 1
+        await self.send(text_data=payload)
+
+
+async def drain(communicator):
+    """Discard frames already sent to a socket."""
+    while not await communicator.receive_nothing(0.05):
+        await communicator.receive_output()
+
+
+class Command(BaseCommand):
+    help = 'Benchmark chat fan-out CPU per message, encode-once vs per-recipient encoding'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipients', default='10,100,1000', help='Comma-separated listener counts')
+        parser.add_argument('--messages', type=int, default=20, help='Messages sent per run')
+
+    # Rate limits off: this measures delivery, not the limiter (all sockets share one user)
+    @override_settings(CHAT_CONNECTION_BURST=10 ** 6, CHAT_USER_MESSAGE_BURST=10 ** 6)
+    def handle(self, *args, **options):
+        user, _ = User.objects.get_or_create(
+            username='bench_chat_user', defaults={'email': 'bench_chat_user@example.com'}
+        )
+        Room.objects.get_or_create(
+            name=BENCH_ROOM, defaults={'display_name': 'Benchmark', 'room_type': 'global'}
+        )
+        counts = [int(count) for count in options['recipients'].split(',')]
+        self.stdout.write(
+            f"{'recipients':>10} {'scheme':>14} {'CPU/msg':>10} {'encode CPU/msg':>15} {'encodes/msg':>12}"
+        )
+        try:
+            for count in counts:
+                for label, consumer in (('per-recipient', PerRecipientEncodingConsumer), ('encode-once', EncodeOnceConsumer)):
+                    cpu = asyncio.run(self.run(consumer, user, count, options['messages']))
+                    messages = options['messages']
+                    self.stdout.write(
+                        f"{count:>10} {label:>14} {cpu / messages * 1000:>8.2f}ms "
+                        f"{consumer.encode_time / messages * 1e6:>13.1f}us {consumer.encodes / messages:>12.0f}"
+                    )
+        finally:
+            Room.objects.filter(name=BENCH_ROOM).delete()
+        self.stdout.write(self.style.SUCCESS('✅ Fan-out benchmark finished'))
+
+    async def run(self, consumer, user, recipients, messages):
+        """
+        CPU seconds to deliver `messages` messages to `recipients` sockets,
+        including the sender's write and the test harness. Encoding alone is
+        accumulated on the consumer class.
+        """
+        channel_layers.set(DEFAULT_CHANNEL_LAYER, InMemoryChannelLayer(capacity=messages + 10))
+        application = URLRouter([re_path(r'^ws/chat/(?P<room_name>[^/]+)/$', consumer.as_asgi())])
+
+        listeners = []
+        for _ in range(recipients):
+            listener = WebsocketCommunicator(application, f'/ws/chat/{BENCH_ROOM}/')
+            listener.scope['user'] = user
+            await listener.connect()
+            listeners.append(listener)
+        # Drop history and join frames
+        await asyncio.gather(*(drain(listener) for listener in listeners))
+
+        consumer.encodes = 0
+        consumer.encode_time = 0.0
+        sender = listeners[0]
+        started = time.process_time()
+        for i in range(messages):
+            await sender.send_json_to({'type': 'chat_message', 'message': f'fan-out message {i}'})
+            for listener in listeners:
+                await listener.receive_output(timeout=30)
+        cpu = time.process_time() - started
+
+        for listener in listeners:
+            await listener.disconnect()
+        return cpu
@@ -0,0 +1,232 @@
+"""
+Management command timing chat sockets end to end under daphne.
+Starts daphne (the real ASGI stack: JWT auth, routing, ChatConsumer) once per
+CHAT_DB_THREADS value, opens --sockets connections at the same time spread
+over --rooms private rooms, then has every socket send --messages messages,
+each waiting for its own broadcast. Connect latency is handshake to history
+frame (auth, room and access queries, history); send latency is send to echo.
+Sockets daphne doesn't accept within its connect timeout count as failed.
+--db-latency-ms delays every query in the server, standing in for a network
+database when run against SQLite.
+Run: python manage.py bench_chat_latency --sockets 1000 --db-threads 0,8
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db.backends.utils import CursorWrapper
+from rest_framework_simplejwt.tokens import AccessToken
+from chat.models import Room
+
+User = get_user_model()
+
+BENCH_PREFIX = 'bench-latency'
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def percentile(timings, fraction):
+    return timings[min(int(len(timings) * fraction), len(timings) - 1)]
+
+
+class Command(BaseCommand):
+    help = 'Benchmark chat connect and send latency at high concurrency under daphne'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sockets', type=int, default=1000, help='Concurrent WebSocket connections')
+        parser.add_argument('--rooms', type=int, default=50, help='Rooms the sockets are spread over')
+        parser.add_argument('--messages', type=int, default=3, help='Messages sent per socket')
+        parser.add_argument('--db-threads', default='0,8', help='CHAT_DB_THREADS values to compare')
+        parser.add_argument('--db-latency-ms', type=float, default=2, help='Delay added to every query')
+        # Internal: run daphne in this process (used for the server subprocess)
+        parser.add_argument('--serve', type=int, default=None, help=argparse.SUPPRESS)
+
+    def handle(self, *args, **options):
+        if options['serve'] is not None:
+            return self.serve(options['serve'], options['db_latency_ms'])
+
+        sockets, rooms = options['sockets'], options['rooms']
+        users = self.create_users(sockets)
+        room_names = self.create_rooms(users, rooms)
+        tokens = [str(AccessToken.for_user(user)) for user in users]
+        paths = [
+            f'/ws/chat/{room_names[i % rooms]}/?token={token}'
+            for i, token in enumerate(tokens)
+        ]
+
+        self.stdout.write(
+            f"{sockets} sockets, {rooms} rooms, {options['messages']} messages each, "
+            f"{options['db_latency_ms']}ms per query"
+        )
+        self.stdout.write(
+            f"{'db threads':>10} {'connect p50':>12} {'p95':>9} {'p99':>9} {'all up':>8} "
+            f"{'send p50':>9} {'p95':>9} {'p99':>9} {'failed':>7}"
+        )
+        try:
+            for threads in [int(value) for value in options['db_threads'].split(',')]:
+                port = free_port()
+                server = self.start_server(port, threads, options['db_latency_ms'])
+                try:
+                    connects, all_up, failed, sends = asyncio.run(
+                        self.run(port, paths, options['messages'])
+                    )
+                finally:
+                    server.terminate()
+                    server.wait()
+                self.stdout.write(
+                    f"{threads:>10} {statistics.median(connects) * 1e3:>10.1f}ms "
+                    f"{percentile(connects, 0.95) * 1e3:>7.1f}ms {percentile(connects, 0.99) * 1e3:>7.1f}ms "
+                    f"{all_up:>7.2f}s {statistics.median(sends) * 1e3:>7.1f}ms "
+                    f"{percentile(sends, 0.95) * 1e3:>7.1f}ms {percentile(sends, 0.99) * 1e3:>7.1f}ms {failed:>7}"
+                )
+        finally:
+            Room.objects.filter(name__startswith=BENCH_PREFIX).delete()
+            User.objects.filter(username__startswith='bench_latency_').delete()
+        self.stdout.write(self.style.SUCCESS('✅ Latency benchmark finished'))
+
+    def create_users(self, count):
+        existing = set(User.objects.filter(username__startswith='bench_latency_').values_list('username', flat=True))
+        User.objects.bulk_create([
+            User(username=f'bench_latency_{i}', email=f'bench_latency_{i}@example.com')
+            for i in range(count) if f'bench_latency_{i}' not in existing
+        ])
+        return list(User.objects.filter(
+            username__in=[f'bench_latency_{i}' for i in range(count)]
+        ).order_by('id'))
+
+    def create_rooms(self, users, count):
+        """Private rooms, so each connect also runs the membership check."""
+        names = []
+        for r in range(count):
+            room, _ = Room.objects.get_or_create(
+                name=f'{BENCH_PREFIX}-{r}',
+                defaults={
+                    'display_name': f'Bench latency {r}',
+                    'room_type': 'private',
+                    'is_private': True,
+                    'room_code': f'L{r}',
+                    'created_by': users[0],
+                },
+            )
+            room.members.add(*users[r::count])
+            names.append(room.name)
+        return names
+
+    def start_server(self, port, threads, db_latency_ms):
+        # Rate limits off: this measures latency, not the limiter
+        env = dict(
+            os.environ,
+            CHAT_DB_THREADS=str(threads),
+            CHAT_CONNECTION_BURST='1000000',
+            CHAT_USER_MESSAGE_BURST='1000000',
+        )
+        server = subprocess.Popen(
+            [sys.executable, sys.argv[0], 'bench_chat_latency',
+             '--serve', str(port), '--db-latency-ms', str(db_latency_ms)],
+            env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError('daphne exited during startup')
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                return server
+            except OSError:
+                time.sleep(0.2)
+        server.terminate()
+        raise CommandError('daphne did not start listening')
+
+    def serve(self, port, db_latency_ms):
+        """Run daphne on the project's ASGI app, with every query delayed."""
+        delay = db_latency_ms / 1000
+        execute = CursorWrapper.execute
+
+        def delayed_execute(cursor, sql, params=None):
+            time.sleep(delay)
+            return execute(cursor, sql, params)
+
+        if delay > 0:
+            CursorWrapper.execute = delayed_execute
+        from daphne.cli import CommandLineInterface
+        CommandLineInterface().run(['-b', '127.0.0.1', '-p', str(port), 'vinverse.asgi:application'])
+
+    async def run(self, port, paths, messages):
+        """Open every socket at once, then send from all of them at once."""
+        from autobahn.asyncio.websocket import WebSocketClientFactory, WebSocketClientProtocol
+
+        class BenchClient(WebSocketClientProtocol):
+            def onOpen(self):
+                self.factory.opened.set_result(self)
+
+            def onMessage(self, payload, is_binary):
+                self.factory.frames.put_nowait(json.loads(payload))
+
+            def onClose(self, was_clean, code, reason):
+                if not self.factory.opened.done():
+                    self.factory.opened.set_exception(CommandError(f'Socket rejected ({code})'))
+                self.factory.frames.put_nowait({'type': 'closed', 'code': code})
+
+        loop = asyncio.get_running_loop()
+
+        async def open_socket(path):
+            factory = WebSocketClientFactory(f'ws://127.0.0.1:{port}{path}')
+            factory.protocol = BenchClient
+            factory.opened = loop.create_future()
+            factory.frames = asyncio.Queue()
+            started = time.perf_counter()
+            await loop.create_connection(factory, '127.0.0.1', port)
+            try:
+                client = await asyncio.wait_for(factory.opened, 60)
+                await self.wait_for(factory.frames, lambda frame: frame.get('type') == 'history')
+            except CommandError:
+                return None  # e.g. not accepted within daphne's connect timeout
+            return client, factory.frames, time.perf_counter() - started
+
+        async def send(client, frames, index):
+            timings = []
+            for i in range(messages):
+                tag = f'bench {index}:{i}'
+                started = time.perf_counter()
+                client.sendMessage(json.dumps({'type': 'chat_message', 'message': tag}).encode())
+                await self.wait_for(frames, lambda frame: frame.get('message') == tag)
+                timings.append(time.perf_counter() - started)
+            return timings
+
+        started = time.perf_counter()
+        opened = [socket for socket in await asyncio.gather(*(open_socket(path) for path in paths)) if socket]
+        all_up = time.perf_counter() - started
+
+        sends = await asyncio.gather(*(
+            send(client, frames, index) for index, (client, frames, _) in enumerate(opened)
+        ))
+        for client, _, _ in opened:
+            client.sendClose()
+        await asyncio.sleep(0.5)
+        return (
+            sorted(connect for _, _, connect in opened),
+            all_up,
+            len(paths) - len(opened),
+            sorted(timing for timings in sends for timing in timings),
+        )
+
+    @staticmethod
+    async def wait_for(frames, predicate):
+        while True:
+            frame = await asyncio.wait_for(frames.get(), 60)
+            if frame.get('type') == 'closed':
+                raise CommandError(f"Socket closed ({frame['code']})")
+            if predicate(frame):
+                return frame
+
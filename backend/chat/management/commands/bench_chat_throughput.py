@@ -0,0 +1,105 @@
+"""
+Management command measuring chat messages/sec for one room, with each
+message written through (one INSERT before the broadcast) and with the
+write-behind buffer from chat/persistence.py.
+Drives ChatConsumer in-process via channels.testing.WebsocketCommunicator,
+against the configured database and channel layer. Write-behind needs
+PostgreSQL; on other databases both runs write through.
+Run: python manage.py bench_chat_throughput --messages 2000 --clients 4
+"""
+import asyncio
+import time
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from chat.models import Room, Message
+from chat.persistence import message_buffer
+from chat.routing import websocket_urlpatterns
+
+User = get_user_model()
+
+BENCH_ROOM = 'bench-throughput'
+
+
+class Command(BaseCommand):
+    help = 'Benchmark chat messages/sec per room, write-through vs write-behind'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=1000, help='Messages per run')
+        parser.add_argument('--clients', type=int, default=4, help='Sockets sending to the room')
+
+    # Rate limits off: this measures delivery, not the limiter (all sockets share one user)
+    @override_settings(CHAT_CONNECTION_BURST=10 ** 6, CHAT_USER_MESSAGE_BURST=10 ** 6)
+    def handle(self, *args, **options):
+        user, _ = User.objects.get_or_create(
+            username='bench_chat_user', defaults={'email': 'bench_chat_user@example.com'}
+        )
+        room, _ = Room.objects.get_or_create(
+            name=BENCH_ROOM, defaults={'display_name': 'Benchmark', 'room_type': 'global'}
+        )
+        if not message_buffer.enabled:
+            self.stdout.write('CHAT_WRITE_BEHIND is off; enabling it for the second run')
+        original = message_buffer.enabled
+        try:
+            results = {}
+            for label, enabled in (('write-through', False), ('write-behind', True)):
+                message_buffer.enabled = enabled
+                if enabled and not message_buffer.write_behind:
+                    self.stdout.write(self.style.WARNING(
+                        'Write-behind needs PostgreSQL; this run writes through as well'
+                    ))
+                Message.objects.filter(room=room).delete()
+                rate = asyncio.run(self.run(user, options['messages'], options['clients']))
+                message_buffer.flush()
+                saved = Message.objects.filter(room=room).count()
+                if saved != options['messages']:
+                    raise CommandError(f'{label}: expected {options["messages"]} saved messages, found {saved}')
+                results[label] = rate
+                self.stdout.write(f"{label:>13}: {rate:8.0f} msgs/sec ({saved} messages saved)")
+        finally:
+            message_buffer.enabled = original
+            room.delete()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Write-behind: {results['write-behind'] / results['write-through']:.1f}x messages/sec"
+        ))
+
+    async def run(self, user, total, clients):
+        """
+        Send `total` messages over `clients` sockets and return messages/sec.
+        Each socket waits for its own broadcast before sending the next
+        message, so the channel layer never has to drop anything.
+        """
+        application = URLRouter(websocket_urlpatterns)
+
+        async def open_socket():
+            communicator = WebsocketCommunicator(application, f'/ws/chat/{BENCH_ROOM}/')
+            communicator.scope['user'] = user
+            connected, _ = await communicator.connect()
+            if not connected:
+                raise CommandError('Benchmark socket was rejected')
+            await communicator.receive_json_from(timeout=10)  # history
+            return communicator
+
+        async def send(client, communicator, count):
+            for i in range(count):
+                tag = f'bench {client}:{i}'
+                await communicator.send_json_to({'type': 'chat_message', 'message': tag})
+                while (await communicator.receive_json_from(timeout=30)).get('message') != tag:
+                    pass
+
+        sockets = [await open_socket() for _ in range(clients)]
+        per_client = [total // clients + (1 if i < total % clients else 0) for i in range(clients)]
+
+        started = time.perf_counter()
+        await asyncio.gather(*(
+            send(client, communicator, count)
+            for client, (communicator, count) in enumerate(zip(sockets, per_client))
+        ))
+        elapsed = time.perf_counter() - started
+
+        for communicator in sockets:
+            await communicator.disconnect()
+        return total / elapsed
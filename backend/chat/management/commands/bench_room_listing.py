@@ -0,0 +1,137 @@
+"""
+Management command timing the room list query for one user: the old
+per-room membership loops against Room.objects.accessible_to(), the single
+query with EXISTS probes that RoomViewSet uses now.
+Creates a mix of public, team and private rooms (with members) and deletes
+them afterwards.
+Run: python manage.py bench_room_listing --rooms 100000
+"""
+import random
+import time
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Q
+from chat.models import Room
+from gamerlink.models import Team
+
+User = get_user_model()
+
+BENCH_PREFIX = 'bench-rooms-'
+
+
+def legacy_accessible_ids(queryset, user):
+    """The loops RoomViewSet.get_queryset used before: one pass per team/private room."""
+    team_rooms = []
+    for room in queryset.filter(room_type='team'):
+        if room.team and user in room.team.members.all():
+            team_rooms.append(room.id)
+    private_rooms = []
+    for room in queryset.filter(room_type='private', is_private=True).prefetch_related('members', 'created_by'):
+        is_creator = room.created_by and room.created_by.id == user.id
+        if is_creator or user.id in [m.id for m in room.members.all()]:
+            private_rooms.append(room.id)
+    return queryset.filter(
+        Q(room_type__in=['global', 'game'], is_private=False)
+        | Q(id__in=team_rooms)
+        | Q(id__in=private_rooms)
+    ).order_by('room_type', 'display_name')
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the room list query for one user, legacy loops vs EXISTS subqueries'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rooms', type=int, default=100000, help='Rooms to create')
+        parser.add_argument('--teams', type=int, default=2000, help='Teams to spread team rooms over')
+        parser.add_argument('--members', type=int, default=3, help='Members per private room')
+        parser.add_argument('--runs', type=int, default=3, help='Timed runs per variant (best is reported)')
+        parser.add_argument('--skip-legacy', action='store_true', help="Don't time the legacy loops")
+
+    def handle(self, *args, **options):
+        rng = random.Random(42)
+        users = [
+            User.objects.get_or_create(
+                username=f'bench_rooms_{i}', defaults={'email': f'bench_rooms_{i}@example.com'}
+            )[0]
+            for i in range(20)
+        ]
+        viewer = users[0]
+        self.cleanup()
+        try:
+            self.stdout.write(f"Creating {options['rooms']} rooms...")
+            self.populate(rng, users, options)
+            queryset = Room.objects.filter(is_active=True, name__startswith=BENCH_PREFIX)
+
+            expected = None
+            if not options['skip_legacy']:
+                elapsed, queries, expected = self.measure(
+                    lambda: list(legacy_accessible_ids(queryset, viewer).values_list('id', flat=True)),
+                    options['runs'],
+                )
+                self.stdout.write(f"       legacy: {elapsed * 1000:9.1f} ms, {queries} queries, {len(expected)} rooms")
+
+            elapsed, queries, rooms = self.measure(
+                lambda: list(
+                    queryset.accessible_to(viewer).order_by('room_type', 'display_name').values_list('id', flat=True)
+                ),
+                options['runs'],
+            )
+            self.stdout.write(f" accessible_to: {elapsed * 1000:9.1f} ms, {queries} queries, {len(rooms)} rooms")
+            if expected is not None and sorted(expected) != sorted(rooms):
+                raise CommandError('accessible_to() returned different rooms than the legacy loops')
+        finally:
+            self.cleanup()
+        self.stdout.write(self.style.SUCCESS('✅ Room listing benchmark finished'))
+
+    def measure(self, run, runs):
+        """Best wall time over `runs`, the query count of the last run and its result."""
+        best = None
+        for _ in range(runs):
+            queries = []
+            with connection.execute_wrapper(lambda execute, *args: queries.append(1) or execute(*args)):
+                started = time.perf_counter()
+                result = run()
+                elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return best, len(queries), result
+
+    def populate(self, rng, users, options):
+        """Roughly 60% public, 20% team and 20% private rooms; the viewer belongs to a few of each."""
+        teams = Team.objects.bulk_create([
+            Team(name=f'{BENCH_PREFIX}{i}', game='Valorant', created_by=users[0])
+            for i in range(options['teams'])
+        ])
+        team_links = [
+            Team.members.through(team_id=team.id, customuser_id=user.id)
+            for team in teams
+            for user in rng.sample(users, 3)
+        ]
+        Team.members.through.objects.bulk_create(team_links, batch_size=5000)
+
+        rooms = []
+        for i in range(options['rooms']):
+            kind = rng.random()
+            if kind < 0.6:
+                room = Room(room_type=rng.choice(['global', 'game']), game='Valorant')
+            elif kind < 0.8:
+                room = Room(room_type='team', team=rng.choice(teams))
+            else:
+                # 'B' prefix keeps bench codes clear of real six-digit codes
+                room = Room(room_type='private', is_private=True, created_by=rng.choice(users), room_code=f'B{i}')
+            room.name = f'{BENCH_PREFIX}{i}'
+            room.display_name = f'Bench room {i}'
+            rooms.append(room)
+        rooms = Room.objects.bulk_create(rooms, batch_size=5000)
+
+        room_links = [
+            Room.members.through(room_id=room.id, customuser_id=user.id)
+            for room in rooms
+            if room.room_type == 'private'
+            for user in rng.sample(users, options['members'])
+        ]
+        Room.members.through.objects.bulk_create(room_links, batch_size=5000)
+
+    def cleanup(self):
+        Room.objects.filter(name__startswith=BENCH_PREFIX).delete()
+        Team.objects.filter(name__startswith=BENCH_PREFIX).delete()
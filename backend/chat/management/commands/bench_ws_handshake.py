@@ -0,0 +1,111 @@
+"""
+Management command timing WebSocket handshakes through JWTAuthMiddleware.
+Compares the previous verification (UntypedToken, a second jwt.decode and a
+User query per connect) with the cached path: the first connect with a
+token (cold) and reconnects with the same token (warm). The inner app
+only accepts, so the numbers are the auth cost.
+Run: python manage.py bench_ws_handshake --connects 500
+"""
+import asyncio
+import statistics
+import time
+from contextlib import contextmanager
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncWebsocketConsumer
+from channels.middleware import BaseMiddleware
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.db.backends.utils import CursorWrapper
+from jwt import decode as jwt_decode
+from rest_framework_simplejwt.tokens import AccessToken, UntypedToken
+from chat.middleware import JWTAuthMiddleware, get_token, token_cache
+
+User = get_user_model()
+
+
+@database_sync_to_async
+def legacy_get_user_from_token(token_string):
+    """chat.middleware.get_user_from_token before the verified-token cache."""
+    UntypedToken(token_string)
+    decoded_data = jwt_decode(token_string, settings.SECRET_KEY, algorithms=["HS256"])
+    return User.objects.get(id=decoded_data.get('user_id'))
+
+
+@contextmanager
+def count_queries():
+    """Count queries on every thread (user lookups run in the sync thread pool)."""
+    queries = []
+    execute = CursorWrapper.execute
+
+    def counting_execute(cursor, sql, params=None):
+        queries.append(sql)
+        return execute(cursor, sql, params)
+
+    CursorWrapper.execute = counting_execute
+    try:
+        yield queries
+    finally:
+        CursorWrapper.execute = execute
+
+
+class LegacyJWTAuthMiddleware(BaseMiddleware):
+    async def __call__(self, scope, receive, send):
+        scope['user'] = await legacy_get_user_from_token(get_token(scope))
+        return await super().__call__(scope, receive, send)
+
+
+class AcceptConsumer(AsyncWebsocketConsumer):
+    async def connect(self):
+        if isinstance(self.scope['user'], AnonymousUser):
+            await self.close(code=4001)
+        else:
+            await self.accept()
+
+
+class Command(BaseCommand):
+    help = 'Benchmark WebSocket handshake latency with and without the verified-token cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--connects', type=int, default=500, help='Handshakes per run')
+
+    def handle(self, *args, **options):
+        user, _ = User.objects.get_or_create(
+            username='bench_chat_user', defaults={'email': 'bench_chat_user@example.com'}
+        )
+        token = str(AccessToken.for_user(user))
+        connects = options['connects']
+        inner = AcceptConsumer.as_asgi()
+
+        runs = [
+            ('legacy', LegacyJWTAuthMiddleware(inner), None),
+            ('cached, cold', JWTAuthMiddleware(inner), 'cold'),
+            ('cached, warm', JWTAuthMiddleware(inner), 'warm'),
+        ]
+        token_cache.clear()
+        self.stdout.write(f"{'path':>13} {'p50':>9} {'p95':>9} {'queries/connect':>16}")
+        for label, application, cache_state in runs:
+            timings, queries = asyncio.run(self.run(application, token, connects, cache_state))
+            timings.sort()
+            self.stdout.write(
+                f"{label:>13} {statistics.median(timings) * 1e6:>7.0f}us "
+                f"{timings[int(len(timings) * 0.95)] * 1e6:>7.0f}us {queries / connects:>16.2f}"
+            )
+        self.stdout.write(self.style.SUCCESS('✅ Handshake benchmark finished'))
+
+    async def run(self, application, token, connects, cache_state):
+        timings = []
+        with count_queries() as queries:
+            for _ in range(connects):
+                if cache_state == 'cold':
+                    token_cache.clear()
+                communicator = WebsocketCommunicator(application, f'/ws/bench/?token={token}')
+                started = time.perf_counter()
+                connected, _ = await communicator.connect()
+                timings.append(time.perf_counter() - started)
+                if not connected:
+                    raise CommandError('Handshake was rejected')
+                await communicator.disconnect()
+        return timings, len(queries)
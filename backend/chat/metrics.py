@@ -0,0 +1,65 @@
+"""
+Counters for chat sockets (rate limiting, backpressure).
+incr() only touches process memory; with Redis the counts are added to a
+shared hash every CHAT_METRICS_FLUSH_INTERVAL seconds, so snapshot() reports
+totals across processes. Exposed to admins at /api/chat/metrics/.
+"""
+import threading
+from collections import Counter
+from django.conf import settings
+from .background import PeriodicFlusher
+from .cache import get_redis, redis_key
+
+_local = Counter()  # not yet flushed (or all counts, without Redis)
+_lock = threading.Lock()
+
+
+def _key():
+    return redis_key('metrics')
+
+
+def incr(name, amount=1):
+    flusher.ensure_started()
+    with _lock:
+        _local[name] += amount
+
+
+def flush_metrics():
+    """Add local counts to the shared Redis hash; returns the number of counters written."""
+    redis = get_redis()
+    if redis is None:
+        return 0
+    with _lock:
+        pending = dict(_local)
+        _local.clear()
+    if not pending:
+        return 0
+    try:
+        with redis.pipeline() as pipe:
+            for name, amount in pending.items():
+                pipe.hincrby(_key(), name, amount)
+            pipe.execute()
+    except Exception:
+        with _lock:
+            _local.update(pending)
+        raise
+    return len(pending)
+
+
+def snapshot():
+    """Current totals: shared counts plus this process's unflushed ones."""
+    totals = Counter()
+    redis = get_redis()
+    if redis is not None:
+        totals.update({name.decode(): int(value) for name, value in redis.hgetall(_key()).items()})
+    with _lock:
+        totals.update(_local)
+    return dict(totals)
+
+
+flusher = PeriodicFlusher(
+    'chat-metrics-flusher',
+    interval=lambda: settings.CHAT_METRICS_FLUSH_INTERVAL,
+    flush=flush_metrics,
+    on_exit=flush_metrics,
+)
@@ -1,46 +1,154 @@
 """
 Custom WebSocket authentication middleware for JWT tokens.
+Verified tokens are cached per process (keyed by a hash of the token, until
+it expires or CHAT_TOKEN_CACHE_TTL passes) together with a snapshot of the
+user, so reconnects skip both the signature check and the user query.
+Deactivating or deleting a user drops their entries (chat.signals); with
+Redis the revocation is also marked for CHAT_TOKEN_CACHE_TTL, and cache
+hits check the mark, so other processes stop accepting the cached user too.
 """
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import parse_qs
+from asgiref.sync import sync_to_async
 from channels.middleware import BaseMiddleware
-from channels.db import database_sync_to_async
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import AnonymousUser
-from rest_framework_simplejwt.tokens import UntypedToken
+from django.http.cookie import parse_cookie
 from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
-from django.conf import settings
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import UntypedToken
+from .cache import get_redis, redis_key
+from .db import db_sync_to_async
 
 User = get_user_model()
 
-try:
-    from jwt import decode as jwt_decode
-    JWT_AVAILABLE = True
-except ImportError:
-    JWT_AVAILABLE = False
+# What consumers read from scope['user']; other fields load lazily if accessed
+SNAPSHOT_FIELDS = ('id', 'username', 'is_active', 'is_staff', 'is_superuser')
+ID, IS_ACTIVE = SNAPSHOT_FIELDS.index('id'), SNAPSHOT_FIELDS.index('is_active')
 
 
-@database_sync_to_async
-def get_user_from_token(token_string):
-    """Get user from JWT token."""
-    if not JWT_AVAILABLE:
-        return AnonymousUser()
-    
+class VerifiedTokenCache:
+    """LRU of token hash -> (expires_at, claims, user snapshot values), bounded in size and time."""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(token):
+        return hashlib.blake2b(token.encode(), digest_size=16).digest()
+
+    def get(self, token):
+        key = self.key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def set(self, token, claims, values):
+        expires_at = min(claims.get('exp', 0), time.time() + settings.CHAT_TOKEN_CACHE_TTL)
+        with self._lock:
+            self._entries[self.key(token)] = (expires_at, claims, values)
+            self._entries.move_to_end(self.key(token))
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def discard(self, token):
+        with self._lock:
+            self._entries.pop(self.key(token), None)
+
+    def discard_user(self, user_id):
+        with self._lock:
+            for key in [key for key, entry in self._entries.items() if entry[2][ID] == user_id]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+token_cache = VerifiedTokenCache(settings.CHAT_TOKEN_CACHE_SIZE)
+
+
+def user_snapshot(values):
+    """A User loaded from cached field values, without a query."""
+    # from_db expects the values in model field order
+    fields = dict(zip(SNAPSHOT_FIELDS, values))
+    names = [f.attname for f in User._meta.concrete_fields if f.attname in fields]
+    return User.from_db('default', names, [fields[name] for name in names])
+
+
+def verify_token(token_string):
+    """Signature and expiry check (one decode, no DB); returns the claims or None."""
     try:
-        # Validate token
-        UntypedToken(token_string)
+        return UntypedToken(token_string).payload
     except (InvalidToken, TokenError):
+        return None
+
+
+def _revoked_key(user_id):
+    return redis_key('revoked_user', user_id)
+
+
+def revoke_user(user_id):
+    """Stop accepting cached tokens of a user that was deactivated or deleted."""
+    token_cache.discard_user(user_id)
+    redis = get_redis()
+    if redis is not None:
+        redis.set(_revoked_key(user_id), 1, ex=settings.CHAT_TOKEN_CACHE_TTL)
+
+
+def is_revoked(user_id):
+    return bool(get_redis().exists(_revoked_key(user_id)))
+
+
+@db_sync_to_async
+def fetch_user_values(user_id):
+    return User.objects.filter(id=user_id).values_list(*SNAPSHOT_FIELDS).first()
+
+
+async def get_user_from_token(token_string):
+    """Get user from JWT token."""
+    cached = token_cache.get(token_string)
+    if cached is not None:
+        # Revoked in another process: fall through to the user query
+        if get_redis() is None or not await sync_to_async(is_revoked, thread_sensitive=False)(cached[2][ID]):
+            return user_snapshot(cached[2])
+        token_cache.discard(token_string)
+
+    claims = verify_token(token_string)
+    user_id = claims.get(api_settings.USER_ID_CLAIM) if claims else None
+    if not user_id:
         return AnonymousUser()
-    
-    try:
-        # Decode token
-        decoded_data = jwt_decode(token_string, settings.SECRET_KEY, algorithms=["HS256"])
-        user_id = decoded_data.get('user_id')
-        
-        if user_id:
-            return User.objects.get(id=user_id)
-    except (User.DoesNotExist, Exception):
-        pass
-    
-    return AnonymousUser()
+
+    values = await fetch_user_values(user_id)
+    if values is None or not values[IS_ACTIVE]:
+        return AnonymousUser()
+    token_cache.set(token_string, claims, values)
+    return user_snapshot(values)
+
+
+def get_token(scope):
+    """Token from ?token= or, failing that, the access_token cookie."""
+    query_string = scope.get('query_string', b'')
+    if b'token=' in query_string:
+        token = parse_qs(query_string.decode()).get('token')
+        if token:
+            return token[0]
+    for name, value in scope.get('headers', ()):
+        if name == b'cookie':
+            return parse_cookie(value.decode('latin-1')).get('access_token')
+    return None
 
 
 class JWTAuthMiddleware(BaseMiddleware):
@@ -48,50 +156,17 @@ class JWTAuthMiddleware(BaseMiddleware):
     Custom middleware to authenticate WebSocket connections using JWT tokens.
     Token can be passed as query parameter: ?token=xxx
     """
-    
+
     async def __call__(self, scope, receive, send):
-        # Get token from query string
-        query_string = scope.get('query_string', b'').decode()
-        token = None
-        
-        # Parse query string
-        if query_string:
-            try:
-                # Handle URL-encoded query string
-                from urllib.parse import parse_qs, unquote
-                params = parse_qs(query_string)
-                if 'token' in params:
-                    token = params['token'][0]
-            except Exception:
-                # Fallback to simple parsing
-                params = {}
-                for param in query_string.split('&'):
-                    if '=' in param:
-                        key, value = param.split('=', 1)
-                        params[unquote(key)] = unquote(value)
-                token = params.get('token')
-        
-        # If no token in query, try to get from headers (for cookie-based auth)
-        if not token:
-            headers = dict(scope.get('headers', []))
-            # Try to get from cookie
-            cookie_header = headers.get(b'cookie', b'').decode()
-            if cookie_header:
-                # Extract token from cookie if present
-                for cookie in cookie_header.split(';'):
-                    if 'access_token' in cookie:
-                        token = cookie.split('=')[1].strip()
-        
-        # Authenticate user
+        token = get_token(scope)
         if token:
             scope['user'] = await get_user_from_token(token)
         else:
             scope['user'] = AnonymousUser()
-        
+
         return await super().__call__(scope, receive, send)
 
 
 def JWTAuthMiddlewareStack(inner):
     """Stack JWT auth middleware."""
     return JWTAuthMiddleware(inner)
-
@@ -0,0 +1,61 @@
+# Generated by Django 4.2.7 on 2026-10-19 05:46
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("chat", "0005_message_created_at_default"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RoomReadCursor",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "last_read_message_id",
+                    models.BigIntegerField(help_text="Last message the user has seen"),
+                ),
+                (
+                    "last_read_at",
+                    models.DateTimeField(help_text="created_at of that message"),
+                ),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "room",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="read_cursors",
+                        to="chat.room",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="room_read_cursors",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Room Read Cursor",
+                "verbose_name_plural": "Room Read Cursors",
+                "db_table": "room_read_cursor",
+                "unique_together": {("user", "room")},
+            },
+        ),
+    ]
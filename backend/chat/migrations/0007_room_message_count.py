@@ -0,0 +1,36 @@
+# Generated by Django 4.2.7 on 2026-10-19 06:00
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_message_count(apps, schema_editor):
+    Room = apps.get_model("chat", "Room")
+    Message = apps.get_model("chat", "Message")
+    counts = (
+        Message.objects.filter(room_id=OuterRef("pk"))
+        .order_by()
+        .values("room_id")
+        .annotate(total=Count("*"))
+        .values("total")
+    )
+    Room.objects.update(message_count=Coalesce(Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("chat", "0006_roomreadcursor"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="room",
+            name="message_count",
+            field=models.PositiveIntegerField(
+                default=0, help_text="Messages sent in this room"
+            ),
+        ),
+        migrations.RunPython(backfill_message_count, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 4.2.7 on 2026-10-19 07:02
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("chat", "0007_room_message_count"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MessageArchiveSegment",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "month",
+                    models.DateField(
+                        help_text="First day of the month the messages were sent in"
+                    ),
+                ),
+                ("data", models.BinaryField(help_text="zstd-compressed msgpack rows")),
+                ("message_count", models.PositiveIntegerField(default=0)),
+                ("min_message_id", models.BigIntegerField()),
+                ("max_message_id", models.BigIntegerField()),
+                ("first_created_at", models.DateTimeField()),
+                ("last_created_at", models.DateTimeField()),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "room",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="archive_segments",
+                        to="chat.room",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Message Archive Segment",
+                "verbose_name_plural": "Message Archive Segments",
+                "db_table": "message_archive_segment",
+                "unique_together": {("room", "month")},
+            },
+        ),
+    ]
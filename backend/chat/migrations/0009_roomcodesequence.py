@@ -0,0 +1,46 @@
+# Generated by Django 4.2.7 on 2026-10-19 07:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("chat", "0008_message_archive_segment"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RoomCodeSequence",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "width",
+                    models.PositiveSmallIntegerField(
+                        help_text="Digits in the codes of this tier", unique=True
+                    ),
+                ),
+                (
+                    "multiplier",
+                    models.BigIntegerField(
+                        help_text="Coprime with 10, so index -> code is a permutation"
+                    ),
+                ),
+                ("offset", models.BigIntegerField()),
+                ("next_index", models.BigIntegerField(default=0)),
+            ],
+            options={
+                "verbose_name": "Room Code Sequence",
+                "verbose_name_plural": "Room Code Sequences",
+                "db_table": "room_code_sequence",
+            },
+        ),
+    ]
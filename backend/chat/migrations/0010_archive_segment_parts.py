@@ -0,0 +1,30 @@
+# Generated by Django 4.2.7 on 2026-10-19 07:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("chat", "0009_roomcodesequence"),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name="messagearchivesegment",
+            unique_together=set(),
+        ),
+        migrations.AddIndex(
+            model_name="messagearchivesegment",
+            index=models.Index(
+                fields=["room", "month"], name="message_arc_room_id_327d5b_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="messagearchivesegment",
+            index=models.Index(
+                fields=["room", "last_created_at"],
+                name="message_arc_room_id_1ab5cd_idx",
+            ),
+        ),
+    ]
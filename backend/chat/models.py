@@ -2,11 +2,48 @@
 Chat models for real-time messaging.
 Includes: Room, Message
 """
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import Count, Exists, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
 from django.conf import settings
 from django.utils import timezone
-import random
-import string
+
+
+class RoomQuerySet(models.QuerySet):
+    """QuerySet helpers for Room."""
+    
+    def accessible_to(self, user):
+        """
+        Rooms a user can see, in one query: public global/game rooms, team
+        rooms of the user's teams, and private rooms they created or joined.
+        Membership is checked with EXISTS probes on the (room, user) and
+        (team, user) indexes, so cost follows the caller's rooms, not the
+        number of rooms in the system.
+        """
+        from gamerlink.models import Team
+        
+        is_room_member = Room.members.through.objects.filter(room_id=OuterRef('pk'), customuser_id=user.id)
+        is_team_member = Team.members.through.objects.filter(team_id=OuterRef('team_id'), customuser_id=user.id)
+        return self.filter(
+            Q(room_type__in=['global', 'game'], is_private=False)
+            | Q(room_type='team', team__isnull=False) & Exists(is_team_member)
+            | Q(room_type='private', is_private=True) & (Q(created_by_id=user.id) | Exists(is_room_member))
+        )
+    
+    def with_list_annotations(self, user):
+        """
+        Everything RoomSerializer needs for a list in the same query:
+        member_total, user_is_member and user_has_pending_request annotations
+        plus the creator. message_count is a stored column.
+        """
+        memberships = Room.members.through.objects.filter(room_id=OuterRef('pk'))
+        member_total = memberships.order_by().values('room_id').annotate(total=Count('*')).values('total')
+        pending_requests = RoomJoinRequest.objects.filter(room_id=OuterRef('pk'), user_id=user.id, status='pending')
+        return self.select_related('created_by').annotate(
+            member_total=Coalesce(Subquery(member_total), 0),
+            user_is_member=Exists(memberships.filter(customuser_id=user.id)),
+            user_has_pending_request=Exists(pending_requests),
+        )
 
 
 class Room(models.Model):
@@ -57,14 +94,19 @@ class Room(models.Model):
         help_text="Members of private rooms"
     )
     is_active = models.BooleanField(default=True)
+    # Kept up to date on write (see chat.signals / chat.persistence) so room lists don't COUNT(*)
+    message_count = models.PositiveIntegerField(default=0, help_text="Messages sent in this room")
     created_at = models.DateTimeField(auto_now_add=True)
     
+    objects = RoomQuerySet.as_manager()
+    
+    # Saves retried with a fresh code when an allocated code clashes with an older random one
+    ROOM_CODE_ATTEMPTS = 5
+    
     def generate_room_code(self):
-        """Generate a unique 6-digit room code."""
-        while True:
-            code = ''.join(random.choices(string.digits, k=6))
-            if not Room.objects.filter(room_code=code).exists():
-                return code
+        """Next unused room code (see chat.roomcodes), without probing the table."""
+        from .roomcodes import allocate_room_code
+        return allocate_room_code()
     
     def save(self, *args, **kwargs):
         """Auto-generate room code for private rooms."""
@@ -76,13 +118,26 @@ class Room(models.Model):
             self.room_type = 'global'
         
         # Only generate code if room is private and code doesn't exist
+        generated = False
         if self.is_private and not self.room_code:
             try:
                 self.room_code = self.generate_room_code()
+                generated = True
             except Exception as e:
                 # If code generation fails, still save the room
                 print(f"Warning: Failed to generate room code: {e}")
-        super().save(*args, **kwargs)
+        if not generated:
+            return super().save(*args, **kwargs)
+        for attempt in range(self.ROOM_CODE_ATTEMPTS):
+            try:
+                with transaction.atomic():
+                    return super().save(*args, **kwargs)
+            except IntegrityError:
+                # Codes from before the allocator were random and may sit on its sequence
+                last = attempt == self.ROOM_CODE_ATTEMPTS - 1
+                if last or not Room.objects.filter(room_code=self.room_code).exists():
+                    raise
+                self.room_code = self.generate_room_code()
     
     class Meta:
         db_table = 'room'
@@ -112,7 +167,8 @@ class Message(models.Model):
         help_text="User who sent the message"
     )
     content = models.TextField(max_length=1000, help_text="Message content")
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Not auto_now_add: write-behind persistence sets it when the message is accepted
+    created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
     is_edited = models.BooleanField(default=False)
     
@@ -129,6 +185,91 @@ class Message(models.Model):
         return f"{self.author.username} in {self.room.name}: {self.content[:50]}"
 
 
+class RoomCodeSequence(models.Model):
+    """
+    Allocation state of one room code width (see chat.roomcodes): the next
+    index to hand out and the affine permutation mapping indexes to codes.
+    """
+    width = models.PositiveSmallIntegerField(unique=True, help_text="Digits in the codes of this tier")
+    multiplier = models.BigIntegerField(help_text="Coprime with 10, so index -> code is a permutation")
+    offset = models.BigIntegerField()
+    next_index = models.BigIntegerField(default=0)
+    
+    class Meta:
+        db_table = 'room_code_sequence'
+        verbose_name = 'Room Code Sequence'
+        verbose_name_plural = 'Room Code Sequences'
+    
+    def __str__(self):
+        return f"{self.width}-digit codes: {self.next_index} used"
+
+
+class MessageArchiveSegment(models.Model):
+    """
+    Archived messages of a room from one month (see chat.archive): msgpack
+    rows of (id, author_id, content, created_at, updated_at, is_edited),
+    oldest first, zstd-compressed. A month may have several parts until it
+    is compacted. The other columns describe the rows so pages and lookups
+    can pick segments without decompressing them.
+    """
+    room = models.ForeignKey(
+        Room,
+        on_delete=models.CASCADE,
+        related_name='archive_segments'
+    )
+    month = models.DateField(help_text="First day of the month the messages were sent in")
+    data = models.BinaryField(help_text="zstd-compressed msgpack rows")
+    message_count = models.PositiveIntegerField(default=0)
+    min_message_id = models.BigIntegerField()
+    max_message_id = models.BigIntegerField()
+    first_created_at = models.DateTimeField()
+    last_created_at = models.DateTimeField()
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'message_archive_segment'
+        verbose_name = 'Message Archive Segment'
+        verbose_name_plural = 'Message Archive Segments'
+        indexes = [
+            models.Index(fields=['room', 'month']),
+            models.Index(fields=['room', 'last_created_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.room_id} {self.month:%Y-%m}: {self.message_count} messages"
+
+
+class RoomReadCursor(models.Model):
+    """
+    How far a user has read in a room.
+    Written in batches from read_up_to events (see chat.readstate); stores the
+    message's id and timestamp rather than a foreign key so cursors survive
+    message archival.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='room_read_cursors'
+    )
+    room = models.ForeignKey(
+        Room,
+        on_delete=models.CASCADE,
+        related_name='read_cursors'
+    )
+    last_read_message_id = models.BigIntegerField(help_text="Last message the user has seen")
+    last_read_at = models.DateTimeField(help_text="created_at of that message")
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'room_read_cursor'
+        verbose_name = 'Room Read Cursor'
+        verbose_name_plural = 'Room Read Cursors'
+        unique_together = [['user', 'room']]
+    
+    def __str__(self):
+        return f"{self.user_id} read {self.room_id} up to {self.last_read_message_id}"
+
+
 class RoomJoinRequest(models.Model):
     """
     Model for private room join requests.
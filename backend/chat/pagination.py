@@ -0,0 +1,36 @@
+"""
+Keyset pagination for chat history.
+"""
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from .history import fetch_page
+
+
+def _int_param(request, name):
+    try:
+        return int(request.query_params[name])
+    except (KeyError, ValueError):
+        return None
+
+
+class MessageKeysetPagination(BasePagination):
+    """
+    ?before=<message_id>&limit=<n>: the n messages preceding `before` (the
+    latest n without it), oldest first. Pass `next_before` from the response
+    as `before` to load the previous page. Pages continue into the room's
+    archive when the view exposes the room (MessageViewSet.room).
+    """
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.messages, self.has_more = fetch_page(
+            queryset, before=_int_param(request, 'before'), limit=_int_param(request, 'limit'),
+            room=getattr(view, 'room', None),
+        )
+        return self.messages
+
+    def get_paginated_response(self, data):
+        return Response({
+            'results': data,
+            'has_more': self.has_more,
+            'next_before': self.messages[0].id if self.has_more else None,
+        })
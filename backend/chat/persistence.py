@@ -0,0 +1,192 @@
+"""
+Write-behind persistence for chat messages.
+ChatConsumer gets a Message with its id and timestamp already assigned,
+broadcasts it straight away and leaves the INSERT to a background flusher
+that bulk_creates every CHAT_FLUSH_SIZE messages or CHAT_FLUSH_INTERVAL_MS.
+
+Ids come from the message table's Postgres sequence, reserved in blocks so
+most messages need no database round trip at all. Other databases (SQLite in
+development) fall back to writing each message through immediately.
+
+Durability: pending messages are flushed at interpreter exit (daphne's
+graceful shutdown on SIGTERM/SIGINT). A hard crash can lose at most the
+messages accepted during the last flush interval. A batch that breaks a
+constraint (e.g. its room or author was deleted meanwhile) is split until
+the rows at fault are found, and those are dropped; a batch that fails
+otherwise (database down) is retried CHAT_FLUSH_RETRIES times before it is
+dropped. Past CHAT_BUFFER_LIMIT pending messages, sends write through
+instead of queueing.
+"""
+import atexit
+import logging
+import threading
+from collections import Counter, deque
+from django.conf import settings
+from django.db import DataError, IntegrityError, close_old_connections, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import Room, Message
+
+logger = logging.getLogger(__name__)
+
+
+class MessageBuffer:
+    """Process-wide write-behind buffer (use the message_buffer instance)."""
+
+    def __init__(self, flush_size=None, flush_interval_ms=None, id_block_size=None, enabled=None):
+        self.flush_size = flush_size or settings.CHAT_FLUSH_SIZE
+        self.flush_interval = (flush_interval_ms or settings.CHAT_FLUSH_INTERVAL_MS) / 1000
+        self.id_block_size = id_block_size or settings.CHAT_ID_BLOCK_SIZE
+        self.enabled = settings.CHAT_WRITE_BEHIND if enabled is None else enabled
+        self.limit = settings.CHAT_BUFFER_LIMIT
+        self.retries = settings.CHAT_FLUSH_RETRIES
+
+        self._pending = []
+        self._ids = deque()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._stopping = False
+        self._failures = 0
+        atexit.register(self.close)
+
+    @property
+    def write_behind(self):
+        """Write-behind needs a Postgres sequence to hand out ids up front."""
+        return self.enabled and connection.vendor == 'postgresql'
+
+    def _reserve_ids(self, count):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT nextval(pg_get_serial_sequence(%s, 'id')) FROM generate_series(1, %s)",
+                [Message._meta.db_table, count],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def _build(self, room, author, content, message_id):
+        now = timezone.now()
+        message = Message(
+            id=message_id, room=room, author=author, content=content,
+            created_at=now, updated_at=now,
+        )
+        with self._lock:
+            self._pending.append(message)
+            size = len(self._pending)
+        self._ensure_flusher()
+        if size >= self.flush_size:
+            self._wake.set()
+        return message
+
+    def create_nowait(self, room, author, content):
+        """
+        Assign an id and timestamp and queue the INSERT without touching the
+        database. Returns None when a DB call is needed (id block exhausted,
+        buffer full or write-behind unavailable); call create() from a worker
+        thread then.
+        """
+        if not self.enabled or len(self._pending) >= self.limit:
+            return None
+        try:
+            message_id = self._ids.popleft()
+        except IndexError:
+            return None
+        return self._build(room, author, content, message_id)
+
+    def create(self, room, author, content):
+        """Blocking variant of create_nowait() that may query the database."""
+        if not self.write_behind or len(self._pending) >= self.limit:
+            # Full buffer (flushes failing or falling behind): write through
+            return Message.objects.create(room=room, author=author, content=content)
+        message = self.create_nowait(room, author, content)
+        if message is None:
+            ids = self._reserve_ids(self.id_block_size)
+            message_id = ids.pop(0)
+            self._ids.extend(ids)
+            message = self._build(room, author, content, message_id)
+        return message
+
+    def pending_for_room(self, room_id):
+        """Accepted but not yet flushed messages of a room, oldest first."""
+        with self._lock:
+            return [message for message in self._pending if message.room_id == room_id]
+
+    def flush(self):
+        """
+        Write every pending message with one bulk_create and bump each room's
+        message_count in the same transaction; returns the count written.
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return 0
+            try:
+                written = self._write(batch)
+            except Exception as e:
+                self._failures += 1
+                if self._failures > self.retries:
+                    logger.error(
+                        f"Chat write-behind: dropping {len(batch)} messages after "
+                        f"{self._failures} failed flushes: {e}"
+                    )
+                    self._failures = 0
+                    return 0
+                # Keep the batch (in order) for the next attempt
+                logger.error(f"Chat write-behind flush of {len(batch)} messages failed: {e}")
+                with self._lock:
+                    self._pending[:0] = batch
+                return 0
+            self._failures = 0
+            return written
+
+    def _write(self, batch):
+        """Save a batch; on a constraint error, halve it until the rows at fault are found and dropped."""
+        try:
+            with transaction.atomic():
+                Message.objects.bulk_create(batch, batch_size=self.flush_size)
+                for room_id, count in Counter(message.room_id for message in batch).items():
+                    Room.objects.filter(pk=room_id).update(message_count=F('message_count') + count)
+        except (IntegrityError, DataError) as e:
+            if len(batch) == 1:
+                message = batch[0]
+                logger.error(
+                    f"Chat write-behind: dropping message {message.id} "
+                    f"(room {message.room_id}, author {message.author_id}): {e}"
+                )
+                return 0
+            middle = len(batch) // 2
+            return self._write(batch[:middle]) + self._write(batch[middle:])
+        return len(batch)
+
+    def _ensure_flusher(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(
+                        target=self._run, name='chat-message-flusher', daemon=True
+                    )
+                    self._thread.start()
+
+    def _run(self):
+        while not self._stopping:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            close_old_connections()
+            self.flush()
+
+    def close(self):
+        """Stop the flusher and write what's left (registered with atexit)."""
+        self._stopping = True
+        self._wake.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=5)
+        remaining = self.flush()
+        with self._lock:
+            lost = len(self._pending)
+        if lost:
+            logger.error(f"Chat write-behind: {lost} messages could not be saved on shutdown")
+        return remaining
+
+
+message_buffer = MessageBuffer()
@@ -0,0 +1,291 @@
+"""
+Presence tracking for WebSocket users.
+Connects, disconnects and heartbeats ('ping' frames) only touch a presence
+map with TTLs: Redis sorted sets when USE_REDIS is on, process memory
+otherwise. A background flusher copies is_online/last_seen to the database
+every PRESENCE_FLUSH_INTERVAL seconds with a few bulk statements, so a
+heartbeat never costs a DB write.
+"""
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from .background import PeriodicFlusher
+from .cache import get_redis, redis_key
+
+User = get_user_model()
+
+
+class RedisPresenceStore:
+    """
+    Shared presence map. Per user, a sorted set of '<room_id>:<channel>'
+    connections scored by expiry; global and per-room sorted sets of user
+    ids scored by their latest expiry; a hash of last activity times.
+    """
+
+    def __init__(self, redis):
+        self.redis = redis
+
+    def _user_key(self, user_id):
+        return redis_key('presence', 'user', user_id)
+
+    def _room_key(self, room_id):
+        return redis_key('presence', 'room', room_id)
+
+    @property
+    def _online_key(self):
+        return redis_key('presence', 'online')
+
+    @property
+    def _last_seen_key(self):
+        return redis_key('presence', 'last_seen')
+
+    def _live_connections(self, user_id, now):
+        return [
+            member.decode()
+            for member in self.redis.zrangebyscore(self._user_key(user_id), now, '+inf')
+        ]
+
+    def touch(self, user_id, connection, room_id=None):
+        """Register or refresh a connection; returns True if it's the user's first in the room."""
+        now = time.time()
+        expires = now + settings.PRESENCE_TTL
+        with self.redis.pipeline() as pipe:
+            pipe.zadd(self._user_key(user_id), {f'{room_id or ""}:{connection}': expires})
+            pipe.expire(self._user_key(user_id), settings.PRESENCE_TTL * 2)
+            pipe.zadd(self._online_key, {user_id: expires}, gt=True)
+            if room_id:
+                pipe.zadd(self._room_key(room_id), {user_id: expires}, gt=True)
+                pipe.expire(self._room_key(room_id), settings.PRESENCE_TTL * 2)
+            pipe.hset(self._last_seen_key, user_id, now)
+            pipe.zrangebyscore(self._user_key(user_id), now, '+inf')
+            live = pipe.execute()[-1]
+        prefix = f'{room_id or ""}:'.encode()
+        return sum(1 for member in live if member.startswith(prefix)) == 1
+
+    def leave(self, user_id, connection, room_id=None):
+        """Drop a connection; returns True if the user has no other connection in the room."""
+        now = time.time()
+        self.redis.zrem(self._user_key(user_id), f'{room_id or ""}:{connection}')
+        self.redis.hset(self._last_seen_key, user_id, now)
+        live = self._live_connections(user_id, now)
+        if not live:
+            self.redis.zrem(self._online_key, user_id)
+        if room_id and not any(member.startswith(f'{room_id}:') for member in live):
+            self.redis.zrem(self._room_key(room_id), user_id)
+            return True
+        return False
+
+    def online_user_ids(self, user_ids=None):
+        now = time.time()
+        if user_ids is None:
+            return {int(member) for member in self.redis.zrangebyscore(self._online_key, now, '+inf')}
+        user_ids = list(user_ids)
+        if not user_ids:
+            return set()
+        scores = self.redis.zmscore(self._online_key, user_ids)
+        return {user_id for user_id, score in zip(user_ids, scores) if score and score > now}
+
+    def room_user_ids(self, room_id):
+        now = time.time()
+        return {int(member) for member in self.redis.zrangebyscore(self._room_key(room_id), now, '+inf')}
+
+    def sweep(self):
+        """Forget expired users; returns ids still online."""
+        now = time.time()
+        self.redis.zremrangebyscore(self._online_key, '-inf', now)
+        return self.online_user_ids()
+
+    def last_seen(self, user_ids):
+        user_ids = list(user_ids)
+        if not user_ids:
+            return {}
+        values = self.redis.hmget(self._last_seen_key, user_ids)
+        return {user_id: float(value) for user_id, value in zip(user_ids, values) if value}
+
+    def tracked_user_ids(self):
+        """The map is shared, so any user marked online in the database is ours to mark offline."""
+        return None
+
+    def forget(self, user_ids):
+        pass
+
+    def acquire_flush_lock(self, seconds):
+        """Only one process flushes per interval."""
+        return bool(self.redis.set(redis_key('presence', 'flush_lock'), 1, nx=True, ex=max(1, int(seconds))))
+
+
+class MemoryPresenceStore:
+    """
+    Process-local presence map with the same interface (single-process
+    development). Other processes keep their own maps, so this one only
+    ever marks offline the users it has seen connect.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._connections = {}  # user_id -> {(room_id, channel): expires}
+        self._last_seen = {}
+        self._tracked = set()
+
+    def _live(self, user_id, now):
+        connections = self._connections.get(user_id, {})
+        return [key for key, expires in connections.items() if expires > now]
+
+    def touch(self, user_id, connection, room_id=None):
+        now = time.time()
+        with self._lock:
+            self._connections.setdefault(user_id, {})[(room_id, connection)] = now + settings.PRESENCE_TTL
+            self._last_seen[user_id] = now
+            self._tracked.add(user_id)
+            return sum(1 for room, _ in self._live(user_id, now) if room == room_id) == 1
+
+    def leave(self, user_id, connection, room_id=None):
+        now = time.time()
+        with self._lock:
+            self._connections.get(user_id, {}).pop((room_id, connection), None)
+            self._last_seen[user_id] = now
+            live = self._live(user_id, now)
+            if not live:
+                self._connections.pop(user_id, None)
+            return bool(room_id) and not any(room == room_id for room, _ in live)
+
+    def online_user_ids(self, user_ids=None):
+        now = time.time()
+        with self._lock:
+            online = {user_id for user_id in self._connections if self._live(user_id, now)}
+        return online if user_ids is None else online & set(user_ids)
+
+    def room_user_ids(self, room_id):
+        now = time.time()
+        with self._lock:
+            return {
+                user_id for user_id in self._connections
+                if any(room == room_id for room, _ in self._live(user_id, now))
+            }
+
+    def sweep(self):
+        now = time.time()
+        with self._lock:
+            for user_id in [u for u in self._connections if not self._live(u, now)]:
+                del self._connections[user_id]
+            return set(self._connections)
+
+    def last_seen(self, user_ids):
+        with self._lock:
+            return {user_id: self._last_seen[user_id] for user_id in user_ids if user_id in self._last_seen}
+
+    def tracked_user_ids(self):
+        with self._lock:
+            return set(self._tracked)
+
+    def forget(self, user_ids):
+        """Stop tracking users that were flushed offline, unless they reconnected meanwhile."""
+        now = time.time()
+        with self._lock:
+            for user_id in user_ids:
+                if not self._live(user_id, now):
+                    self._tracked.discard(user_id)
+                    self._last_seen.pop(user_id, None)
+
+    def acquire_flush_lock(self, seconds):
+        return True
+
+    def clear(self):
+        with self._lock:
+            self._connections.clear()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                redis = get_redis()
+                _store = RedisPresenceStore(redis) if redis is not None else MemoryPresenceStore()
+    return _store
+
+
+def flush_presence():
+    """
+    Copy presence to CustomUser.is_online/last_seen: one UPDATE for users
+    online now, one bulk_update for users who went offline since the last flush.
+    A process-local store only considers the users it tracks, so processes
+    without Redis don't mark each other's users offline.
+    """
+    store = get_store()
+    online = store.sweep()
+    now = timezone.now()
+    updated = 0
+    if online:
+        updated += User.objects.filter(id__in=online).update(is_online=True, last_seen=now)
+
+    candidates = User.objects.filter(is_online=True).exclude(id__in=online)
+    tracked = store.tracked_user_ids()
+    if tracked is not None:
+        candidates = candidates.filter(id__in=tracked)
+    went_offline = list(candidates.only('id'))
+    if went_offline:
+        seen = store.last_seen([user.id for user in went_offline])
+        for user in went_offline:
+            user.is_online = False
+            user.last_seen = (
+                datetime.fromtimestamp(seen[user.id], tz=dt_timezone.utc) if user.id in seen else now
+            )
+        User.objects.bulk_update(went_offline, ['is_online', 'last_seen'], batch_size=500)
+        updated += len(went_offline)
+        store.forget([user.id for user in went_offline])
+    return updated
+
+
+def _flush_at_exit():
+    """A process-local map dies with the process, so mark the users it tracked offline."""
+    store = get_store()
+    if isinstance(store, MemoryPresenceStore):
+        store.clear()
+        flush_presence()
+
+
+flusher = PeriodicFlusher(
+    'presence-flusher',
+    interval=lambda: settings.PRESENCE_FLUSH_INTERVAL,
+    flush=flush_presence,
+    should_run=lambda interval: get_store().acquire_flush_lock(interval * 0.9),
+    on_exit=_flush_at_exit,
+)
+
+
+def connect(user_id, connection, room_id=None):
+    """A socket opened; returns True if it's the user's first socket in the room."""
+    flusher.ensure_started()
+    return get_store().touch(user_id, connection, room_id)
+
+
+def heartbeat(user_id, connection, room_id=None):
+    get_store().touch(user_id, connection, room_id)
+
+
+def heartbeat_rooms(user_id, connection, room_ids):
+    """Refresh a socket that is in several rooms (None: the socket itself, outside any room)."""
+    store = get_store()
+    for room_id in room_ids:
+        store.touch(user_id, connection, room_id)
+
+
+def disconnect(user_id, connection, room_id=None):
+    """A socket closed; returns True if the user has left the room entirely."""
+    return get_store().leave(user_id, connection, room_id)
+
+
+def online_in_room(room_id):
+    return get_store().room_user_ids(room_id)
+
+
+def online_among(user_ids):
+    return get_store().online_user_ids(user_ids)
@@ -0,0 +1,87 @@
+"""
+WebSocket subprotocols for chat sockets.
+Clients choose one in the Sec-WebSocket-Protocol handshake header:
+  vinverse.json          the original JSON frames (also used when none is offered)
+  vinverse.json.compact  JSON without whitespace, null fields or duplicated fields
+  vinverse.msgpack       the compact frames as binary MessagePack
+Compact frames name a message's fields like history items do ('id',
+'content') instead of 'message_id'/'message'. Broadcast frames are encoded
+once per protocol by the sender (encode_all) and forwarded unchanged by every
+recipient. JSON keeps non-ASCII characters as they are instead of escaping
+them to ASCII, which keeps frames (and channel layer messages) of
+non-Latin text about half the size.
+"""
+import json
+import msgpack
+from .history import history_frame
+
+JSON = 'vinverse.json'
+COMPACT = 'vinverse.json.compact'
+MSGPACK = 'vinverse.msgpack'
+SUBPROTOCOLS = (JSON, COMPACT, MSGPACK)
+
+
+def negotiate(offered):
+    """First subprotocol the client offered that we speak, or None (plain JSON, no header)."""
+    for subprotocol in offered or ():
+        if subprotocol in SUBPROTOCOLS:
+            return subprotocol
+    return None
+
+
+def _compact_item(item):
+    """History item without the duplicated 'message' field."""
+    return {key: value for key, value in item.items() if key != 'message' and value is not None}
+
+
+def compact(frame):
+    """The compact form of a frame (shared by COMPACT and MSGPACK)."""
+    frame = {key: value for key, value in frame.items() if value is not None}
+    if frame.get('type') == 'message':
+        frame['content'] = frame.pop('message')
+        if 'message_id' in frame:
+            frame['id'] = frame.pop('message_id')
+    if 'messages' in frame:
+        frame['messages'] = [_compact_item(item) for item in frame['messages']]
+    return frame
+
+
+def encode(subprotocol, frame):
+    """Encode a frame for one subprotocol: str for JSON flavours, bytes for MessagePack."""
+    if subprotocol == MSGPACK:
+        return msgpack.packb(compact(frame))
+    if subprotocol == COMPACT:
+        return json.dumps(compact(frame), separators=(',', ':'), ensure_ascii=False)
+    return json.dumps(frame, ensure_ascii=False)
+
+
+def encode_all(frame):
+    """Encode a broadcast frame once per subprotocol, for recipients to forward."""
+    small = compact(frame)
+    return {
+        JSON: json.dumps(frame, ensure_ascii=False),
+        COMPACT: json.dumps(small, separators=(',', ':'), ensure_ascii=False),
+        MSGPACK: msgpack.packb(small),
+    }
+
+
+def encode_history(subprotocol, items, since=None, room=None):
+    """
+    A 'history' frame from cached items (JSON strings). The default protocol
+    splices them in as they are; the compact ones decode them first.
+    """
+    if subprotocol in (None, JSON):
+        return history_frame(items, since=since, room=room)
+    frame = {'type': 'history', 'messages': [json.loads(item) for item in items]}
+    if since is not None:
+        frame['since'] = since
+    if room is not None:
+        frame['room'] = room
+    return encode(subprotocol, frame)
+
+
+def decode(text_data=None, bytes_data=None):
+    """A client frame: JSON text, or MessagePack in a binary frame."""
+    if bytes_data is not None:
+        return msgpack.unpackb(bytes_data)
+    return json.loads(text_data)
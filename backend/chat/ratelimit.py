@@ -0,0 +1,127 @@
+"""
+Token-bucket rate limits for chat sockets.
+Every inbound frame takes a token from its connection's bucket
+(CHAT_CONNECTION_RATE/BURST), and every chat message also takes one from the
+user's bucket shared by all their connections (CHAT_USER_MESSAGE_RATE/BURST),
+kept in Redis when USE_REDIS is on and in process memory otherwise (an LRU
+of at most CHAT_USER_BUCKETS_SIZE users, dropping buckets that have refilled).
+
+With CHAT_RATE_LIMIT_MODE='delay', a frame that is over the limit by at most
+CHAT_RATE_LIMIT_MAX_DELAY_MS waits for its token instead of being dropped.
+"""
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from .cache import get_redis, redis_key
+
+
+def max_delay():
+    """Longest wait for a token before a frame is dropped, in seconds."""
+    if settings.CHAT_RATE_LIMIT_MODE != 'delay':
+        return 0
+    return settings.CHAT_RATE_LIMIT_MAX_DELAY_MS / 1000
+
+
+class TokenBucket:
+    """In-memory token bucket; not thread-safe (one per connection, or guarded by a lock)."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def is_full(self, now=None):
+        """Refilled to burst, i.e. no different from a fresh bucket."""
+        now = time.monotonic() if now is None else now
+        return self.tokens + (now - self.updated) * self.rate >= self.burst
+
+    def take(self, max_wait=0):
+        """
+        Take a token. Returns the seconds to wait before proceeding (0 when a
+        token was available), or a negative retry-after when the frame should
+        be dropped because the wait would exceed max_wait.
+        """
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        wait = (1 - self.tokens) / self.rate
+        if wait <= max_wait:
+            # Borrow the token; the caller sleeps until it would have been there
+            self.tokens -= 1
+            return wait
+        return -wait
+
+
+# Same arithmetic as TokenBucket.take, atomically on a Redis hash
+TAKE_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local max_wait = tonumber(ARGV[3])
+-- Server time keeps buckets consistent across hosts with skewed clocks
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or burst
+local updated = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+local result = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    local wait = (1 - tokens) / rate
+    if wait <= max_wait then
+        tokens = tokens - 1
+        result = wait
+    else
+        result = -wait
+    end
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return tostring(result)
+"""
+
+_user_buckets = OrderedDict()  # user_id -> TokenBucket (LRU), when Redis isn't configured
+_user_lock = threading.Lock()
+_take_script = None
+
+
+def connection_bucket():
+    """A fresh bucket for one socket's inbound frames."""
+    return TokenBucket(settings.CHAT_CONNECTION_RATE, settings.CHAT_CONNECTION_BURST)
+
+
+def _evict_user_buckets():
+    """Drop idle buckets that have refilled (forgetting them loses nothing), then cap the LRU."""
+    now = time.monotonic()
+    while _user_buckets:
+        oldest = next(iter(_user_buckets.values()))
+        if not oldest.is_full(now):
+            break
+        _user_buckets.popitem(last=False)
+    while len(_user_buckets) > settings.CHAT_USER_BUCKETS_SIZE:
+        _user_buckets.popitem(last=False)
+
+
+def take_user_token(user_id, max_wait=0):
+    """TokenBucket.take() on the user's message bucket, shared across their connections."""
+    global _take_script
+    rate, burst = settings.CHAT_USER_MESSAGE_RATE, settings.CHAT_USER_MESSAGE_BURST
+    redis = get_redis()
+    if redis is None:
+        with _user_lock:
+            bucket = _user_buckets.get(user_id)
+            if bucket is None:
+                bucket = _user_buckets[user_id] = TokenBucket(rate, burst)
+            _user_buckets.move_to_end(user_id)
+            wait = bucket.take(max_wait)
+            _evict_user_buckets()
+            return wait
+    if _take_script is None:
+        _take_script = redis.register_script(TAKE_SCRIPT)
+    return float(_take_script(keys=[redis_key('ratelimit', 'user', user_id)], args=[rate, burst, max_wait]))
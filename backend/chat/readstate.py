@@ -0,0 +1,220 @@
+"""
+Read cursors from 'read_up_to' WebSocket events.
+Events only record the latest message id per (user, room) in Redis (or
+process memory); a background flusher resolves their timestamps and upserts
+RoomReadCursor rows in one batch every CHAT_READ_FLUSH_INTERVAL seconds.
+unread_counts() turns the cursors into per-room unread counts.
+"""
+import threading
+from functools import reduce
+from operator import or_
+from django.conf import settings
+from django.db.models import Count, Q
+from . import archive
+from .background import PeriodicFlusher
+from .cache import get_redis, redis_key
+from .models import Message, RoomReadCursor
+from .persistence import message_buffer
+
+_pending = {}  # (user_id, room_id) -> message_id, when Redis isn't configured
+_pending_lock = threading.Lock()
+
+
+def _pending_key():
+    return redis_key('read_pending')
+
+
+def _take_pending():
+    """Atomically take every pending cursor."""
+    redis = get_redis()
+    if redis is None:
+        with _pending_lock:
+            taken = dict(_pending)
+            _pending.clear()
+        return taken
+    with redis.pipeline(transaction=True) as pipe:
+        pipe.hgetall(_pending_key())
+        pipe.delete(_pending_key())
+        raw = pipe.execute()[0]
+    taken = {}
+    for field, value in raw.items():
+        user_id, room_id = field.decode().split(':')
+        taken[(int(user_id), int(room_id))] = int(value)
+    return taken
+
+
+def _restore_pending(cursors):
+    """Put back cursors that couldn't be flushed, unless a newer one arrived."""
+    redis = get_redis()
+    if redis is None:
+        with _pending_lock:
+            for key, message_id in cursors.items():
+                _pending.setdefault(key, message_id)
+        return
+    with redis.pipeline() as pipe:
+        for (user_id, room_id), message_id in cursors.items():
+            pipe.hsetnx(_pending_key(), f'{user_id}:{room_id}', message_id)
+        pipe.execute()
+
+
+def room_has_message(room_id, message_id):
+    """Whether message_id is a message of the room: unflushed, saved or archived."""
+    if any(message.id == message_id for message in message_buffer.pending_for_room(room_id)):
+        return True
+    if Message.objects.filter(id=message_id, room_id=room_id).exists():
+        return True
+    return bool(archive.created_at_of([room_id], [message_id]))
+
+
+def mark_read(user_id, room_id, message_id):
+    """
+    Record that a user has read a room up to message_id (no DB access).
+    Callers make sure the message is the room's (see room_has_message).
+    """
+    flusher.ensure_started()
+    redis = get_redis()
+    if redis is None:
+        with _pending_lock:
+            _pending[(user_id, room_id)] = message_id
+    else:
+        redis.hset(_pending_key(), f'{user_id}:{room_id}', message_id)
+
+
+def pending_cursor(user_id, room_id):
+    """Unflushed cursor of a user in a room, if any."""
+    redis = get_redis()
+    if redis is None:
+        return _pending.get((user_id, room_id))
+    value = redis.hget(_pending_key(), f'{user_id}:{room_id}')
+    return int(value) if value else None
+
+
+def pending_cursors(user_id, room_ids):
+    """Unflushed cursors of a user in the given rooms: {room_id: message_id}."""
+    room_ids = list(room_ids)
+    redis = get_redis()
+    if redis is None:
+        with _pending_lock:
+            return {
+                room_id: _pending[(user_id, room_id)]
+                for room_id in room_ids if (user_id, room_id) in _pending
+            }
+    if not room_ids:
+        return {}
+    values = redis.hmget(_pending_key(), [f'{user_id}:{room_id}' for room_id in room_ids])
+    return {room_id: int(value) for room_id, value in zip(room_ids, values) if value}
+
+
+def _message_timestamps(message_ids, room_ids):
+    """created_at of messages by id, including unflushed and archived ones."""
+    timestamps = dict(Message.objects.filter(id__in=message_ids).values_list('id', 'created_at'))
+    for room_id in room_ids:
+        for message in message_buffer.pending_for_room(room_id):
+            if message.id in message_ids:
+                timestamps.setdefault(message.id, message.created_at)
+    missing = set(message_ids) - timestamps.keys()
+    if missing:
+        timestamps.update(archive.created_at_of(list(room_ids), missing))
+    return timestamps
+
+
+def unread_counts(user, rooms):
+    """
+    Unread messages per room for a user: {room_id: count}.
+    Rooms with a cursor are counted with one grouped query over the
+    (room, created_at) index; rooms the user never read fall back to the
+    stored Room.message_count, less the user's own unarchived messages
+    (sending a message also moves the sender's cursor, so this is only
+    reached for rooms they never posted in over the socket). The user's own
+    messages don't count. Cursors older than the archive horizon also count
+    archived messages.
+    """
+    totals = dict(rooms.values_list('id', 'message_count'))
+    if not totals:
+        return {}
+
+    read_up_to = dict(
+        RoomReadCursor.objects.filter(user=user, room_id__in=totals).values_list('room_id', 'last_read_at')
+    )
+    pending = pending_cursors(user.id, totals)
+    if pending:
+        timestamps = _message_timestamps(set(pending.values()), pending)
+        for room_id, message_id in pending.items():
+            read_at = timestamps.get(message_id)
+            if read_at and (room_id not in read_up_to or read_at > read_up_to[room_id]):
+                read_up_to[room_id] = read_at
+
+    counts = {room_id: total for room_id, total in totals.items() if room_id not in read_up_to}
+    if counts:
+        # message_count only covers flushed messages, so only saved ones are taken off
+        own = dict(
+            Message.objects.filter(room_id__in=counts, author=user)
+            .order_by().values('room_id').annotate(total=Count('id')).values_list('room_id', 'total')
+        )
+        for room_id, total in own.items():
+            counts[room_id] = max(0, counts[room_id] - total)
+    if read_up_to:
+        after_cursor = reduce(or_, (
+            Q(room_id=room_id, created_at__gt=read_at) for room_id, read_at in read_up_to.items()
+        ))
+        unread = dict(
+            Message.objects.filter(after_cursor).exclude(author=user)
+            .order_by().values('room_id').annotate(total=Count('id')).values_list('room_id', 'total')
+        )
+        archived = archive.count_after(read_up_to, user.id)
+        for room_id, read_at in read_up_to.items():
+            counts[room_id] = unread.get(room_id, 0) + archived.get(room_id, 0) + sum(
+                1 for message in message_buffer.pending_for_room(room_id)
+                if message.created_at > read_at and message.author_id != user.id
+            )
+    return counts
+
+
+def flush_read_cursors():
+    """
+    Persist pending cursors: one query for message timestamps, one for the
+    current cursors, one upsert. Cursors never move backwards.
+    """
+    pending = _take_pending()
+    if not pending:
+        return 0
+
+    timestamps = _message_timestamps(set(pending.values()), {room_id for _, room_id in pending})
+
+    # Messages not saved yet (write-behind on another process) are retried next time
+    unresolved = {key: message_id for key, message_id in pending.items() if message_id not in timestamps}
+    if unresolved:
+        _restore_pending(unresolved)
+
+    current = {
+        (cursor.user_id, cursor.room_id): cursor.last_read_at
+        for cursor in RoomReadCursor.objects.filter(
+            user_id__in={user_id for user_id, _ in pending},
+            room_id__in={room_id for _, room_id in pending},
+        ).only('user_id', 'room_id', 'last_read_at')
+    }
+    cursors = [
+        RoomReadCursor(
+            user_id=user_id, room_id=room_id,
+            last_read_message_id=message_id, last_read_at=timestamps[message_id],
+        )
+        for (user_id, room_id), message_id in pending.items()
+        if message_id in timestamps
+        and ((user_id, room_id) not in current or timestamps[message_id] > current[(user_id, room_id)])
+    ]
+    if cursors:
+        RoomReadCursor.objects.bulk_create(
+            cursors,
+            update_conflicts=True,
+            unique_fields=['user', 'room'],
+            update_fields=['last_read_message_id', 'last_read_at', 'updated_at'],
+        )
+    return len(cursors)
+
+
+flusher = PeriodicFlusher(
+    'read-cursor-flusher',
+    interval=lambda: settings.CHAT_READ_FLUSH_INTERVAL,
+    flush=flush_read_cursors,
+    on_exit=flush_read_cursors,
+)
@@ -0,0 +1,42 @@
+"""
+Server-side events for chat room groups.
+Views and signals use these to reach every socket subscribed to a room.
+"""
+import logging
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+
+logger = logging.getLogger(__name__)
+
+
+def room_group_name(room_name):
+    """Channels group that every socket subscribed to a room joins."""
+    return f'chat_{room_name}'
+
+
+def push_to_room(room_name, event):
+    """
+    group_send an event to a room's sockets.
+    Best-effort like notifications.realtime.push_to_user: failures are logged.
+    """
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return False
+    try:
+        async_to_sync(channel_layer.group_send)(room_group_name(room_name), event)
+        return True
+    except Exception as e:
+        logger.warning(f"Failed to push '{event.get('type')}' to room {room_name}: {e}")
+        return False
+
+
+def room_membership_changed(room_name, user_ids=None):
+    """
+    Tell connected sockets to re-check their cached access.
+    user_ids=None means everyone in the room (e.g. the room itself changed).
+    """
+    return push_to_room(room_name, {
+        'type': 'room_membership_changed',
+        'room': room_name,
+        'user_ids': list(user_ids) if user_ids is not None else None,
+    })
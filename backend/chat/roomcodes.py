@@ -0,0 +1,58 @@
+"""
+Room code allocation for private rooms.
+Codes of each width come from a permuted sequence: index i of the tier maps
+to (multiplier * i + offset) mod 10**width, zero-padded, which with a
+multiplier coprime to 10 visits every code of that width exactly once.
+A RoomCodeSequence row per width holds the permutation (random, chosen when
+the tier is first used) and the next index, so allocating is one locked
+read and one UPDATE whatever the fill, with no exists() probing. When a
+width is used up, allocation moves on to the next one, up to the column's
+max_length. Codes spread over the space but are not secret: a user who sees
+two consecutive ones can work out the next.
+"""
+import secrets
+from math import gcd
+from django.db import transaction
+from django.db.models import F
+from .models import Room, RoomCodeSequence
+
+# Existing codes are 6 digits
+MIN_WIDTH = 6
+MAX_WIDTH = Room._meta.get_field('room_code').max_length
+
+
+class RoomCodesExhausted(Exception):
+    """Every code up to MAX_WIDTH digits has been handed out."""
+
+
+def new_permutation(width):
+    size = 10 ** width
+    while True:
+        multiplier = secrets.randbelow(size - 1) + 1
+        if gcd(multiplier, size) == 1:
+            return {'multiplier': multiplier, 'offset': secrets.randbelow(size)}
+
+
+def code_at(sequence, index):
+    size = 10 ** sequence.width
+    return str((sequence.multiplier * index + sequence.offset) % size).zfill(sequence.width)
+
+
+def _locked_sequence(width):
+    sequence = RoomCodeSequence.objects.select_for_update().filter(width=width).first()
+    if sequence is None:
+        # First code of this width; get_or_create settles a race with another process
+        RoomCodeSequence.objects.get_or_create(width=width, defaults=new_permutation(width))
+        sequence = RoomCodeSequence.objects.select_for_update().get(width=width)
+    return sequence
+
+
+def allocate_room_code():
+    """Hand out the next room code, widening the code when a width is used up."""
+    with transaction.atomic():
+        for width in range(MIN_WIDTH, MAX_WIDTH + 1):
+            sequence = _locked_sequence(width)
+            if sequence.next_index < 10 ** width:
+                RoomCodeSequence.objects.filter(pk=sequence.pk).update(next_index=F('next_index') + 1)
+                return code_at(sequence, sequence.next_index)
+    raise RoomCodesExhausted(f'No room codes left up to {MAX_WIDTH} digits')
@@ -5,6 +5,8 @@ from django.urls import re_path
 from . import consumers
 
 websocket_urlpatterns = [
+    # One socket per user: rooms and streams are subscribed to by message
+    re_path(r'^ws/$', consumers.MultiplexConsumer.as_asgi()),
     re_path(r'^ws/chat/(?P<room_name>[-\w]+)/$', consumers.ChatConsumer.as_asgi()),
 ]
 
@@ -8,7 +8,6 @@ from accounts.serializers import UserProfileSerializer
 
 class RoomSerializer(serializers.ModelSerializer):
     """Serializer for Room model."""
-    message_count = serializers.SerializerMethodField()
     is_member = serializers.SerializerMethodField()
     created_by_username = serializers.SerializerMethodField()
     member_count = serializers.SerializerMethodField()
@@ -21,15 +20,16 @@ class RoomSerializer(serializers.ModelSerializer):
             'is_private', 'room_code', 'created_by', 'created_by_username', 'member_count',
             'message_count', 'is_member', 'has_pending_request', 'created_at'
         ]
-        read_only_fields = ['id', 'created_at', 'is_member', 'created_by_username', 'member_count', 'has_pending_request', 'room_code']
+        read_only_fields = ['id', 'created_at', 'is_member', 'created_by_username', 'member_count', 'message_count', 'has_pending_request', 'room_code']
     
-    def get_message_count(self, obj):
-        """Get message count for room."""
-        return obj.messages.count()
+    # The get_* methods below read annotations from Room.objects.with_list_annotations()
+    # when present, and fall back to a query for rooms loaded without them.
     
     def get_member_count(self, obj):
         """Get member count for room."""
         if obj.is_private:
+            if hasattr(obj, 'member_total'):
+                return obj.member_total
             return obj.members.count()
         return None  # Public rooms don't have member lists
     
@@ -42,7 +42,11 @@ class RoomSerializer(serializers.ModelSerializer):
         request = self.context.get('request')
         if request and request.user.is_authenticated:
             if obj.is_private:
-                return obj.members.filter(id=request.user.id).exists() or (obj.created_by and obj.created_by.id == request.user.id)
+                if obj.created_by_id == request.user.id:
+                    return True
+                if hasattr(obj, 'user_is_member'):
+                    return obj.user_is_member
+                return obj.members.filter(id=request.user.id).exists()
             return True  # Public rooms are accessible to all
         return False
     
@@ -51,6 +55,8 @@ class RoomSerializer(serializers.ModelSerializer):
         try:
             request = self.context.get('request')
             if request and request.user.is_authenticated and obj.is_private:
+                if hasattr(obj, 'user_has_pending_request'):
+                    return obj.user_has_pending_request
                 return RoomJoinRequest.objects.filter(
                     room=obj,
                     user=request.user,
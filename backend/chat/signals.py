@@ -0,0 +1,64 @@
+"""
+Broadcast room membership/visibility changes to connected ChatConsumers,
+which cache room access for the lifetime of a connection, keep
+Room.message_count current for single message saves, and drop cached
+socket logins of deactivated or deleted users.
+"""
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from .middleware import revoke_user
+from .models import Room, Message
+from .realtime import room_membership_changed
+
+User = get_user_model()
+
+
+def _on_commit(room_name, user_ids=None):
+    transaction.on_commit(lambda: room_membership_changed(room_name, user_ids))
+
+
+@receiver(m2m_changed, sender=Room.members.through)
+def room_members_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        # user.chat_rooms.add(room, ...): instance is the user
+        for room_name in Room.objects.filter(pk__in=pk_set or []).values_list('name', flat=True):
+            _on_commit(room_name, [instance.pk])
+    else:
+        # clear() doesn't say who was removed, so everyone re-checks
+        _on_commit(instance.name, None if action == 'post_clear' else pk_set)
+
+
+@receiver(post_save, sender=Room)
+def room_saved(sender, instance, created, **kwargs):
+    # Privacy, creator or is_active may have changed
+    if not created:
+        _on_commit(instance.name)
+
+
+@receiver(post_delete, sender=Room)
+def room_deleted(sender, instance, **kwargs):
+    _on_commit(instance.name)
+
+
+@receiver(post_save, sender=Message)
+def message_saved(sender, instance, created, **kwargs):
+    # Write-behind batches go through bulk_create and are counted in MessageBuffer.flush
+    if created:
+        Room.objects.filter(pk=instance.room_id).update(message_count=F('message_count') + 1)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, **kwargs):
+    if not instance.is_active:
+        transaction.on_commit(lambda: revoke_user(instance.pk))
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    user_id = instance.pk
+    transaction.on_commit(lambda: revoke_user(user_id))
@@ -0,0 +1,26 @@
+"""
+Celery tasks for chat maintenance, scheduled by CELERY_BEAT_SCHEDULE.
+"""
+import logging
+from celery import shared_task
+from . import archive
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(ignore_result=True)
+def archive_chat_messages():
+    """Move messages past CHAT_ARCHIVE_AFTER_DAYS into archive segment parts."""
+    archived = archive.archive_backlog()
+    if archived:
+        logger.info(f"Archived {archived} chat messages")
+    return archived
+
+
+@shared_task(ignore_result=True)
+def compact_chat_archive():
+    """Merge the archive parts of finished months into one segment each."""
+    compacted = archive.compact_archive()
+    if compacted:
+        logger.info(f"Compacted {compacted} months of the chat archive")
+    return compacted
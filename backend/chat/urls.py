@@ -3,7 +3,7 @@ URL routes for Chat endpoints.
 """
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import RoomViewSet, MessageViewSet, RoomJoinRequestViewSet
+from .views import RoomViewSet, MessageViewSet, RoomJoinRequestViewSet, chat_metrics, online_following
 
 router = DefaultRouter()
 router.register(r'rooms', RoomViewSet, basename='room')
@@ -11,6 +11,8 @@ router.register(r'messages', MessageViewSet, basename='message')
 router.register(r'join-requests', RoomJoinRequestViewSet, basename='join-request')
 
 urlpatterns = [
+    path('presence/following/', online_following, name='online-following'),
+    path('metrics/', chat_metrics, name='chat-metrics'),
     path('', include(router.urls)),
 ]
 
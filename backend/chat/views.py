@@ -3,10 +3,13 @@ Chat API views for REST endpoints.
 """
 from rest_framework import viewsets, status, serializers
 from rest_framework.decorators import api_view, permission_classes, action
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 from .models import Room, Message, RoomJoinRequest
+from gamerlink.models import Friendship
 from .serializers import RoomSerializer, MessageSerializer, RoomJoinRequestSerializer
+from .pagination import MessageKeysetPagination
+from . import metrics, presence, readstate
 from django.db.models import Q
 from django.contrib.auth import get_user_model
 from django.utils import timezone
@@ -48,59 +51,8 @@ class RoomViewSet(viewsets.ModelViewSet):
             if is_private is not None:
                 queryset = queryset.filter(is_private=is_private.lower() == 'true')
             
-            # For team rooms, only show if user is a member
-            team_rooms = queryset.filter(room_type='team')
-            accessible_team_rooms = []
-            for room in team_rooms:
-                try:
-                    if room.team and user in room.team.members.all():
-                        accessible_team_rooms.append(room.id)
-                except Exception:
-                    continue
-            
-            # For private rooms, only show if user is a member or creator
-            # Use prefetch_related to optimize member queries
-            private_rooms = queryset.filter(
-                room_type='private', 
-                is_private=True
-            ).prefetch_related('members', 'created_by')
-            accessible_private_rooms = []
-            for room in private_rooms:
-                try:
-                    # Check if user is creator
-                    is_creator = room.created_by and room.created_by.id == user.id
-                    # Check if user is a member (optimized with prefetch)
-                    is_member = user.id in [m.id for m in room.members.all()]
-                    if is_member or is_creator:
-                        accessible_private_rooms.append(room.id)
-                except Exception as e:
-                    print(f"Error checking room access: {e}")
-                    continue
-            
-            # Combine public rooms with accessible team/private rooms
-            # Handle empty lists to avoid query issues
-            if not accessible_team_rooms and not accessible_private_rooms:
-                return queryset.filter(
-                    Q(room_type__in=['global', 'game'], is_private=False)
-                ).order_by('room_type', 'display_name')
-            
-            if not accessible_team_rooms:
-                return queryset.filter(
-                    Q(room_type__in=['global', 'game'], is_private=False) |
-                    Q(id__in=accessible_private_rooms)
-                ).order_by('room_type', 'display_name')
-            
-            if not accessible_private_rooms:
-                return queryset.filter(
-                    Q(room_type__in=['global', 'game'], is_private=False) |
-                    Q(id__in=accessible_team_rooms)
-                ).order_by('room_type', 'display_name')
-            
-            return queryset.filter(
-                Q(room_type__in=['global', 'game'], is_private=False) |
-                Q(id__in=accessible_team_rooms) |
-                Q(id__in=accessible_private_rooms)
-            ).order_by('room_type', 'display_name')
+            # Public rooms plus the user's team/private rooms, in one query
+            return queryset.accessible_to(user).with_list_annotations(user).order_by('room_type', 'display_name')
         except Exception as e:
             # Fallback to basic query on error
             return Room.objects.filter(is_active=True, room_type__in=['global', 'game'], is_private=False).order_by('room_type', 'display_name')
@@ -130,7 +82,7 @@ class RoomViewSet(viewsets.ModelViewSet):
             rooms = Room.objects.filter(
                 is_active=True,
                 room_type__in=['global', 'game']
-            ).order_by('room_type', 'display_name')
+            ).with_list_annotations(request.user).order_by('room_type', 'display_name')
             
             serializer = self.get_serializer(rooms, many=True, context={'request': request})
             return Response(serializer.data)
@@ -240,6 +192,25 @@ class RoomViewSet(viewsets.ModelViewSet):
         serializer = RoomJoinRequestSerializer(join_request, context={'request': request})
         return Response(serializer.data, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
     
+    @action(detail=True, methods=['get'])
+    def online(self, request, pk=None):
+        """Users currently connected to this room (from the presence map, no DB scan)."""
+        room = self.get_object()
+        return Response(online_users_response(presence.online_in_room(room.id)))
+    
+    @action(detail=False, methods=['get'])
+    def unread(self, request):
+        """Unread message counts for every room the user can see (for the chat sidebar)."""
+        rooms = Room.objects.filter(is_active=True).accessible_to(request.user)
+        counts = readstate.unread_counts(request.user, rooms)
+        return Response({
+            'rooms': [
+                {'room_id': room_id, 'unread_count': count}
+                for room_id, count in sorted(counts.items())
+            ],
+            'total': sum(counts.values()),
+        })
+    
     @action(detail=False, methods=['get'])
     def search_private(self, request):
         """Search for private rooms by name, ID, or room code."""
@@ -259,17 +230,41 @@ class RoomViewSet(viewsets.ModelViewSet):
             Q(name__icontains=query) | 
             Q(id__icontains=query) |
             Q(room_code=query)  # Exact match for room code
-        )[:20]  # Limit results
+        ).with_list_annotations(request.user)[:20]  # Limit results
         
         serializer = self.get_serializer(rooms, many=True)
         return Response(serializer.data)
 
 
+def online_users_response(user_ids):
+    """Serialize a set of online user ids with one query."""
+    users = list(User.objects.filter(id__in=user_ids).values('id', 'username').order_by('username'))
+    return {'count': len(users), 'users': users}
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def online_following(request):
+    """Users the current user follows who are online right now."""
+    following = Friendship.objects.filter(follower=request.user).values_list('following_id', flat=True)
+    return Response(online_users_response(presence.online_among(following)))
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def chat_metrics(request):
+    """Chat socket counters (rate limiting, slow consumers) for monitoring."""
+    return Response(metrics.snapshot())
+
+
 class MessageViewSet(viewsets.ReadOnlyModelViewSet):
     """ViewSet for Chat Messages (read-only via REST, real-time via WebSocket)."""
     queryset = Message.objects.all()
     serializer_class = MessageSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = MessageKeysetPagination
+    # Set by get_queryset so pagination can page into the room's archive
+    room = None
     
     def get_queryset(self):
         """Get messages for a specific room."""
@@ -285,7 +280,9 @@ class MessageViewSet(viewsets.ReadOnlyModelViewSet):
                 if room.is_private:
                     if self.request.user not in room.members.all() and self.request.user != room.created_by:
                         return Message.objects.none()
-                return Message.objects.filter(room=room).select_related('author').order_by('created_at')
+                # Ordered and limited by MessageKeysetPagination
+                self.room = room
+                return Message.objects.filter(room=room).select_related('author', 'room')
             except Room.DoesNotExist:
                 return Message.objects.none()
         return Message.objects.none()
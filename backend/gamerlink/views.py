@@ -383,9 +383,7 @@ class LFTPostViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def recommendations(self, request):
         """Get AI-powered teammate recommendations."""
-        from sklearn.feature_extraction.text import TfidfVectorizer
-        from sklearn.metrics.pairwise import cosine_similarity
-        import numpy as np
+        from ai_engine.similarity import tfidf_cosine_similarity
         
         user = request.user
         game_filter = request.query_params.get('game', None)
@@ -416,9 +414,7 @@ class LFTPostViewSet(viewsets.ModelViewSet):
             
             # Simple cosine similarity on text features
             try:
-                vectorizer = TfidfVectorizer()
-                vectors = vectorizer.fit_transform([user_features, post_features])
-                similarity = cosine_similarity(vectors[0:1], vectors[1:2])[0][0]
+                similarity = tfidf_cosine_similarity(user_features, post_features)
                 
                 # Calculate additional match score
                 match_score = similarity
@@ -0,0 +1,52 @@
+"""
+WebSocket consumer for per-user notification and AI insight events.
+"""
+import json
+from asgiref.sync import sync_to_async
+from channels.generic.websocket import AsyncWebsocketConsumer
+from chat import presence
+from .realtime import user_group_name
+
+
+class NotificationConsumer(AsyncWebsocketConsumer):
+    """Streams events published with notifications.realtime.push_to_user."""
+
+    async def connect(self):
+        """Join the user's personal group."""
+        user = self.scope.get('user')
+        if not user or not user.is_authenticated:
+            await self.close(code=4001)  # Unauthorized
+            return
+
+        self.group_name = user_group_name(user.id)
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept()
+        # This socket is open on every page, so it's what keeps a user online
+        await sync_to_async(presence.connect, thread_sensitive=False)(user.id, self.channel_name)
+
+    async def disconnect(self, close_code):
+        """Leave the user's personal group."""
+        if hasattr(self, 'group_name'):
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+            await sync_to_async(presence.disconnect, thread_sensitive=False)(
+                self.scope['user'].id, self.channel_name
+            )
+
+    async def receive(self, text_data=None, bytes_data=None):
+        """Respond to keep-alive pings; the stream is otherwise server-to-client."""
+        try:
+            data = json.loads(text_data or '{}')
+        except json.JSONDecodeError:
+            return
+        if data.get('type') == 'ping':
+            await sync_to_async(presence.heartbeat, thread_sensitive=False)(
+                self.scope['user'].id, self.channel_name
+            )
+            await self.send(text_data=json.dumps({'type': 'pong'}))
+
+    async def user_event(self, event):
+        """Forward a user event to the WebSocket."""
+        await self.send(text_data=json.dumps({
+            'type': event['event'],
+            **event.get('payload', {}),
+        }))
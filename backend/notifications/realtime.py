@@ -0,0 +1,70 @@
+"""
+Real-time delivery of per-user events over Django Channels.
+Celery tasks and views push events here; NotificationConsumer, and
+multiplexed chat sockets subscribed to the 'notifications' stream, forward
+them to every socket the user has open.
+"""
+import json
+import logging
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from rest_framework.utils.encoders import JSONEncoder
+from .models import Notification
+
+logger = logging.getLogger(__name__)
+
+
+def user_group_name(user_id):
+    """Channels group that every socket of a user joins."""
+    return f'user_{user_id}'
+
+
+def push_to_user(user_id, event_type, payload=None):
+    """
+    Send an event to all of a user's open sockets.
+    Delivery is best-effort: a missing or unreachable channel layer is logged
+    and never breaks the caller.
+    """
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return False
+
+    # Channel layers serialize with msgpack, so normalize Decimals/datetimes first
+    data = json.loads(json.dumps(payload or {}, cls=JSONEncoder))
+    try:
+        async_to_sync(channel_layer.group_send)(
+            user_group_name(user_id),
+            {
+                'type': 'user_event',
+                'event': event_type,
+                'payload': data,
+            }
+        )
+        return True
+    except Exception as e:
+        logger.warning(f"Failed to push '{event_type}' to user {user_id}: {e}")
+        return False
+
+
+def notify_user(user, notification_type, title, message, related_url=None, related_user=None):
+    """
+    Create a Notification and push it to the user's sockets.
+    """
+    notification = Notification.objects.create(
+        user=user,
+        notification_type=notification_type,
+        title=title,
+        message=message,
+        related_url=related_url,
+        related_user=related_user,
+    )
+    push_to_user(user.id, 'notification', {
+        'id': notification.id,
+        'notification_type': notification.notification_type,
+        'title': notification.title,
+        'message': notification.message,
+        'is_read': notification.is_read,
+        'related_url': notification.related_url,
+        'created_at': notification.created_at,
+    })
+    return notification
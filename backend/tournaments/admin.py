@@ -17,8 +17,9 @@ class TournamentAdmin(admin.ModelAdmin):
 @admin.register(TournamentParticipant)
 class TournamentParticipantAdmin(admin.ModelAdmin):
     """Admin interface for TournamentParticipant model."""
-    list_display = ('tournament', 'user', 'joined_at')
+    list_display = ('tournament', 'user', 'placement', 'joined_at')
     list_filter = ('joined_at', 'tournament')
+    list_editable = ('placement',)
     search_fields = ('tournament__name', 'user__username')
     readonly_fields = ('joined_at',)
 
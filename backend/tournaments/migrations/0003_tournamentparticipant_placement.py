@@ -0,0 +1,22 @@
+# Generated by Django 4.2.7 on 2026-10-19 05:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("tournaments", "0002_alter_tournament_created_by_tournamentparticipant"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="tournamentparticipant",
+            name="placement",
+            field=models.PositiveIntegerField(
+                blank=True,
+                help_text="Final placement once the tournament is over (1 = winner)",
+                null=True,
+            ),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.7 on 2026-10-19 07:26
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("tournaments", "0003_tournamentparticipant_placement"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="tournamentparticipant",
+            name="placement",
+            field=models.PositiveIntegerField(
+                blank=True,
+                help_text="Final placement once the tournament is over (1 = winner)",
+                null=True,
+                validators=[django.core.validators.MinValueValidator(1)],
+            ),
+        ),
+    ]
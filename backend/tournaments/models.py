@@ -1,6 +1,7 @@
 """
 Tournament model for esports tournament management.
 """
+from django.core.validators import MinValueValidator
 from django.db import models
 from django.conf import settings
 
@@ -54,6 +55,12 @@ class TournamentParticipant(models.Model):
         help_text="User who joined the tournament"
     )
     joined_at = models.DateTimeField(auto_now_add=True, help_text="When the user joined")
+    placement = models.PositiveIntegerField(
+        blank=True,
+        null=True,
+        validators=[MinValueValidator(1)],
+        help_text="Final placement once the tournament is over (1 = winner)"
+    )
     
     class Meta:
         db_table = 'tournament_participant'
@@ -14,8 +14,8 @@ class TournamentParticipantSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = TournamentParticipant
-        fields = ('id', 'user', 'joined_at')
-        read_only_fields = ('id', 'joined_at')
+        fields = ('id', 'user', 'joined_at', 'placement')
+        read_only_fields = ('id', 'joined_at', 'placement')
 
 
 class TournamentSerializer(serializers.ModelSerializer):
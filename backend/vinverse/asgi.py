@@ -15,7 +15,10 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'vinverse.settings')
 django_asgi_app = get_asgi_application()
 
 # Import routing after Django is initialized
-from chat.routing import websocket_urlpatterns
+from chat.routing import websocket_urlpatterns as chat_websocket_urlpatterns
+from notifications.routing import websocket_urlpatterns as notification_websocket_urlpatterns
+
+websocket_urlpatterns = chat_websocket_urlpatterns + notification_websocket_urlpatterns
 
 # Try to use JWT auth middleware, fallback to session auth
 try:
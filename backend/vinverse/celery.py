@@ -3,6 +3,7 @@ Celery configuration for async tasks.
 """
 import os
 from celery import Celery
+from celery.signals import worker_init
 
 # Set default Django settings module
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'vinverse.settings')
@@ -15,6 +16,16 @@ app.config_from_object('django.conf:settings', namespace='CELERY')
 # Auto-discover tasks from all installed apps
 app.autodiscover_tasks()
 
+@worker_init.connect
+def warm_up_ai_engine(**kwargs):
+    """
+    Load numpy/scikit-learn/openai and the win model before the first task.
+    Web processes never run this, so they don't pay for those imports.
+    """
+    from ai_engine.ml import warm_up
+    warm_up()
+
+
 @app.task(bind=True, ignore_result=True)
 def debug_task(self):
     print(f'Request: {self.request!r}')
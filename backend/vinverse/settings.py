@@ -134,24 +134,103 @@ CELERY_TIMEZONE = 'UTC'
 CELERY_TASK_TRACK_STARTED = True
 CELERY_TASK_TIME_LIMIT = 30 * 60  # 30 minutes
 
+# Trained win-probability model (python manage.py train_win_model)
+WIN_MODEL_PATH = config('WIN_MODEL_PATH', default=str(BASE_DIR / 'ml_models' / 'win_model.joblib'))
+
+# Chat write-behind persistence (chat/persistence.py)
+CHAT_WRITE_BEHIND = config('CHAT_WRITE_BEHIND', default=True, cast=bool)
+CHAT_FLUSH_SIZE = config('CHAT_FLUSH_SIZE', default=100, cast=int)
+CHAT_FLUSH_INTERVAL_MS = config('CHAT_FLUSH_INTERVAL_MS', default=200, cast=int)
+CHAT_ID_BLOCK_SIZE = config('CHAT_ID_BLOCK_SIZE', default=500, cast=int)
+# Failed flushes a batch survives (300: about a minute at 200ms), and pending
+# messages past which sends write through
+CHAT_FLUSH_RETRIES = config('CHAT_FLUSH_RETRIES', default=300, cast=int)
+CHAT_BUFFER_LIMIT = config('CHAT_BUFFER_LIMIT', default=10000, cast=int)
+
+# Hot per-room history served on join (chat/history.py)
+CHAT_HISTORY_SIZE = config('CHAT_HISTORY_SIZE', default=50, cast=int)
+CHAT_HISTORY_TTL = config('CHAT_HISTORY_TTL', default=24 * 60 * 60, cast=int)
+# Most messages replayed to a client reconnecting with ?since=<message_id>
+CHAT_RESUME_LIMIT = config('CHAT_RESUME_LIMIT', default=200, cast=int)
+# Keyset-paginated history (?before=<message_id>&limit=, WebSocket load_history)
+CHAT_PAGE_SIZE = config('CHAT_PAGE_SIZE', default=50, cast=int)
+CHAT_MAX_PAGE_SIZE = config('CHAT_MAX_PAGE_SIZE', default=100, cast=int)
+# Ephemeral events: typing fan-out is debounced per user, read cursors persisted in batches
+CHAT_TYPING_DEBOUNCE_MS = config('CHAT_TYPING_DEBOUNCE_MS', default=2000, cast=int)
+CHAT_READ_FLUSH_INTERVAL = config('CHAT_READ_FLUSH_INTERVAL', default=5, cast=int)
+# Messages older than this move to compressed monthly segments (chat/archive.py); 0 keeps everything hot
+CHAT_ARCHIVE_AFTER_DAYS = config('CHAT_ARCHIVE_AFTER_DAYS', default=90, cast=int)
+# Celery beat periods of archiving and of compacting finished months (chat/tasks.py)
+CHAT_ARCHIVE_INTERVAL = config('CHAT_ARCHIVE_INTERVAL', default=60 * 60, cast=int)
+CHAT_ARCHIVE_COMPACT_INTERVAL = config('CHAT_ARCHIVE_COMPACT_INTERVAL', default=24 * 60 * 60, cast=int)
+CHAT_ARCHIVE_BATCH = config('CHAT_ARCHIVE_BATCH', default=10000, cast=int)
+CHAT_ARCHIVE_ZSTD_LEVEL = config('CHAT_ARCHIVE_ZSTD_LEVEL', default=9, cast=int)
+# Decoded segments kept per process for paging through the archive
+CHAT_ARCHIVE_CACHE_SEGMENTS = config('CHAT_ARCHIVE_CACHE_SEGMENTS', default=64, cast=int)
+
+# Periodic tasks (run `celery -A vinverse beat` next to a worker)
+CELERY_BEAT_SCHEDULE = {
+    'archive-chat-messages': {
+        'task': 'chat.tasks.archive_chat_messages',
+        'schedule': CHAT_ARCHIVE_INTERVAL,
+        # A run still queued when the next is due is dropped, not stacked up
+        'options': {'expires': CHAT_ARCHIVE_INTERVAL},
+    },
+    'compact-chat-archive': {
+        'task': 'chat.tasks.compact_chat_archive',
+        'schedule': CHAT_ARCHIVE_COMPACT_INTERVAL,
+        'options': {'expires': CHAT_ARCHIVE_COMPACT_INTERVAL},
+    },
+}
+# Inbound token buckets (chat/ratelimit.py): frames per socket, chat messages per user.
+# Over-limit frames are dropped, or with 'delay' held up to CHAT_RATE_LIMIT_MAX_DELAY_MS
+CHAT_CONNECTION_RATE = config('CHAT_CONNECTION_RATE', default=10, cast=float)
+CHAT_CONNECTION_BURST = config('CHAT_CONNECTION_BURST', default=30, cast=int)
+CHAT_USER_MESSAGE_RATE = config('CHAT_USER_MESSAGE_RATE', default=2, cast=float)
+CHAT_USER_MESSAGE_BURST = config('CHAT_USER_MESSAGE_BURST', default=10, cast=int)
+# Per-user buckets kept in process memory without Redis
+CHAT_USER_BUCKETS_SIZE = config('CHAT_USER_BUCKETS_SIZE', default=10000, cast=int)
+CHAT_RATE_LIMIT_MODE = config('CHAT_RATE_LIMIT_MODE', default='drop')
+CHAT_RATE_LIMIT_MAX_DELAY_MS = config('CHAT_RATE_LIMIT_MAX_DELAY_MS', default=1000, cast=int)
+# Frames queued for a socket before it's closed as a slow consumer
+CHAT_OUTBOUND_QUEUE_SIZE = config('CHAT_OUTBOUND_QUEUE_SIZE', default=256, cast=int)
+CHAT_METRICS_FLUSH_INTERVAL = config('CHAT_METRICS_FLUSH_INTERVAL', default=10, cast=int)
+# Verified JWTs cached per process for WebSocket handshakes (chat/middleware.py)
+CHAT_TOKEN_CACHE_SIZE = config('CHAT_TOKEN_CACHE_SIZE', default=10000, cast=int)
+CHAT_TOKEN_CACHE_TTL = config('CHAT_TOKEN_CACHE_TTL', default=300, cast=int)
+# Threads (one DB connection each) for chat socket queries (chat/db.py); 0 = one shared thread
+CHAT_DB_THREADS = config('CHAT_DB_THREADS', default=8, cast=int)
+# Rooms one multiplexed socket (ws/) may be subscribed to at once
+CHAT_MAX_SUBSCRIPTIONS = config('CHAT_MAX_SUBSCRIPTIONS', default=50, cast=int)
+
+# WebSocket presence (chat/presence.py): clients ping well within the TTL
+PRESENCE_TTL = config('PRESENCE_TTL', default=90, cast=int)
+PRESENCE_FLUSH_INTERVAL = config('PRESENCE_FLUSH_INTERVAL', default=30, cast=int)
+
 # Django Channels Configuration
 ASGI_APPLICATION = 'vinverse.asgi.application'
 
 # Channel Layers (Redis for WebSocket support)
-# Try Redis first, fallback to in-memory for development
-try:
-    import redis
-    redis.Redis(host='127.0.0.1', port=6379, db=0).ping()
+# CHANNEL_REDIS_HOSTS: comma-separated Redis URLs, the same list on every
+# daphne node. Groups and channels are sharded over them by consistent
+# hashing (chat/layers.py). Unset, the layer uses REDIS_URL when USE_REDIS is
+# on, and PostgreSQL LISTEN/NOTIFY otherwise (set up after DATABASES below).
+CHANNEL_REDIS_HOSTS = config('CHANNEL_REDIS_HOSTS', default='', cast=Csv())
+if not CHANNEL_REDIS_HOSTS and USE_REDIS:
+    CHANNEL_REDIS_HOSTS = [config('REDIS_URL', default='redis://127.0.0.1:6379/1')]
+
+if CHANNEL_REDIS_HOSTS:
     CHANNEL_LAYERS = {
         'default': {
-            'BACKEND': 'channels_redis.core.RedisChannelLayer',
+            'BACKEND': 'chat.layers.ShardedRedisChannelLayer',
             'CONFIG': {
-                "hosts": [('127.0.0.1', 6379)],
+                "hosts": CHANNEL_REDIS_HOSTS,
+                # Ring points per host; more evens out the shards
+                "virtual_nodes": config('CHANNEL_LAYER_VIRTUAL_NODES', default=160, cast=int),
             },
         },
     }
-except (ImportError, redis.ConnectionError, Exception):
-    # Fallback to in-memory channel layer (for development only)
+else:
     CHANNEL_LAYERS = {
         'default': {
             'BACKEND': 'channels.layers.InMemoryChannelLayer',
@@ -309,6 +388,36 @@ https://pzvqevdqywmbmgpfamcz.supabase.co → Settings → Database → Connectio
         print(error_msg)
         raise ValueError("Supabase database configuration is required. Please set SUPABASE_DB_URL or SUPABASE_DB_* environment variables.")
 
+# Channel layer without Redis: PostgreSQL LISTEN/NOTIFY (chat/layers.py), so
+# chat still reaches every daphne process. LISTEN needs a direct or
+# session-mode connection: set CHANNEL_POSTGRES_URL when the database URL
+# goes through a transaction-mode pooler (e.g. Supabase's port 6543).
+CHANNEL_POSTGRES_URL = config('CHANNEL_POSTGRES_URL', default='')
+if not CHANNEL_REDIS_HOSTS and (
+    CHANNEL_POSTGRES_URL or DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql'
+):
+    database = DATABASES['default']
+    # Without a URL, connect with the database's own settings
+    channel_database_options = {} if CHANNEL_POSTGRES_URL else {
+        key: value for key, value in {
+            'dbname': database.get('NAME'),
+            'user': database.get('USER'),
+            'password': database.get('PASSWORD'),
+            'host': database.get('HOST'),
+            'port': database.get('PORT'),
+            **database.get('OPTIONS', {}),
+        }.items() if value and key not in ('isolation_level', 'server_side_binding')
+    }
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'chat.layers.PostgresChannelLayer',
+            'CONFIG': {
+                'conninfo': CHANNEL_POSTGRES_URL,
+                'options': channel_database_options,
+            },
+        },
+    }
+
 
 # Custom User Model
 AUTH_USER_MODEL = 'accounts.CustomUser'
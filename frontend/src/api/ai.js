@@ -13,10 +13,11 @@ export const getInsights = async (userId = null) => {
 }
 
 /**
- * Generate AI insight for a tournament
+ * Generate AI insight for a tournament.
+ * With stream enabled, tokens arrive as insight_token events on ws/notifications/
  */
-export const generateInsight = async (tournamentId) => {
-  const response = await api.post('/ai/insights/generate/', { tournament_id: tournamentId })
+export const generateInsight = async (tournamentId, stream = true) => {
+  const response = await api.post('/ai/insights/generate/', { tournament_id: tournamentId, stream })
   return response.data
 }
 
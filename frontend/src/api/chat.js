@@ -24,6 +24,14 @@ export const getDefaultRooms = async () => {
   return Array.isArray(response.data) ? response.data : (response.data.results || [])
 }
 
+/**
+ * Get unread message counts for every visible room, as { [roomId]: count }
+ */
+export const getUnreadCounts = async () => {
+  const response = await api.get('/chat/rooms/unread/')
+  return Object.fromEntries(response.data.rooms.map((room) => [room.room_id, room.unread_count]))
+}
+
 /**
  * Get messages for a room
  */
@@ -0,0 +1,252 @@
+/**
+ * One shared WebSocket (ws/) for chat rooms and user events.
+ * Rooms and the notifications stream (AI insight progress/results,
+ * notifications) are subscribed to by message, so a tab holds one
+ * authenticated connection however many rooms it watches. After a reconnect
+ * every room is resubscribed with `since` = the id of the newest message
+ * seen, so the server only replays what was missed (or sends 'history_gap').
+ * "Newest" is by (timestamp, id), the server's history order: ids come from
+ * per-process blocks, so a higher id isn't necessarily a later message.
+ */
+
+// Helper function to convert HTTP/HTTPS URL to WebSocket URL
+const convertToWebSocketUrl = (url) => {
+  return url
+    .replace('/api/', '')
+    .replace('http://', 'ws://')
+    .replace('https://', 'wss://')
+    .replace(/\/$/, '')
+}
+
+/**
+ * Resolve the backend WebSocket base URL (sockets can't go through the Netlify proxy)
+ */
+export const getWebSocketBaseUrl = () => {
+  if (import.meta.env.VITE_WS_URL) {
+    return import.meta.env.VITE_WS_URL.replace(/\/$/, '')
+  }
+  if (import.meta.env.VITE_API_URL) {
+    return convertToWebSocketUrl(import.meta.env.VITE_API_URL)
+  }
+  if (import.meta.env.PROD) {
+    return convertToWebSocketUrl('https://vinverse-backend.up.railway.app')
+  }
+  return 'ws://localhost:8000'
+}
+
+// Presence expires after 90s on the server without a ping
+const HEARTBEAT_INTERVAL = 30000
+
+/**
+ * Ping a socket while it's open so the user stays online. Returns a stop function.
+ */
+export const startHeartbeat = (ws) => {
+  const timer = setInterval(() => {
+    if (ws.readyState === WebSocket.OPEN) {
+      ws.send(JSON.stringify({ type: 'ping' }))
+    }
+  }, HEARTBEAT_INTERVAL)
+  return () => clearInterval(timer)
+}
+
+const rooms = new Map() // room name -> { listeners, lastMessageId, lastMessageKey }
+const userListeners = new Set()
+const connectionListeners = new Set()
+let socket = null
+let reconnectTimer = null
+let reconnectDelay = 1000
+const MAX_RECONNECT_DELAY = 30000
+let idleTimer = null
+// Room switches unsubscribe the old room before the next one subscribes
+const IDLE_CLOSE_DELAY = 5000
+
+const isOpen = () => socket !== null && socket.readyState === WebSocket.OPEN
+
+const send = (frame) => {
+  if (!isOpen()) return false
+  socket.send(JSON.stringify(frame))
+  return true
+}
+
+const notifyConnection = (connected) => {
+  connectionListeners.forEach((listener) => listener(connected))
+}
+
+const subscribeFrame = (roomName) => {
+  const since = rooms.get(roomName)?.lastMessageId
+  return since ? { type: 'subscribe', room: roomName, since } : { type: 'subscribe', room: roomName }
+}
+
+// Sort key of a message in the server's (created_at, id) order; timestamps
+// are ISO strings with microseconds, which Date.parse would cut to millis
+const messageKey = (timestamp, id) => {
+  const fraction = /\.(\d+)/.exec(timestamp || '')
+  const micros = fraction ? Number(fraction[1].padEnd(6, '0').slice(3, 6)) : 0
+  return [Date.parse(timestamp) || 0, micros, id]
+}
+
+const isAfter = (key, other) => {
+  if (!other) return true
+  for (let i = 0; i < key.length; i += 1) {
+    if (key[i] !== other[i]) return key[i] > other[i]
+  }
+  return false
+}
+
+const seeMessage = (room, id, timestamp) => {
+  const key = messageKey(timestamp, id)
+  if (isAfter(key, room.lastMessageKey)) {
+    room.lastMessageKey = key
+    room.lastMessageId = id
+  }
+}
+
+// Remember the newest message of each room, to resume from after a reconnect
+const trackLastMessage = (room, data) => {
+  if (data.type === 'message' && data.message_id) {
+    seeMessage(room, data.message_id, data.timestamp)
+  } else if (data.type === 'history') {
+    // Oldest first, in the server's order
+    const newest = (data.messages || [])[(data.messages || []).length - 1]
+    if (newest?.id) seeMessage(room, newest.id, newest.timestamp)
+  }
+}
+
+const dispatch = (data) => {
+  if (data.stream) {
+    userListeners.forEach((listener) => listener(data))
+    return
+  }
+  const room = data.room && rooms.get(data.room)
+  if (!room) return
+  if (data.type === 'history_gap') {
+    // Too far behind to replay: start the room over from its recent history
+    room.lastMessageId = null
+    room.lastMessageKey = null
+    send({ type: 'subscribe', room: data.room })
+  }
+  trackLastMessage(room, data)
+  room.listeners.forEach((listener) => listener(data))
+  if (data.type === 'unsubscribed') {
+    // Not found or access revoked; the server already dropped it
+    rooms.delete(data.room)
+  }
+}
+
+const hasSubscriptions = () => rooms.size > 0 || userListeners.size > 0
+
+const connect = () => {
+  reconnectTimer = null
+  const token = localStorage.getItem('access_token')
+  if (!token) return
+
+  const queryString = `?token=${encodeURIComponent(token)}`
+  const ws = new WebSocket(`${getWebSocketBaseUrl()}/ws/${queryString}`)
+  socket = ws
+  const stopHeartbeat = startHeartbeat(ws)
+
+  ws.onopen = () => {
+    reconnectDelay = 1000
+    rooms.forEach((_, roomName) => send(subscribeFrame(roomName)))
+    if (userListeners.size > 0) send({ type: 'subscribe', stream: 'notifications' })
+    notifyConnection(true)
+  }
+
+  ws.onmessage = (event) => {
+    dispatch(JSON.parse(event.data))
+  }
+
+  ws.onclose = (event) => {
+    stopHeartbeat()
+    if (socket !== ws) return
+    socket = null
+    notifyConnection(false)
+    // 4001 = unauthorized, don't hammer the server with a bad token
+    if (hasSubscriptions() && event.code !== 4001) {
+      reconnectTimer = setTimeout(connect, reconnectDelay)
+      reconnectDelay = Math.min(reconnectDelay * 2, MAX_RECONNECT_DELAY)
+    }
+  }
+}
+
+const ensureConnected = () => {
+  clearTimeout(idleTimer)
+  idleTimer = null
+  if (!socket && !reconnectTimer) connect()
+}
+
+const closeIfIdle = () => {
+  idleTimer = null
+  if (hasSubscriptions()) return
+  clearTimeout(reconnectTimer)
+  reconnectTimer = null
+  const ws = socket
+  socket = null
+  if (ws) ws.close()
+  notifyConnection(false)
+}
+
+// Close a while after the last unsubscribe, so a subscribe right after it
+// (switching rooms, remounting a page) reuses the open socket
+const disconnectIfIdle = () => {
+  if (hasSubscriptions() || idleTimer) return
+  idleTimer = setTimeout(closeIfIdle, IDLE_CLOSE_DELAY)
+}
+
+/**
+ * Subscribe to a chat room's frames ('history', 'message', 'typing', ...).
+ * Returns { send, unsubscribe }: send() tags frames with the room and
+ * returns false while the socket is down.
+ */
+export const subscribeToRoom = (roomName, listener) => {
+  let room = rooms.get(roomName)
+  if (!room) {
+    room = { listeners: new Set(), lastMessageId: null, lastMessageKey: null }
+    rooms.set(roomName, room)
+  }
+  room.listeners.add(listener)
+  // Also asked when the room is already subscribed, so this listener gets the history
+  send({ type: 'subscribe', room: roomName })
+  ensureConnected()
+
+  return {
+    send: (frame) => send({ ...frame, room: roomName }),
+    unsubscribe: () => {
+      const current = rooms.get(roomName)
+      if (!current) return
+      current.listeners.delete(listener)
+      if (current.listeners.size === 0) {
+        rooms.delete(roomName)
+        send({ type: 'unsubscribe', room: roomName })
+        disconnectIfIdle()
+      }
+    },
+  }
+}
+
+/**
+ * Subscribe to user events. Returns an unsubscribe function.
+ */
+export const subscribeToUserEvents = (listener) => {
+  userListeners.add(listener)
+  if (userListeners.size === 1) send({ type: 'subscribe', stream: 'notifications' })
+  ensureConnected()
+
+  return () => {
+    userListeners.delete(listener)
+    if (userListeners.size === 0) {
+      send({ type: 'unsubscribe', stream: 'notifications' })
+      disconnectIfIdle()
+    }
+  }
+}
+
+/**
+ * Follow whether the shared socket is open. The listener is called right
+ * away and on every change; returns an unsubscribe function.
+ */
+export const subscribeToConnection = (listener) => {
+  connectionListeners.add(listener)
+  listener(isOpen())
+  return () => connectionListeners.delete(listener)
+}
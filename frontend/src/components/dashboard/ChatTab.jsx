@@ -8,6 +8,7 @@ import { motion } from "framer-motion";
 import { getRooms, getMessages } from "../../api/chat";
 import { useAuth } from "../../hooks/useAuth";
 import api from "../../api/axios";
+import { subscribeToConnection, subscribeToRoom } from "../../api/realtime";
 
 const ChatTab = () => {
   const { user } = useAuth();
@@ -15,7 +16,6 @@ const ChatTab = () => {
   const [selectedRoom, setSelectedRoom] = useState("lobby");
   const [message, setMessage] = useState("");
   const [messages, setMessages] = useState([]);
-  const [socket, setSocket] = useState(null);
   const [isConnected, setIsConnected] = useState(false);
   const [showCreateRoom, setShowCreateRoom] = useState(false);
   const [newRoomName, setNewRoomName] = useState("");
@@ -24,7 +24,8 @@ const ChatTab = () => {
   const [activeUsers, setActiveUsers] = useState(new Map());
   const messagesEndRef = useRef(null);
   const messagesContainerRef = useRef(null);
-  const socketRef = useRef(null);
+  // { send, unsubscribe } for the selected room on the shared socket
+  const roomRef = useRef(null);
   const shouldAutoScrollRef = useRef(true);
   const isInitialMountRef = useRef(true);
 
@@ -66,75 +67,14 @@ const ChatTab = () => {
     window.scrollTo({ top: 0, behavior: "auto" });
   }, []);
 
-  // Initialize WebSocket connection (Django Channels)
+  // Live state of the shared socket (api/realtime)
+  useEffect(() => subscribeToConnection(setIsConnected), []);
+
+  // Subscribe to the selected room on the shared socket (one connection for all rooms)
   useEffect(() => {
     if (!user) return;
 
-    // Close existing socket if any
-    if (socketRef.current) {
-      socketRef.current.close();
-      socketRef.current = null;
-    }
-
-    let ws = null;
-
-    // WebSocket URL - must connect directly to backend (not through Netlify proxy)
-    // WebSockets don't work through HTTP proxies, so we need the actual backend URL
-    let baseUrl;
-
-    // Helper function to convert HTTP/HTTPS URL to WebSocket URL
-    const convertToWebSocketUrl = (url) => {
-      return url
-        .replace("/api/", "")
-        .replace("http://", "ws://")
-        .replace("https://", "wss://")
-        .replace(/\/$/, "");
-    };
-
-    // Check for explicit WebSocket URL in environment (highest priority)
-    if (import.meta.env.VITE_WS_URL) {
-      baseUrl = import.meta.env.VITE_WS_URL.replace(/\/$/, "");
-    }
-    // Check for API URL in environment (convert to WebSocket)
-    else if (import.meta.env.VITE_API_URL) {
-      baseUrl = convertToWebSocketUrl(import.meta.env.VITE_API_URL);
-    }
-    // Production fallback: Use Railway backend URL from netlify.toml
-    else if (import.meta.env.PROD) {
-      // Default Railway backend URL (update this if your Railway domain changes)
-      const railwayUrl = "https://vinverse-backend.up.railway.app";
-      baseUrl = convertToWebSocketUrl(railwayUrl);
-      console.warn(
-        "Using default Railway URL for WebSocket. Consider setting VITE_WS_URL or VITE_API_URL environment variable."
-      );
-    }
-    // Development: Use local backend
-    else {
-      baseUrl = "ws://localhost:8000";
-    }
-
-    // Get JWT token for WebSocket authentication
-    const token = localStorage.getItem("access_token");
-
-    // WebSocket URL with JWT token as query parameter
-    const wsPath = `/ws/chat/${selectedRoom}/`;
-    const queryString = token ? `?token=${encodeURIComponent(token)}` : "";
-    const wsUrl = `${baseUrl}${wsPath}${queryString}`;
-    console.log(
-      "Connecting to WebSocket:",
-      wsUrl.replace(/token=[^&]+/, "token=***")
-    ); // Log without exposing token
-    ws = new WebSocket(wsUrl);
-    socketRef.current = ws;
-
-    ws.onopen = () => {
-      console.log("Connected to chat");
-      setIsConnected(true);
-      setSocket(ws);
-    };
-
-    ws.onmessage = (event) => {
-      const data = JSON.parse(event.data);
+    const handleFrame = (data) => {
       if (data.type === "message") {
         // Deduplicate messages by message_id or timestamp+content+user_id
         setMessages((prev) => {
@@ -165,10 +105,19 @@ const ChatTab = () => {
           });
         }
       } else if (data.type === "history") {
-        setMessages(data.messages || []);
+        const history = data.messages || [];
+        if (data.since != null) {
+          // Replay after a reconnect: append only the messages missed while offline
+          setMessages((prev) => {
+            const seen = new Set(prev.map((msg) => msg.id || msg.message_id));
+            return [...prev, ...history.filter((msg) => !seen.has(msg.id))];
+          });
+          return;
+        }
+        setMessages(history);
         // Extract active users from history
         const users = new Map();
-        (data.messages || []).forEach((msg) => {
+        history.forEach((msg) => {
           if (msg.user_id && msg.username) {
             users.set(msg.user_id, { id: msg.user_id, username: msg.username });
           }
@@ -195,34 +144,18 @@ const ChatTab = () => {
             return newMap;
           });
         }
+      } else if (data.type === "unsubscribed") {
+        // Room not found or access revoked
+        console.warn("Chat room unavailable:", data.room, data.code);
       }
     };
 
-    ws.onerror = (error) => {
-      console.error("WebSocket error:", error);
-      setIsConnected(false);
-    };
-
-    ws.onclose = (event) => {
-      console.log("Disconnected from chat", event.code, event.reason);
-      setIsConnected(false);
-      setSocket(null);
-      socketRef.current = null;
-    };
+    const room = subscribeToRoom(selectedRoom, handleFrame);
+    roomRef.current = room;
 
     return () => {
-      // Close socket on cleanup
-      if (socketRef.current) {
-        if (
-          socketRef.current.readyState === WebSocket.OPEN ||
-          socketRef.current.readyState === WebSocket.CONNECTING
-        ) {
-          socketRef.current.close();
-        }
-        socketRef.current = null;
-      }
-      setSocket(null);
-      setIsConnected(false);
+      room.unsubscribe();
+      roomRef.current = null;
     };
   }, [user, selectedRoom]);
 
@@ -274,24 +207,17 @@ const ChatTab = () => {
 
   const sendMessage = (e) => {
     e.preventDefault();
-    const currentSocket = socketRef.current || socket;
-    if (
-      !message.trim() ||
-      !currentSocket ||
-      currentSocket.readyState !== WebSocket.OPEN
-    )
-      return;
+    if (!message.trim() || !roomRef.current) return;
+
+    const sent = roomRef.current.send({
+      type: "chat_message",
+      message: message.trim(),
+    });
+    if (!sent) return;
 
     // Enable auto-scroll when user sends a message
     shouldAutoScrollRef.current = true;
 
-    currentSocket.send(
-      JSON.stringify({
-        type: "chat_message",
-        message: message.trim(),
-      })
-    );
-
     setMessage("");
   };
 
@@ -1,7 +1,7 @@
 /**
  * AI Insights Tab - Shows performance breakdowns with charts
  */
-import { useState } from 'react'
+import { useState, useEffect } from 'react'
 import { useQuery, useMutation, useQueryClient } from '@tanstack/react-query'
 import { motion } from 'framer-motion'
 import {
@@ -21,6 +21,7 @@ import {
 } from 'recharts'
 import { getInsights, generateInsight, getPlayerStats } from '../../api/ai'
 import { getTournaments } from '../../api/tournaments'
+import { subscribeToUserEvents } from '../../api/realtime'
 import { useAuth } from '../../hooks/useAuth'
 
 const COLORS = ['#8b5cf6', '#ec4899', '#06b6d4', '#10b981', '#f59e0b']
@@ -29,6 +30,10 @@ const InsightsTab = () => {
   const { user } = useAuth()
   const queryClient = useQueryClient()
   const [selectedTournament, setSelectedTournament] = useState(null)
+  // tournament_id -> progress (0-100) for insights being generated server-side
+  const [generating, setGenerating] = useState({})
+  // tournament_id -> text streamed so far
+  const [streamedText, setStreamedText] = useState({})
 
   const { data: insights = [], isLoading: insightsLoading } = useQuery({
     queryKey: ['insights', user?.id],
@@ -49,11 +54,44 @@ const InsightsTab = () => {
 
   const generateMutation = useMutation({
     mutationFn: generateInsight,
-    onSuccess: () => {
-      queryClient.invalidateQueries({ queryKey: ['insights'] })
+    onSuccess: (_data, tournamentId) => {
+      setGenerating((prev) => ({ ...prev, [tournamentId]: prev[tournamentId] || 0 }))
     },
   })
 
+  // Insight results are pushed over the socket - no polling needed
+  useEffect(() => {
+    if (!user) return
+
+    const finish = (tournamentId) => {
+      const without = (prev) => {
+        const next = { ...prev }
+        delete next[tournamentId]
+        return next
+      }
+      setGenerating(without)
+      setStreamedText(without)
+    }
+
+    return subscribeToUserEvents((event) => {
+      if (event.type === 'insight_progress') {
+        setGenerating((prev) => ({ ...prev, [event.tournament_id]: event.progress }))
+      } else if (event.type === 'insight_token') {
+        setStreamedText((prev) => ({
+          ...prev,
+          [event.tournament_id]: (prev[event.tournament_id] || '') + event.token,
+        }))
+      } else if (event.type === 'insight_ready') {
+        finish(event.tournament_id)
+        queryClient.invalidateQueries({ queryKey: ['insights'] })
+      } else if (event.type === 'insight_failed') {
+        finish(event.tournament_id)
+      } else if (event.type === 'notification') {
+        queryClient.invalidateQueries({ queryKey: ['notifications'] })
+      }
+    })
+  }, [user, queryClient])
+
   const handleGenerateInsight = (tournamentId) => {
     generateMutation.mutate(tournamentId)
     setSelectedTournament(tournamentId)
@@ -183,7 +221,7 @@ const InsightsTab = () => {
             .map((tournament) => (
               <div
                 key={tournament.id}
-                className="flex items-center justify-between p-3 bg-black/30 rounded-lg"
+                className="flex flex-wrap items-center justify-between p-3 bg-black/30 rounded-lg"
               >
                 <div>
                   <p className="text-white font-medium">{tournament.name}</p>
@@ -191,13 +229,20 @@ const InsightsTab = () => {
                 </div>
                 <button
                   onClick={() => handleGenerateInsight(tournament.id)}
-                  disabled={generateMutation.isPending}
+                  disabled={generateMutation.isPending || tournament.id in generating}
                   className="px-4 py-2 bg-neon-purple text-white rounded-lg hover:bg-purple-600 disabled:opacity-50"
                 >
-                  {generateMutation.isPending && selectedTournament === tournament.id
+                  {tournament.id in generating
+                    ? `Generating... ${generating[tournament.id]}%`
+                    : generateMutation.isPending && selectedTournament === tournament.id
                     ? 'Generating...'
                     : 'Generate'}
                 </button>
+                {streamedText[tournament.id] && (
+                  <p className="w-full mt-2 text-gray-300 text-sm whitespace-pre-wrap">
+                    {streamedText[tournament.id]}
+                  </p>
+                )}
               </div>
             ))}
         </div>
@@ -6,6 +6,7 @@ import { useQuery, useMutation, useQueryClient } from "@tanstack/react-query";
 import { motion, AnimatePresence } from "framer-motion";
 import {
   getRooms,
+  getUnreadCounts,
   getMessages,
   inviteUserToRoom,
   requestJoinRoom,
@@ -16,6 +17,7 @@ import {
 } from "../api/chat";
 import { useAuth } from "../hooks/useAuth";
 import api from "../api/axios";
+import { subscribeToConnection, subscribeToRoom } from "../api/realtime";
 
 const ChatPage = () => {
   const { user } = useAuth();
@@ -23,7 +25,6 @@ const ChatPage = () => {
   const [selectedRoom, setSelectedRoom] = useState("lobby");
   const [message, setMessage] = useState("");
   const [messages, setMessages] = useState([]);
-  const [socket, setSocket] = useState(null);
   const [isConnected, setIsConnected] = useState(false);
   const [showCreateRoom, setShowCreateRoom] = useState(false);
   const [newRoomName, setNewRoomName] = useState("");
@@ -41,16 +42,26 @@ const ChatPage = () => {
   const [searchResults, setSearchResults] = useState([]);
   const messagesEndRef = useRef(null);
   const messagesContainerRef = useRef(null);
-  const socketRef = useRef(null);
+  // { send, unsubscribe } for the selected room on the shared socket
+  const roomRef = useRef(null);
   const shouldAutoScrollRef = useRef(true);
   const isInitialMountRef = useRef(true);
   const typingTimeoutRef = useRef(null);
+  // Newest message seen in the open room and the last one reported as read
+  const latestMessageIdRef = useRef(null);
+  const readUpToRef = useRef(null);
 
   const { data: rooms = [] } = useQuery({
     queryKey: ["chatRooms"],
     queryFn: () => getRooms(),
   });
 
+  const { data: unreadCounts = {} } = useQuery({
+    queryKey: ["chatUnread"],
+    queryFn: () => getUnreadCounts(),
+    refetchInterval: 30000,
+  });
+
   const { data: pendingRequests = [] } = useQuery({
     queryKey: ["pendingRequests"],
     queryFn: () => getPendingRequests(),
@@ -141,52 +152,27 @@ const ChatPage = () => {
     window.scrollTo({ top: 0, behavior: "auto" });
   }, []);
 
-  // Initialize WebSocket connection
+  // Live state of the shared socket (api/realtime)
+  useEffect(() => subscribeToConnection(setIsConnected), []);
+
+  // Subscribe to the selected room on the shared socket
   useEffect(() => {
     if (!user) return;
 
-    if (socketRef.current) {
-      socketRef.current.close();
-      socketRef.current = null;
-    }
-
-    let ws = null;
-
-    const convertToWebSocketUrl = (url) => {
-      return url
-        .replace("/api/", "")
-        .replace("http://", "ws://")
-        .replace("https://", "wss://")
-        .replace(/\/$/, "");
-    };
-
-    let baseUrl;
-    if (import.meta.env.VITE_WS_URL) {
-      baseUrl = import.meta.env.VITE_WS_URL.replace(/\/$/, "");
-    } else if (import.meta.env.VITE_API_URL) {
-      baseUrl = convertToWebSocketUrl(import.meta.env.VITE_API_URL);
-    } else if (import.meta.env.PROD) {
-      const railwayUrl = "https://vinverse-backend.up.railway.app";
-      baseUrl = convertToWebSocketUrl(railwayUrl);
-    } else {
-      baseUrl = "ws://localhost:8000";
-    }
-
-    const token = localStorage.getItem("access_token");
-    const wsPath = `/ws/chat/${selectedRoom}/`;
-    const queryString = token ? `?token=${encodeURIComponent(token)}` : "";
-    const wsUrl = `${baseUrl}${wsPath}${queryString}`;
+    latestMessageIdRef.current = null;
+    readUpToRef.current = null;
 
-    ws = new WebSocket(wsUrl);
-    socketRef.current = ws;
-
-    ws.onopen = () => {
-      setIsConnected(true);
-      setSocket(ws);
+    // Reported when history loads and when leaving the room, not per message, so read receipts stay rare
+    const sendReadUpTo = () => {
+      const messageId = latestMessageIdRef.current;
+      if (messageId && messageId !== readUpToRef.current) {
+        if (roomRef.current?.send({ type: "read_up_to", message_id: messageId })) {
+          readUpToRef.current = messageId;
+        }
+      }
     };
 
-    ws.onmessage = (event) => {
-      const data = JSON.parse(event.data);
+    const handleFrame = (data) => {
       if (data.type === "message") {
         setMessages((prev) => {
           const exists = prev.some(
@@ -199,6 +185,7 @@ const ChatPage = () => {
           if (exists) return prev;
           return [...prev, data];
         });
+        if (data.message_id) latestMessageIdRef.current = data.message_id;
 
         if (data.user_id && data.username) {
           setActiveUsers((prev) => {
@@ -211,14 +198,28 @@ const ChatPage = () => {
           });
         }
       } else if (data.type === "history") {
-        setMessages(data.messages || []);
+        const history = data.messages || [];
+        if (data.since != null) {
+          // Replay after a reconnect: only the messages missed while offline
+          setMessages((prev) => {
+            const seen = new Set(prev.map((msg) => msg.id || msg.message_id));
+            return [...prev, ...history.filter((msg) => !seen.has(msg.id))];
+          });
+        } else {
+          setMessages(history);
+        }
+        const newest = history[history.length - 1];
+        if (newest?.id) {
+          latestMessageIdRef.current = newest.id;
+          sendReadUpTo();
+        }
         const users = new Map();
-        (data.messages || []).forEach((msg) => {
+        history.forEach((msg) => {
           if (msg.user_id && msg.username) {
             users.set(msg.user_id, { id: msg.user_id, username: msg.username });
           }
         });
-        setActiveUsers(users);
+        if (data.since == null) setActiveUsers(users);
       } else if (data.type === "typing") {
         if (data.user_id !== user?.id) {
           setTypingUsers((prev) => new Set([...prev, data.username]));
@@ -230,46 +231,21 @@ const ChatPage = () => {
             });
           }, 3000);
         }
+      } else if (data.type === "unsubscribed") {
+        // Room gone or access revoked
+        if (import.meta.env.DEV) {
+          console.warn("Chat room unavailable:", data.room, data.code);
+        }
       }
     };
 
-    ws.onerror = (error) => {
-      // Silently handle WebSocket errors - don't spam console
-      setIsConnected(false);
-      // Only log in development mode
-      if (import.meta.env.DEV) {
-        console.warn(
-          "WebSocket connection issue (this is normal if backend is not running)"
-        );
-      }
-    };
-
-    ws.onclose = (event) => {
-      setIsConnected(false);
-      setSocket(null);
-      socketRef.current = null;
-      // Silently handle close - don't log unless in development
-      if (import.meta.env.DEV && event.code !== 1000) {
-        console.warn(
-          "WebSocket closed:",
-          event.code,
-          event.reason || "Connection closed"
-        );
-      }
-    };
+    const room = subscribeToRoom(selectedRoom, handleFrame);
+    roomRef.current = room;
 
     return () => {
-      if (socketRef.current) {
-        if (
-          socketRef.current.readyState === WebSocket.OPEN ||
-          socketRef.current.readyState === WebSocket.CONNECTING
-        ) {
-          socketRef.current.close();
-        }
-        socketRef.current = null;
-      }
-      setSocket(null);
-      setIsConnected(false);
+      sendReadUpTo();
+      room.unsubscribe();
+      roomRef.current = null;
     };
   }, [user, selectedRoom]);
 
@@ -315,38 +291,24 @@ const ChatPage = () => {
 
   const sendMessage = (e) => {
     e.preventDefault();
-    const currentSocket = socketRef.current || socket;
-    if (
-      !message.trim() ||
-      !currentSocket ||
-      currentSocket.readyState !== WebSocket.OPEN
-    )
-      return;
-
-    shouldAutoScrollRef.current = true;
+    if (!message.trim() || !roomRef.current) return;
 
-    currentSocket.send(
-      JSON.stringify({
-        type: "chat_message",
-        message: message.trim(),
-      })
-    );
+    const sent = roomRef.current.send({
+      type: "chat_message",
+      message: message.trim(),
+    });
+    if (!sent) return;
 
+    shouldAutoScrollRef.current = true;
     setMessage("");
   };
 
   const handleTyping = (e) => {
     setMessage(e.target.value);
-    const currentSocket = socketRef.current || socket;
-    if (currentSocket && currentSocket.readyState === WebSocket.OPEN) {
+    if (roomRef.current?.send({ type: "typing" })) {
       if (typingTimeoutRef.current) {
         clearTimeout(typingTimeoutRef.current);
       }
-      currentSocket.send(
-        JSON.stringify({
-          type: "typing",
-        })
-      );
       typingTimeoutRef.current = setTimeout(() => {
         // Stop typing indicator after 3 seconds
       }, 3000);
@@ -355,6 +317,7 @@ const ChatPage = () => {
 
   const handleRoomChange = (roomName) => {
     setSelectedRoom(roomName);
+    queryClient.invalidateQueries({ queryKey: ["chatUnread"] });
     setMessages([]);
     setActiveUsers(new Map());
     shouldAutoScrollRef.current = true;
@@ -513,9 +476,9 @@ const ChatPage = () => {
                     >
                       <div className="flex items-center justify-between">
                         <span>🌐 {room.display_name || room.name}</span>
-                        {room.message_count > 0 && (
+                        {selectedRoom !== room.name && unreadCounts[room.id] > 0 && (
                           <span className="text-xs bg-neon-purple/30 px-2 py-0.5 rounded-full">
-                            {room.message_count}
+                            {unreadCounts[room.id]}
                           </span>
                         )}
                       </div>